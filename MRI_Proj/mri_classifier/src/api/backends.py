@@ -0,0 +1,209 @@
+"""
+Inference backends for the tumour detector
+The same weights can be served through PyTorch, ONNX Runtime or OpenVINO (FP32 or
+INT8); exported graphs live next to the .pt file and load through the Ultralytics YOLO API
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import hashlib
+import importlib.util
+import logging
+
+log = logging.getLogger(__name__)
+
+# backend name -> Ultralytics export arguments (None = serve the .pt weights directly)
+BACKENDS: Dict[str, Optional[Dict]] = {
+    "pytorch": None,
+    "onnx": {"format": "onnx"},
+    "openvino": {"format": "openvino"},
+    "openvino_int8": {"format": "openvino", "int8": True},
+}
+
+# backend name -> modules needed to serve it, and to export it. Not in
+# requirements.txt; installed from requirements-backends.txt
+RUNTIME_MODULES: Dict[str, Tuple[str, ...]] = {
+    "pytorch": (),
+    "onnx": ("onnxruntime",),
+    "openvino": ("openvino",),
+    "openvino_int8": ("openvino",),
+}
+EXPORT_MODULES: Dict[str, Tuple[str, ...]] = {
+    "pytorch": (),
+    "onnx": ("onnx",),
+    "openvino": ("openvino",),
+    "openvino_int8": ("openvino", "nncf"),  # NNCF runs the post-training quantization
+}
+
+
+def requires_calibration(backend: str) -> bool:
+    """Whether exporting a backend needs a calibration dataset (post-training quantization)."""
+    return bool(BACKENDS.get(backend) and BACKENDS[backend].get("int8"))
+
+
+def _check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown model backend '{backend}', expected one of: {', '.join(BACKENDS)}"
+        )
+
+
+def _require_modules(backend: str, modules: Tuple[str, ...], purpose: str):
+    """
+    Fail with an install hint instead of letting Ultralytics try to pip
+    install missing packages at load time.
+    """
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if missing:
+        raise ImportError(
+            f"{purpose} the {backend} backend needs {', '.join(missing)}. "
+            f"Install it with: pip install -r requirements-backends.txt"
+        )
+
+
+def backend_model_path(weights_path: Path, backend: str) -> Path:
+    """
+    Location of the model file or directory a backend loads.
+
+    Args:
+        weights_path: Path to the PyTorch .pt weights
+        backend: One of BACKENDS
+
+    Returns:
+        yolo12n_3.pt        for "pytorch"
+        yolo12n_3.onnx      for "onnx"
+        yolo12n_3_openvino_model/       for "openvino"
+        yolo12n_3_int8_openvino_model/  for "openvino_int8"
+        (the names Ultralytics' exporter produces)
+    """
+    _check_backend(backend)
+    weights_path = Path(weights_path)
+    if backend == "onnx":
+        return weights_path.with_suffix(".onnx")
+    if backend == "openvino":
+        return weights_path.parent / f"{weights_path.stem}_openvino_model"
+    if backend == "openvino_int8":
+        return weights_path.parent / f"{weights_path.stem}_int8_openvino_model"
+    return weights_path
+
+
+def load_detector(weights_path: Path, backend: str = "pytorch"):
+    """
+    Load the detector for a backend.
+
+    Args:
+        weights_path: Path to the PyTorch .pt weights
+        backend: One of BACKENDS
+
+    Returns:
+        Ultralytics YOLO object; predict() returns the same Results type for every backend
+    """
+    from ultralytics import YOLO
+
+    model_path = backend_model_path(weights_path, backend)
+    _require_modules(backend, RUNTIME_MODULES[backend], "Serving")
+    if not model_path.exists():
+        command = "quantize_model.py" if requires_calibration(backend) else f"export_backends.py export --backend {backend}"
+        raise FileNotFoundError(
+            f"{backend} model not found at {model_path}. "
+            f"Create it with: python {command}"
+        )
+
+    log.info("Loading %s detector from %s", backend, model_path)
+    return YOLO(str(model_path), task="detect")
+
+
+def model_fingerprint(model_path: Path) -> str:
+    """
+    Content hash of a model file, or of every file in an exported model directory.
+
+    Used to key cached detections, so results from one set of weights are never
+    served for another.
+    """
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        files = sorted(p for p in model_path.rglob("*") if p.is_file())
+    else:
+        files = [model_path]
+
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(path.name.encode("utf-8"))
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def served_model_id(name: str, backend: str, fingerprint: str, gate_id: Optional[str] = None) -> str:
+    """
+    Identity of a served detector: "name/backend:fingerprint", plus "+gate_id"
+    when a cascade gate screens its scans.
+
+    Cached and stored detections are keyed by it, so whatever builds the same
+    id (the API, detect_tumors_in_images.py) shares results, and nothing else does.
+    """
+    model_id = "%s/%s:%s" % (name, backend, fingerprint)
+    if gate_id is not None:
+        model_id = "%s+%s" % (model_id, gate_id)
+    return model_id
+
+
+def model_footprint(model, model_path: Path) -> int:
+    """
+    Approximate memory held by a loaded detector, in bytes.
+
+    PyTorch models report their parameter and buffer sizes; exported graphs
+    are loaded by their runtime on first predict, so their size on disk
+    stands in for it.
+    """
+    module = getattr(model, "model", None)
+    if hasattr(module, "parameters"):
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    model_path = Path(model_path)
+    files = [p for p in model_path.rglob("*") if p.is_file()] if model_path.is_dir() else [model_path]
+    return sum(p.stat().st_size for p in files)
+
+
+def export_backend(
+    weights_path: Path,
+    backend: str,
+    imgsz: int = 640,
+    calibration_data: Optional[Path] = None
+) -> Path:
+    """
+    Export the PyTorch weights to another backend's format.
+
+    Graphs are exported with dynamic batch and image dimensions so the
+    micro-batcher can send any number of images per call.
+
+    Args:
+        weights_path: Path to the PyTorch .pt weights
+        backend: "onnx", "openvino" or "openvino_int8"
+        imgsz: Inference image size the graph is traced at
+        calibration_data: Ultralytics dataset YAML whose val images calibrate
+                          INT8 activation ranges (required for "openvino_int8")
+
+    Returns:
+        Path of the exported model
+    """
+    from ultralytics import YOLO
+
+    _check_backend(backend)
+    if BACKENDS[backend] is None:
+        return Path(weights_path)
+
+    _require_modules(backend, EXPORT_MODULES[backend], "Exporting to")
+    export_args = dict(BACKENDS[backend])
+    if requires_calibration(backend):
+        if calibration_data is None:
+            raise ValueError(f"{backend} export needs calibration_data")
+        export_args["data"] = str(calibration_data)
+
+    log.info("Exporting %s to %s", weights_path, backend)
+    exported = YOLO(str(weights_path)).export(
+        imgsz=imgsz,
+        dynamic=True,
+        **export_args
+    )
+    return Path(exported)
@@ -0,0 +1,217 @@
+"""
+Dynamic micro-batching for YOLO inference
+Collects concurrent predict requests for a short window and runs them as a single batch
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import profiling
+
+log = logging.getLogger(__name__)
+
+# predict_fn(images, confidence) -> one Results object per image
+PredictFn = Callable[[Sequence[Any], float], Sequence[Any]]
+
+
+@dataclass
+class _PendingPrediction:
+    image: Any
+    confidence: float
+    future: asyncio.Future
+    enqueued_at: float
+    profile: Optional[profiling.RequestProfile] = None
+
+
+def filter_results_by_confidence(results, confidence: float):
+    """
+    Drop detections below a confidence threshold from a YOLO Results object.
+
+    A batch is predicted at the lowest threshold requested by any of its
+    members, so members with a stricter threshold are filtered afterwards.
+    NMS only ever suppresses a box in favour of a higher-scoring one, so this
+    gives the same boxes as predicting at the stricter threshold directly.
+
+    Args:
+        results: Results object from ultralytics YOLO model.predict()
+        confidence: Minimum confidence to keep
+
+    Returns:
+        Results object containing only detections with conf >= confidence
+    """
+    if results.boxes is None or len(results.boxes) == 0:
+        return results
+    return results[results.boxes.conf >= confidence]
+
+
+class BatchStats:
+    """
+    Running statistics about batch sizes and queue wait times.
+    """
+
+    def __init__(self, max_batch_size: int, window: int = 1000):
+        self.batches = 0
+        self.images = 0
+        self.errors = 0
+        self.batch_size_counts = [0] * (max_batch_size + 1)
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+        self._recent_waits = deque(maxlen=window)
+
+    def record(self, waits_ms: List[float], inference_ms: float, failed: bool = False):
+        self.batches += 1
+        self.images += len(waits_ms)
+        self.batch_size_counts[len(waits_ms)] += 1
+        self.total_wait_ms += sum(waits_ms)
+        self.max_wait_ms = max(self.max_wait_ms, max(waits_ms))
+        self.total_inference_ms += inference_ms
+        self._recent_waits.extend(waits_ms)
+        if failed:
+            self.errors += 1
+
+    def as_dict(self) -> Dict:
+        recent = np.array(self._recent_waits) if self._recent_waits else np.zeros(1)
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "errors": self.errors,
+            "mean_batch_size": self.images / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {
+                str(size): count for size, count in enumerate(self.batch_size_counts) if count
+            },
+            "mean_wait_ms": self.total_wait_ms / self.images if self.images else 0.0,
+            "p50_wait_ms": float(np.percentile(recent, 50)),
+            "p95_wait_ms": float(np.percentile(recent, 95)),
+            "max_wait_ms": self.max_wait_ms,
+            "mean_inference_ms_per_batch": (
+                self.total_inference_ms / self.batches if self.batches else 0.0
+            ),
+        }
+
+
+class MicroBatcher:
+    """
+    Batching scheduler in front of a YOLO model.
+
+    Handlers await predict(image, confidence). The first request opens a
+    collection window; the batch is flushed when it reaches max_batch_size or
+    when max_wait_ms has elapsed since that first request, whichever comes
+    first. The batch runs as one predict call on a single dedicated thread
+    (a YOLO predictor is not safe to call concurrently), and each handler
+    receives its own Results filtered to its own confidence threshold.
+    """
+
+    def __init__(
+        self,
+        predict_fn: PredictFn,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-batch")
+        self._stats = BatchStats(max_batch_size)
+
+    async def predict(self, image: Any, confidence: float):
+        """
+        Queue one image for batched prediction and wait for its Results.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingPrediction(
+            image, confidence, future, time.perf_counter(), profiling.current_profile()
+        ))
+        return await future
+
+    def stats(self) -> Dict:
+        stats = self._stats.as_dict()
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["config"] = {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms
+        }
+        return stats
+
+    async def close(self):
+        """
+        Stop the collector task and release the inference thread.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    def _ensure_worker(self):
+        # Created lazily so the queue and task bind to the server's running loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._collect_forever())
+
+    async def _collect_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = batch[0].enqueued_at + self.max_wait_ms / 1000.0
+
+            while len(batch) < self.max_batch_size:
+                # Requests that are already queued never wait for another window
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Drop requests whose handler has gone away (client disconnect)
+            batch = [p for p in batch if not p.future.done()]
+            if not batch:
+                continue
+
+            # A profiled request (see profiling.py; one at a time) gets its batch's inference
+            profile = next((p.profile for p in batch if p.profile is not None), None)
+            predict_batch = profiling.wrap_for(profile, self._predict_batch)
+
+            started = time.perf_counter()
+            waits_ms = [(started - p.enqueued_at) * 1000.0 for p in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, predict_batch, batch)
+            except Exception as e:
+                log.error("Batched predict of %d images failed: %s", len(batch), e)
+                self._stats.record(waits_ms, (time.perf_counter() - started) * 1000.0, failed=True)
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            self._stats.record(waits_ms, (time.perf_counter() - started) * 1000.0)
+            for pending, result in zip(batch, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    def _predict_batch(self, batch: List[_PendingPrediction]) -> List[Any]:
+        floor = min(p.confidence for p in batch)
+        results = self.predict_fn([p.image for p in batch], floor)
+        return [
+            filter_results_by_confidence(result, p.confidence) if p.confidence > floor else result
+            for p, result in zip(batch, results)
+        ]
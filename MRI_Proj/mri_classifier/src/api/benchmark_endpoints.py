@@ -0,0 +1,129 @@
+"""
+Endpoint latency benchmark
+Posts the dataset scans to the API in-process (no network) one request at a
+time and reports per-endpoint latency and response size, relative to
+/scan-with-mask. Detection caching is disabled so every request runs the full
+decode → predict → serialise path.
+
+Usage:
+    python benchmark_endpoints.py --limit 20
+    python benchmark_endpoints.py --endpoints /detect /scan-with-mask --repeat 3
+    python benchmark_endpoints.py --image-format webp
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Measure the uncached pipeline; must be set before settings is imported.
+# The registration pool is not exercised, so it is not warmed either.
+os.environ.setdefault("DETECTION_CACHE_ENTRIES", "0")
+os.environ.setdefault("RESULT_STORE_ENABLED", "0")
+os.environ.setdefault("WARMUP_REGISTRATION", "0")
+
+from dataset import dataset_images
+from export_backends import latency_summary, REPORT_DIR
+
+ENDPOINTS = ["/detect", "/scan-with-mask", "/scan"]
+BASELINE = "/scan-with-mask"
+
+
+async def benchmark(
+    endpoints: List[str],
+    images: List[Path],
+    repeat: int,
+    confidence: float,
+    image_format: Optional[str] = None
+) -> Dict:
+    """
+    Time every endpoint over the same images, after the app reports ready.
+    """
+    import httpx
+    import main
+
+    uploads = [(p.name, p.read_bytes()) for p in images]
+    form = {"confidence": str(confidence)}
+    if image_format:
+        form["image_format"] = image_format
+    report = {
+        "images": len(uploads), "repeat": repeat, "confidence": confidence,
+        "image_format": image_format or "default", "endpoints": {}
+    }
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            while not main.readiness.ready:
+                if main.readiness.phase == "failed":
+                    raise RuntimeError(main.readiness.error)
+                await asyncio.sleep(0.1)
+
+            for endpoint in endpoints:
+                latencies, sizes = [], []
+                for _ in range(repeat):
+                    for name, raw in uploads:
+                        t0 = time.perf_counter()
+                        response = await client.post(
+                            endpoint,
+                            files={"img": (name, raw)},
+                            data=form
+                        )
+                        latencies.append((time.perf_counter() - t0) * 1000)
+                        response.raise_for_status()
+                        sizes.append(len(response.content))
+                report["endpoints"][endpoint] = {
+                    **latency_summary(latencies),
+                    "mean_response_bytes": float(sum(sizes) / len(sizes)),
+                }
+            report["encoding"] = (await client.get("/stats")).json()["encoding"]["formats"]
+
+    baseline = report["endpoints"].get(BASELINE)
+    if baseline is not None:
+        for stats in report["endpoints"].values():
+            stats["p50_saving_ms"] = baseline["p50_ms"] - stats["p50_ms"]
+            stats["speedup"] = baseline["p50_ms"] / stats["p50_ms"]
+    return report
+
+
+def print_report(report: Dict):
+    print("\n" + "=" * 72)
+    print(f"{'endpoint':<16} {'p50 ms':>8} {'p95 ms':>8} {'saved ms':>9} {'speedup':>8} {'resp KB':>9}")
+    print("=" * 72)
+    for endpoint, stats in report["endpoints"].items():
+        saved = f"{stats['p50_saving_ms']:.1f}" if "p50_saving_ms" in stats else "-"
+        speedup = f"{stats['speedup']:.2f}x" if "speedup" in stats else "-"
+        print(
+            f"{endpoint:<16} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {saved:>9} "
+            f"{speedup:>8} {stats['mean_response_bytes'] / 1024:>9.1f}"
+        )
+    print(f"\n{report['images']} images x {report['repeat']} runs, savings relative to {BASELINE}")
+    for fmt, stats in report.get("encoding", {}).items():
+        print(f"   {fmt:<9} encode p50 {stats['p50_encode_ms']:.2f} ms, {stats['mean_bytes'] / 1024:.1f} KB mean")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", choices=ENDPOINTS, nargs="+", default=ENDPOINTS)
+    parser.add_argument("--limit", type=int, default=10, help="Images per dataset folder")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], help="Response image format")
+    args = parser.parse_args()
+
+    images = [path for path, _ in dataset_images(args.limit)]
+    report = asyncio.run(benchmark(args.endpoints, images, args.repeat, args.confidence, args.image_format))
+    print_report(report)
+
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    out = REPORT_DIR / "endpoint_latency.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Overlay rendering benchmark
+Times the OpenCV OverlayRenderer against Ultralytics results.plot() on
+synthetic scans with the same detections, at typical and large image sizes.
+
+Usage:
+    python benchmark_render.py
+    python benchmark_render.py --sizes 256 512 2048 --boxes 5 --runs 50
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from export_backends import latency_summary, REPORT_DIR
+from render import OverlayRenderer
+from warmup import dummy_scan
+
+NAMES = {0: "tumor"}
+
+
+def synthetic_detections(size: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    x1y1 = rng.uniform(0, size * 0.7, (count, 2))
+    wh = rng.uniform(size * 0.05, size * 0.3, (count, 2))
+    boxes = np.hstack([x1y1, np.minimum(x1y1 + wh, size - 1)]).astype(np.float32)
+    confidences = rng.uniform(0.3, 0.95, count).astype(np.float32)
+    class_ids = np.zeros(count, dtype=np.int32)
+    return boxes, confidences, class_ids
+
+
+def ultralytics_plot(image: np.ndarray, boxes, confidences, class_ids) -> np.ndarray:
+    """What /scan ran before: wrap the arrays in a Results object and call plot()."""
+    import torch
+    from ultralytics.engine.results import Results
+
+    data = np.hstack([boxes, confidences[:, None], class_ids[:, None].astype(np.float32)])
+    results = Results(image[..., ::-1], path="", names=NAMES, boxes=torch.from_numpy(data))
+    return results.plot()
+
+
+def time_calls(fn: Callable, runs: int, warmup: int = 3) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def benchmark(sizes: List[int], box_count: int, runs: int) -> Dict:
+    renderer = OverlayRenderer(NAMES)
+    report = {"boxes": box_count, "runs": runs, "sizes": {}}
+    for size in sizes:
+        image = dummy_scan(size)
+        boxes, confidences, class_ids = synthetic_detections(size, box_count)
+
+        first = renderer.draw(image, boxes, confidences, class_ids).copy()
+        second = renderer.draw(image, boxes, confidences, class_ids)
+        plot = latency_summary(time_calls(lambda: ultralytics_plot(image, boxes, confidences, class_ids), runs))
+        overlay = latency_summary(time_calls(lambda: renderer.draw(image, boxes, confidences, class_ids), runs))
+
+        report["sizes"][str(size)] = {
+            "results_plot": plot,
+            "overlay_renderer": overlay,
+            "speedup": plot["p50_ms"] / overlay["p50_ms"],
+            "stable_output": bool(np.array_equal(first, second)),
+        }
+    return report
+
+
+def print_report(report: Dict):
+    print("\n" + "=" * 64)
+    print(f"{'size':>6} {'plot p50 ms':>12} {'overlay p50 ms':>15} {'speedup':>8}  stable")
+    print("=" * 64)
+    for size, stats in report["sizes"].items():
+        print(
+            f"{size:>6} {stats['results_plot']['p50_ms']:>12.2f} {stats['overlay_renderer']['p50_ms']:>15.2f} "
+            f"{stats['speedup']:>7.1f}x  {'yes' if stats['stable_output'] else 'NO'}"
+        )
+    print(f"\n{report['boxes']} boxes per image, {report['runs']} runs per size")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 2048])
+    parser.add_argument("--boxes", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    report = benchmark(args.sizes, args.boxes, args.runs)
+    print_report(report)
+
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    out = REPORT_DIR / "render_benchmark.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Worker x thread layout benchmark
+Starts the API under uvicorn once per combination of worker count and native
+threads per worker (NATIVE_THREADS, from which the per-library limits in
+settings.py are derived), sends the same fixed-concurrency load of dataset
+scans to each and reports throughput and latency, so the fastest layout for
+a machine can be picked. Detection caching is disabled so every request does
+the full work.
+
+Usage:
+    python benchmark_threads.py
+    python benchmark_threads.py --workers 1 2 4 --threads 1 2 4 --endpoint /scan
+    python benchmark_threads.py --concurrency 16 --requests 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+from dataset import dataset_images
+from export_backends import latency_summary, REPORT_DIR
+import settings
+
+ENDPOINTS = ["/compare-scans", "/scan"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, threads: int, port: int, state_dir: Path) -> subprocess.Popen:
+    """uvicorn with `workers` processes, each limited to `threads` native threads"""
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "NATIVE_THREADS": str(threads),
+        "DETECTION_CACHE_ENTRIES": "0",
+        "RESULT_STORE_ENABLED": "0",
+        "JOBS_STORE_PATH": str(state_dir / f"jobs-{port}.sqlite3"),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=settings.BASE_DIR,
+        env=env
+    )
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def wait_until_ready(base_url: str, workers: int, server: subprocess.Popen, timeout: float = 300):
+    """
+    Poll /ready on new connections until enough consecutive answers are 200
+    that every worker has most likely finished warming up.
+    """
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < 3 * workers:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"API not ready after {timeout:.0f} s")
+        try:
+            ready = httpx.get(f"{base_url}/ready", timeout=5).status_code == 200
+        except httpx.TransportError:
+            ready = False
+        streak = streak + 1 if ready else 0
+        if not ready:
+            time.sleep(0.5)
+
+
+def _request_args(endpoint: str, uploads: List[Tuple[str, bytes]], index: int) -> Dict:
+    name, raw = uploads[index % len(uploads)]
+    if endpoint == "/compare-scans":
+        other_name, other_raw = uploads[(index + 1) % len(uploads)]
+        return {"files": {"fixed_img": (name, raw), "moving_img": (other_name, other_raw)}}
+    return {"files": {"img": (name, raw)}, "data": {"confidence": "0.5"}}
+
+
+async def run_load(
+    base_url: str, endpoint: str, uploads: List[Tuple[str, bytes]], requests: int, concurrency: int
+) -> Dict:
+    """`requests` requests, `concurrency` at a time; 503s are counted, not timed"""
+    latencies: List[float] = []
+    rejected = 0
+    next_index = 0
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal next_index, rejected
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            t0 = time.perf_counter()
+            response = await client.post(endpoint, **_request_args(endpoint, uploads, index))
+            if response.status_code == 503:
+                rejected += 1
+                continue
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    # One connection per simulated client, so the kernel spreads them over workers
+    clients = [httpx.AsyncClient(base_url=base_url, timeout=600) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(client_loop(client) for client in clients))
+    finally:
+        for client in clients:
+            await client.aclose()
+    elapsed = time.perf_counter() - t0
+    return {
+        "completed": len(latencies),
+        "rejected": rejected,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        **(latency_summary(latencies) if latencies else {}),
+    }
+
+
+def benchmark_layout(
+    workers: int, threads: int, endpoint: str, uploads: List[Tuple[str, bytes]],
+    requests: int, concurrency: int, state_dir: Path
+) -> Dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(workers, threads, port, state_dir)
+    try:
+        wait_until_ready(base_url, workers, server)
+        # Untimed warm-up round, so first-call costs don't land on one layout
+        asyncio.run(run_load(base_url, endpoint, uploads, min(requests, concurrency), concurrency))
+        result = asyncio.run(run_load(base_url, endpoint, uploads, requests, concurrency))
+        result["threads_reported"] = httpx.get(f"{base_url}/stats", timeout=30).json()["threads"]["actual"]
+    finally:
+        stop_server(server)
+    return {"workers": workers, "threads": threads, **result}
+
+
+def sweep(
+    workers: List[int], threads: List[int], endpoint: str, images: List[Path],
+    requests: int, concurrency: int
+) -> Dict:
+    uploads = [(p.name, p.read_bytes()) for p in images]
+    report = {
+        "endpoint": endpoint, "cpu_count": os.cpu_count(), "images": len(uploads),
+        "requests": requests, "concurrency": concurrency, "layouts": []
+    }
+    with tempfile.TemporaryDirectory() as state_dir:
+        for worker_count in workers:
+            for thread_count in threads:
+                print(f"   {worker_count} worker(s) x {thread_count} thread(s)...", flush=True)
+                report["layouts"].append(benchmark_layout(
+                    worker_count, thread_count, endpoint, uploads, requests, concurrency, Path(state_dir)
+                ))
+    best = max(report["layouts"], key=lambda layout: layout["throughput_rps"])
+    report["best"] = {"workers": best["workers"], "threads": best["threads"]}
+    return report
+
+
+def print_report(report: Dict):
+    print("\n" + "=" * 72)
+    print(f"{'workers':>7} {'threads':>7} {'total':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'503s':>6}")
+    print("=" * 72)
+    best = report["best"]
+    for layout in report["layouts"]:
+        marker = "  <- best" if (layout["workers"], layout["threads"]) == (best["workers"], best["threads"]) else ""
+        print(
+            f"{layout['workers']:>7} {layout['threads']:>7} {layout['workers'] * layout['threads']:>6} "
+            f"{layout['throughput_rps']:>8.2f} {layout.get('p50_ms', 0):>9.1f} {layout.get('p95_ms', 0):>9.1f} "
+            f"{layout['rejected']:>6}{marker}"
+        )
+    print(
+        f"\n{report['endpoint']}, {report['requests']} requests at concurrency {report['concurrency']} "
+        f"on {report['cpu_count']} cores"
+    )
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, max(1, cores // 2)}))
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, cores}))
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="/compare-scans")
+    parser.add_argument("--limit", type=int, default=5, help="Images per dataset folder")
+    parser.add_argument("--requests", type=int, default=32, help="Timed requests per layout")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    args = parser.parse_args()
+
+    images = [path for path, _ in dataset_images(args.limit)]
+    report = sweep(args.workers, args.threads, args.endpoint, images, args.requests, args.concurrency)
+    print_report(report)
+
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    out = REPORT_DIR / "thread_layouts.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
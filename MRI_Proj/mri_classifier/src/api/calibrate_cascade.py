@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Train the cascade gate (see cascade.py) on the bundled dataset and measure
+what it saves in front of the detector
+
+Every fifth scan of each dataset folder is held out: calibrate trains and
+calibrates on the rest, benchmark runs detector-only and gate + detector over
+the held-out scans and reports throughput and how many tumour scans (folder
+label) and detector-positive scans the gate would have skipped.
+
+Usage:
+    python calibrate_cascade.py calibrate --target-recall 0.98
+    python calibrate_cascade.py benchmark --margin 0.2
+    CASCADE_ENABLED=1 uvicorn main:app
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from backends import load_detector, model_fingerprint
+from cascade import GATE_LAYERS, BackboneFeatures, CascadeGate, gate_path, train_gate
+from dataset import dataset_images
+from export_backends import REPORT_DIR, latency_summary
+import settings
+
+HOLDOUT_EVERY = 5
+
+
+def split_dataset() -> Tuple[List[Tuple[Path, bool]], List[Tuple[Path, bool]]]:
+    """(calibration, held-out) scans; every HOLDOUT_EVERY-th scan per folder is held out"""
+    calibration, held_out = [], []
+    images = dataset_images()
+    for label in (True, False):
+        paths = [path for path, has_tumour in images if has_tumour == label]
+        for index, path in enumerate(paths):
+            (held_out if index % HOLDOUT_EVERY == 0 else calibration).append((path, label))
+    return calibration, held_out
+
+
+def calibrate(imgsz: int, target_recall: float, l2: float) -> Path:
+    calibration, _ = split_dataset()
+    print(f"📸 Calibrating on {len(calibration)} scans ({sum(l for _, l in calibration)} yes)")
+    features = BackboneFeatures(settings.MODEL_PATH, imgsz, GATE_LAYERS)
+    x = np.concatenate([features([Image.open(path).convert("RGB")]) for path, _ in calibration])
+    labels = np.array([label for _, label in calibration])
+
+    gate = train_gate(
+        x, labels, target_recall, imgsz, GATE_LAYERS, model_fingerprint(settings.MODEL_PATH), l2=l2
+    )
+    path = gate_path(settings.MODEL_PATH)
+    gate.save(path)
+    print(json.dumps(gate.calibration, indent=2))
+    return path
+
+
+def benchmark(margin: float, confidence: float, clean_share: float) -> Dict:
+    _, held_out = split_dataset()
+    pils = [Image.open(path).convert("RGB") for path, _ in held_out]
+    labels = np.array([label for _, label in held_out])
+    print(f"📸 Benchmarking on {len(pils)} held-out scans ({labels.sum()} yes / {(~labels).sum()} no)")
+
+    model = load_detector(settings.MODEL_PATH, settings.MODEL_BACKEND)
+    gate = CascadeGate.load(gate_path(settings.MODEL_PATH), settings.MODEL_PATH, margin)
+    for pil in pils[:3]:
+        model.predict(pil, conf=confidence, verbose=False)
+        gate.screen(pil)
+
+    # Detector only
+    detector_ms, has_detections = [], []
+    for pil in pils:
+        t0 = time.perf_counter()
+        results = model.predict(pil, conf=confidence, verbose=False)[0]
+        detector_ms.append((time.perf_counter() - t0) * 1000)
+        has_detections.append(len(results.boxes) > 0)
+    has_detections = np.array(has_detections)
+
+    # Gate, then the detector only for scans that pass
+    cascade_ms, gate_ms, passed = [], [], []
+    for pil in pils:
+        t0 = time.perf_counter()
+        ok, _ = gate.screen(pil)
+        gate_ms.append((time.perf_counter() - t0) * 1000)
+        if ok:
+            model.predict(pil, conf=confidence, verbose=False)
+        cascade_ms.append((time.perf_counter() - t0) * 1000)
+        passed.append(ok)
+    passed = np.array(passed)
+
+    def rate(mask: np.ndarray):
+        return float(mask.mean()) if len(mask) else None
+
+    # Expected per-scan cost when clean_share of the traffic is clean
+    pass_yes, pass_no = rate(passed[labels]), rate(passed[~labels])
+    projected_ms = float(np.mean(gate_ms)) + float(np.mean(detector_ms)) * (
+        (1 - clean_share) * pass_yes + clean_share * pass_no
+    )
+
+    return {
+        "images": len(pils),
+        "positives": int(labels.sum()),
+        "backend": settings.MODEL_BACKEND,
+        "confidence": confidence,
+        "gate": {**gate.model.calibration, "imgsz": gate.model.imgsz, "threshold": gate.threshold, "margin": margin},
+        "detector_only": {**latency_summary(detector_ms), "images_per_s": 1000 / float(np.mean(detector_ms))},
+        "cascade": {**latency_summary(cascade_ms), "images_per_s": 1000 / float(np.mean(cascade_ms))},
+        "gate_latency": latency_summary(gate_ms),
+        "speedup": float(np.mean(detector_ms) / np.mean(cascade_ms)),
+        "skipped": int((~passed).sum()),
+        "clean_skipped_rate": 1 - pass_no,
+        "missed_tumour_rate": 1 - pass_yes,
+        "detector_positive_scans": int(has_detections.sum()),
+        "missed_detection_rate": rate(~passed[has_detections]),
+        "projection": {
+            "clean_share": clean_share,
+            "mean_ms": projected_ms,
+            "speedup": float(np.mean(detector_ms)) / projected_ms,
+        },
+    }
+
+
+def write_markdown(report: Dict, path: Path):
+    missed_detection = report["missed_detection_rate"]
+    projection = report["projection"]
+    lines = [
+        "# Cascade gate report",
+        "",
+        f"{report['images']} held-out scans from public/dataset ({report['positives']} with tumours), "
+        f"{report['backend']} detector at threshold {report['confidence']}, "
+        f"gate at {report['gate']['imgsz']} px with margin {report['gate']['margin']}.",
+        "",
+        "| pipeline | mean ms | p50 ms | p95 ms | scans/s |",
+        "|----------|---------|--------|--------|---------|",
+    ]
+    for name in ("detector_only", "cascade"):
+        data = report[name]
+        lines.append(
+            f"| {name} | {data['mean_ms']:.1f} | {data['p50_ms']:.1f} | {data['p95_ms']:.1f} | {data['images_per_s']:.1f} |"
+        )
+    lines += [
+        "",
+        f"- Gate: {report['gate_latency']['mean_ms']:.1f} ms per scan, {report['skipped']} scans skipped, "
+        f"{report['speedup']:.2f}x throughput on this mix",
+        f"- Clean scans skipped: {report['clean_skipped_rate']:.1%}",
+        f"- Tumour scans skipped (missed): {report['missed_tumour_rate']:.1%}",
+        "- Detector-positive scans skipped: "
+        + (f"{missed_detection:.1%} of {report['detector_positive_scans']}" if missed_detection is not None
+           else "n/a (the detector found nothing on these scans)"),
+        f"- With {projection['clean_share']:.0%} clean traffic: {projection['mean_ms']:.1f} ms per scan, "
+        f"{projection['speedup']:.2f}x",
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cal = commands.add_parser("calibrate", help="Train the gate and calibrate its threshold")
+    cal.add_argument("--imgsz", type=int, default=224, help="Gate input size")
+    cal.add_argument("--target-recall", type=float, default=0.98, help="Share of tumour scans that must pass")
+    cal.add_argument("--l2", type=float, default=1.0, help="Regularisation strength")
+
+    bench = commands.add_parser("benchmark", help="Throughput and missed scans on the held-out split")
+    bench.add_argument("--margin", type=float, default=settings.CASCADE_MARGIN)
+    bench.add_argument("--confidence", type=float, default=0.25)
+    bench.add_argument("--clean-share", type=float, default=0.7, help="Share of clean scans for the projection")
+
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        print(f"✅ Gate written to {calibrate(args.imgsz, args.target_recall, args.l2)}")
+        return 0
+
+    report = benchmark(args.margin, args.confidence, args.clean_share)
+    REPORT_DIR.mkdir(exist_ok=True)
+    json_path = REPORT_DIR / "cascade_report.json"
+    markdown_path = REPORT_DIR / "cascade_report.md"
+    json_path.write_text(json.dumps(report, indent=2))
+    write_markdown(report, markdown_path)
+
+    print("\n" + markdown_path.read_text())
+    print(f"✅ Report written to {json_path} and {markdown_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Two-stage cascade: a cheap tumour / no-tumour gate in front of the detector
+The gate scores each scan with a logistic regression over pooled activations
+of the detector's own backbone, run at a fraction of the detection resolution.
+Scans scoring below its threshold are reported clean without running the
+detector; the threshold is calibrated on labelled scans to pass a target share
+of tumour scans, and lowered at serving time by a safety margin
+"""
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from backends import model_fingerprint
+
+# Backbone layers (by index in the YOLO model) whose activations are pooled
+GATE_LAYERS = (4, 6, 9)
+
+
+def gate_path(weights_path: Path) -> Path:
+    """yolo12n_3.pt -> yolo12n_3_gate.json, next to the weights it was trained on"""
+    weights_path = Path(weights_path)
+    return weights_path.parent / f"{weights_path.stem}_gate.json"
+
+
+class BackboneFeatures:
+    """
+    Pooled backbone activations of a YOLO detection model.
+
+    Scans are resized to imgsz x imgsz and run through the backbone up to the
+    last of `layers`; each listed layer contributes its per-channel mean and
+    max. Loads its own copy of the .pt weights, so it works whichever backend
+    serves the detector.
+    """
+
+    def __init__(self, weights_path: Path, imgsz: int = 256, layers: Sequence[int] = GATE_LAYERS):
+        import torch
+        from ultralytics import YOLO
+
+        net = YOLO(str(weights_path)).model.float().eval()
+        net.fuse(verbose=False)
+        self.modules = list(net.model)[: max(layers) + 1]
+        if any(module.f != -1 for module in self.modules):
+            raise ValueError("Gate layers must lie in the sequential part of the backbone")
+        self.imgsz = imgsz
+        self.layers = tuple(layers)
+        self._torch = torch
+
+    def __call__(self, images: Sequence[Image.Image]) -> np.ndarray:
+        """(len(images), features) float32 array"""
+        torch = self._torch
+        size = (self.imgsz, self.imgsz)
+        batch = np.stack([np.asarray(image.convert("RGB").resize(size, Image.BILINEAR)) for image in images])
+        x = torch.from_numpy(batch).permute(0, 3, 1, 2).float().div_(255)
+        pooled = []
+        with torch.inference_mode():
+            for index, module in enumerate(self.modules):
+                x = module(x)
+                if index in self.layers:
+                    pooled += [x.mean(dim=(2, 3)), x.amax(dim=(2, 3))]
+        return torch.cat(pooled, dim=1).numpy()
+
+
+@dataclass
+class GateModel:
+    """
+    Trained gate: feature standardisation, logistic regression and threshold.
+
+    threshold: Calibrated probability; scans scoring at or above it pass
+    weights_fingerprint: model_fingerprint of the .pt the features came from
+    calibration: Training summary (target recall, out-of-fold recall and skip rate)
+    """
+    mean: np.ndarray
+    scale: np.ndarray
+    coef: np.ndarray
+    intercept: float
+    threshold: float
+    imgsz: int
+    layers: Tuple[int, ...]
+    weights_fingerprint: str
+    calibration: Dict = field(default_factory=dict)
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """Probability that each scan shows a tumour"""
+        z = ((features - self.mean) / self.scale) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def to_dict(self) -> Dict:
+        return {
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+            "threshold": self.threshold,
+            "imgsz": self.imgsz,
+            "layers": list(self.layers),
+            "weights_fingerprint": self.weights_fingerprint,
+            "calibration": self.calibration,
+        }
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def save(self, path: Path):
+        Path(path).write_text(json.dumps(self.to_dict(), indent=1))
+
+    @classmethod
+    def load(cls, path: Path) -> "GateModel":
+        data = json.loads(Path(path).read_text())
+        return cls(
+            mean=np.array(data["mean"], dtype=np.float32),
+            scale=np.array(data["scale"], dtype=np.float32),
+            coef=np.array(data["coef"], dtype=np.float32),
+            intercept=float(data["intercept"]),
+            threshold=float(data["threshold"]),
+            imgsz=int(data["imgsz"]),
+            layers=tuple(data["layers"]),
+            weights_fingerprint=data["weights_fingerprint"],
+            calibration=data.get("calibration", {})
+        )
+
+
+def fit_logistic(
+    features: np.ndarray, labels: np.ndarray, l2: float = 1.0, iterations: int = 50
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    L2-regularised logistic regression on standardised features (Newton's method).
+
+    Returns:
+        (mean, scale, coef, intercept) for GateModel
+    """
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0) + 1e-6
+    x = np.hstack([(features - mean) / scale, np.ones((len(features), 1))]).astype(np.float64)
+    y = labels.astype(np.float64)
+    penalty = np.full(x.shape[1], l2)
+    penalty[-1] = 0.0  # the intercept is not regularised
+
+    w = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(x @ w)))
+        gradient = x.T @ (p - y) + penalty * w
+        hessian = (x * (p * (1 - p))[:, None]).T @ x + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return mean.astype(np.float32), scale.astype(np.float32), w[:-1].astype(np.float32), float(w[-1])
+
+
+def recall_threshold(scores: np.ndarray, labels: np.ndarray, target_recall: float) -> float:
+    """Highest threshold at which at least target_recall of the positives still pass"""
+    positives = np.sort(scores[labels.astype(bool)])
+    if len(positives) == 0:
+        raise ValueError("Calibration needs at least one positive scan")
+    allowed_misses = int(np.floor((1 - target_recall) * len(positives) + 1e-9))
+    return float(positives[allowed_misses])
+
+
+def out_of_fold_scores(features: np.ndarray, labels: np.ndarray, folds: int = 5, l2: float = 1.0) -> np.ndarray:
+    """Score every scan with a model that did not see it, for honest calibration"""
+    scores = np.zeros(len(features))
+    fold_of = np.arange(len(features)) % folds
+    for fold in range(folds):
+        held_out = fold_of == fold
+        mean, scale, coef, intercept = fit_logistic(features[~held_out], labels[~held_out], l2)
+        z = ((features[held_out] - mean) / scale) @ coef + intercept
+        scores[held_out] = 1.0 / (1.0 + np.exp(-z))
+    return scores
+
+
+def train_gate(
+    features: np.ndarray,
+    labels: np.ndarray,
+    target_recall: float,
+    imgsz: int,
+    layers: Sequence[int],
+    weights_fingerprint: str,
+    l2: float = 1.0,
+    folds: int = 5
+) -> GateModel:
+    """
+    Fit the gate on all scans, with its threshold calibrated on out-of-fold scores.
+    """
+    labels = labels.astype(bool)
+    oof = out_of_fold_scores(features, labels, folds, l2)
+    threshold = recall_threshold(oof, labels, target_recall)
+    passed = oof >= threshold
+    mean, scale, coef, intercept = fit_logistic(features, labels, l2)
+    return GateModel(
+        mean=mean, scale=scale, coef=coef, intercept=intercept, threshold=threshold,
+        imgsz=imgsz, layers=tuple(layers), weights_fingerprint=weights_fingerprint,
+        calibration={
+            "images": int(len(labels)),
+            "positives": int(labels.sum()),
+            "target_recall": target_recall,
+            "l2": l2,
+            "folds": folds,
+            "out_of_fold_recall": float(passed[labels].mean()),
+            "out_of_fold_clean_skipped": float((~passed[~labels]).mean()) if (~labels).any() else None,
+        }
+    )
+
+
+class CascadeGate:
+    """
+    Serving side of the gate: screens decoded scans and counts outcomes.
+
+    margin scales the calibrated threshold down for extra recall: 0 uses it
+    as calibrated, 1 passes every scan to the detector. screen() is blocking
+    and thread-safe; run it on a worker thread.
+    """
+
+    def __init__(self, model: GateModel, features: Callable[[Sequence[Image.Image]], np.ndarray], margin: float):
+        if not 0 <= margin <= 1:
+            raise ValueError("Cascade margin must be between 0 and 1")
+        self.model = model
+        self.margin = margin
+        self.threshold = model.threshold * (1 - margin)
+        self._features = features
+        self._lock = threading.Lock()
+        self.screened = 0
+        self.skipped = 0
+        self._total_ms = 0.0
+
+    @classmethod
+    def load(cls, path: Path, weights_path: Path, margin: float) -> "CascadeGate":
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(
+                f"Cascade gate not found at {path}. Create it with: python calibrate_cascade.py calibrate"
+            )
+        model = GateModel.load(path)
+        if model.weights_fingerprint != model_fingerprint(weights_path):
+            raise ValueError(f"Cascade gate {path} was trained on different weights than {weights_path}; recalibrate it")
+        return cls(model, BackboneFeatures(weights_path, model.imgsz, model.layers), margin)
+
+    @property
+    def id(self) -> str:
+        """Identifies the gate and margin in cache keys"""
+        return "gate:%s@%.3f" % (self.model.fingerprint, self.margin)
+
+    def screen(self, image: Image.Image) -> Tuple[bool, float]:
+        """(whether the scan goes on to the detector, gate score)"""
+        t0 = time.perf_counter()
+        score = float(self.model.score(self._features([image]))[0])
+        passed = score >= self.threshold
+        with self._lock:
+            self.screened += 1
+            self.skipped += not passed
+            self._total_ms += (time.perf_counter() - t0) * 1000
+        return passed, score
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "margin": self.margin,
+                "screened": self.screened,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.screened if self.screened else 0.0,
+                "mean_gate_ms": self._total_ms / self.screened if self.screened else 0.0,
+            }
@@ -5,9 +5,12 @@ import numpy as np
 from typing import Dict, Tuple, Optional
 import logging
 
+from timing import timed
+
 log = logging.getLogger(__name__)
 
 
+@timed("metrics")
 def compute_change_metrics(
     fixed_image: np.ndarray,
     registered_image: np.ndarray,
@@ -253,8 +256,8 @@ def compute_area_change(
         "registered_area_pixels": int(registered_area),
         "area_change_pixels": int(area_change),
         "area_change_percent": float(area_change_percent),
-        "area_growth": area_change > 0,
-        "area_shrinkage": area_change < 0
+        "area_growth": bool(area_change > 0),
+        "area_shrinkage": bool(area_change < 0)
     }
 
 
@@ -310,6 +313,7 @@ def compute_iou(mask1: np.ndarray, mask2: np.ndarray) -> float:
     return float(iou)
 
 
+@timed("visualize")
 def create_change_visualization(
     fixed_image: np.ndarray,
     registered_image: np.ndarray,
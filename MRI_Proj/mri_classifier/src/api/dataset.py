@@ -0,0 +1,31 @@
+"""
+Helpers for the bundled public/dataset scans
+yes/ holds scans with tumours, no/ holds clean scans
+"""
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+DATASET_DIR = Path(__file__).resolve().parent.parent.parent / "public" / "dataset"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def dataset_images(limit_per_class: Optional[int] = None) -> List[Tuple[Path, bool]]:
+    """
+    List dataset images with their folder label.
+
+    Args:
+        limit_per_class: Optional cap on images taken from each folder
+
+    Returns:
+        List of (image_path, has_tumour) sorted by folder then file name
+    """
+    images = []
+    for folder, has_tumour in (("yes", True), ("no", False)):
+        paths = sorted(
+            p for p in (DATASET_DIR / folder).iterdir()
+            if p.suffix.lower() in IMAGE_SUFFIXES
+        )
+        if limit_per_class is not None:
+            paths = paths[:limit_per_class]
+        images.extend((p, has_tumour) for p in paths)
+    return images
@@ -0,0 +1,172 @@
+"""
+Shared, size-aware image decoding for uploads
+JPEGs are decoded directly at a reduced resolution with Pillow's draft mode
+(DCT scaling by 1/2, 1/4 or 1/8) when the full resolution is not needed, which
+cuts decode CPU and peak memory on large uploads. Uploads can be decoded
+from bytes or straight from their spooled temporary file
+"""
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO, Dict, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+_DCT_SCALES = (8, 4, 2, 1)
+
+
+class ImageTooLargeError(ValueError):
+    """
+    Raised before decoding an image whose pixel count exceeds the decoder's max_pixels.
+    """
+
+    def __init__(self, size: Tuple[int, int], max_pixels: int):
+        self.size = size
+        self.max_pixels = max_pixels
+        super().__init__(f"Image of {size[0]}x{size[1]} pixels exceeds the {max_pixels} pixel limit")
+
+
+@dataclass(frozen=True)
+class DecodedImage:
+    """
+    A decoded upload and the size it had before any reduction.
+
+    image: PIL image in the requested mode, possibly smaller than the original
+    original_size: (width, height) of the encoded image
+    decode_ms: Time spent decoding and reducing
+    """
+    image: Image.Image
+    original_size: Tuple[int, int]
+    decode_ms: float
+
+    @property
+    def original_shape(self) -> Tuple[int, int]:
+        """(height, width) of the original, matching Detections.image_shape"""
+        return self.original_size[1], self.original_size[0]
+
+    @property
+    def reduced(self) -> bool:
+        return self.image.size != self.original_size
+
+
+def _dct_scale(size: Tuple[int, int], min_side: int, max_side: int) -> int:
+    # Largest JPEG DCT scale denominator that keeps the long side >= min_side,
+    # or the smallest that brings it down to <= max_side
+    long_side = max(size)
+    if min_side:
+        return next((d for d in _DCT_SCALES if long_side // d >= min_side), 1)
+    if max_side:
+        return next((d for d in reversed(_DCT_SCALES) if math.ceil(long_side / d) <= max_side), 8)
+    return 1
+
+
+class DecodeStats:
+    """
+    Decode count, time and how much reduction saved.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.reduced = 0
+        self.total_ms = 0.0
+        self.original_pixels = 0
+        self.decoded_pixels = 0
+        self._recent_ms = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, decoded: DecodedImage):
+        with self._lock:
+            self.count += 1
+            self.reduced += decoded.reduced
+            self.total_ms += decoded.decode_ms
+            self.original_pixels += decoded.original_size[0] * decoded.original_size[1]
+            self.decoded_pixels += decoded.image.width * decoded.image.height
+            self._recent_ms.append(decoded.decode_ms)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            recent = np.array(self._recent_ms) if self._recent_ms else np.zeros(1)
+            return {
+                "images": self.count,
+                "reduced": self.reduced,
+                "mean_decode_ms": self.total_ms / self.count if self.count else 0.0,
+                "p50_decode_ms": float(np.percentile(recent, 50)),
+                "p95_decode_ms": float(np.percentile(recent, 95)),
+                "decoded_pixel_fraction": (
+                    self.decoded_pixels / self.original_pixels if self.original_pixels else 1.0
+                ),
+            }
+
+
+class ImageDecoder:
+    """
+    Decodes uploads at the resolution each use needs.
+
+    min_side decodes are for detection: the long side stays at least the
+    model input size, since YOLO letterboxes to it anyway. max_side decodes
+    are for rendering and registration: images larger than that are reduced,
+    by DCT scaling for JPEGs and Image.reduce for other formats.
+
+    Images over max_pixels are refused from their header alone, so a small
+    file declaring huge dimensions cannot allocate gigabytes (0 = no limit).
+    """
+
+    def __init__(self, detect_side: int = 640, max_side: int = 2048, max_pixels: int = 0):
+        self.detect_side = detect_side
+        self.max_side = max_side
+        self.max_pixels = max_pixels
+        self.stats = DecodeStats()
+
+    def decode(
+        self, source: Union[bytes, BinaryIO], mode: str = "RGB", min_side: int = 0, max_side: int = 0
+    ) -> DecodedImage:
+        """
+        Decode an upload, optionally at reduced resolution.
+
+        Args:
+            source: Encoded image bytes, or a binary file positioned at its start
+            mode: Pillow mode to return, "RGB" or "L"
+            min_side: Decode no smaller than this long side (0 = full size)
+            max_side: Decode no larger than this long side (0 = no limit)
+
+        Raises:
+            ImageTooLargeError: The image has more than max_pixels pixels
+        """
+        t0 = time.perf_counter()
+        pil = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        original_size = pil.size
+        if self.max_pixels and original_size[0] * original_size[1] > self.max_pixels:
+            raise ImageTooLargeError(original_size, self.max_pixels)
+
+        scale = _dct_scale(original_size, min_side, max_side)
+        if scale > 1 and pil.format == "JPEG":
+            pil.draft(mode, (original_size[0] // scale, original_size[1] // scale))
+        pil = pil.convert(mode)
+
+        if max_side and max(pil.size) > max_side:
+            pil = pil.reduce(math.ceil(max(pil.size) / max_side))
+
+        decoded = DecodedImage(pil, original_size, (time.perf_counter() - t0) * 1000)
+        self.stats.record(decoded)
+        return decoded
+
+    def for_detection(self, source: Union[bytes, BinaryIO]) -> DecodedImage:
+        return self.decode(source, "RGB", min_side=self.detect_side)
+
+    def for_display(self, source: Union[bytes, BinaryIO], mode: str = "RGB") -> DecodedImage:
+        return self.decode(source, mode, max_side=self.max_side)
+
+    def display_from(self, decoded: DecodedImage) -> DecodedImage:
+        """
+        What for_display would return, reduced from an image already decoded
+        at a larger size instead of decoding the upload again.
+        """
+        t0 = time.perf_counter()
+        image = decoded.image
+        if self.max_side and max(image.size) > self.max_side:
+            image = image.reduce(math.ceil(max(image.size) / self.max_side))
+        return DecodedImage(image, decoded.original_size, decoded.decode_ms + (time.perf_counter() - t0) * 1000)
@@ -11,9 +11,21 @@ import json
 
 # Add parent directory to path
 BASE_DIR = Path(__file__).resolve().parent
-MODEL_PATH = BASE_DIR / "yolo12n_3.pt"
+sys.path.insert(0, str(BASE_DIR))
+from backends import model_fingerprint, served_model_id
+from detection_cache import Detections, image_digest
+from result_store import ResultStore
+import settings
+
+MODEL_PATH = settings.MODEL_PATH
 PUBLIC_DIR = BASE_DIR.parent.parent / "public"
 
+# Loaded on first use. Results go to the API's persistent result store under
+# the id the API gives MODEL_PATH with the PyTorch backend and no cascade gate,
+# so they are shared when the API serves it that way (the default)
+_model = None
+_store = None
+
 # Patient scan history data structure
 PATIENT_SCANS = {
     'John Smith': [
@@ -87,15 +99,35 @@ def detect_tumors_in_image(image_path):
         print(f"⚠️  Image not found: {image_path}")
         return 0, 0.0
     
+    global _model, _store
     try:
-        model = YOLO(str(MODEL_PATH))
-        pil_image = Image.open(image_path).convert("RGB")
-        results = model.predict(pil_image, conf=0.5)[0]
+        if _store is None and settings.RESULT_STORE_ENABLED:
+            _store = ResultStore(
+                settings.RESULT_STORE_PATH,
+                served_model_id(MODEL_PATH.stem, "pytorch", model_fingerprint(MODEL_PATH)),
+                max_entries=settings.RESULT_STORE_MAX_ENTRIES,
+                max_bytes=settings.RESULT_STORE_MAX_MB * 1024 * 1024
+            )
+        
+        # Reuse stored detections for unchanged images and weights
+        raw = image_path.read_bytes()
+        digest = image_digest(raw)
+        floor = settings.DETECTION_CONF_FLOOR
+        detections = _store.get(digest, floor) if _store is not None else None
+        
+        if detections is None:
+            if _model is None:
+                _model = YOLO(str(MODEL_PATH))
+            pil_image = Image.open(image_path).convert("RGB")
+            results = _model.predict(pil_image, conf=floor)[0]
+            detections = Detections.from_results(results)
+            if _store is not None:
+                _store.put(digest, floor, detections)
         
-        num_tumors = len(results.boxes)
+        detections = detections.filter(0.5)
+        num_tumors = len(detections)
         if num_tumors > 0:
-            confidences = results.boxes.conf.cpu().numpy()
-            avg_confidence = float(confidences.mean())
+            avg_confidence = float(detections.confidences.mean())
         else:
             avg_confidence = 0.0
         
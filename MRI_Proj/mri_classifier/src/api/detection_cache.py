@@ -0,0 +1,151 @@
+"""
+Confidence-agnostic cache of raw YOLO detections
+Detection runs once at a low floor threshold; any later threshold for the same
+upload is answered by filtering the cached arrays
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Detections:
+    """
+    Plain-array detections for one image.
+
+    boxes: (N, 4) float32 [x1, y1, x2, y2] in original image pixels
+    confidences: (N,) float32
+    class_ids: (N,) int32
+    image_shape: (height, width) of the original image
+    """
+    boxes: np.ndarray
+    confidences: np.ndarray
+    class_ids: np.ndarray
+    image_shape: Tuple[int, int]
+
+    @classmethod
+    def from_results(cls, yolo_results) -> "Detections":
+        """
+        Build from a Results object from ultralytics YOLO model.predict().
+        """
+        image_shape = tuple(int(v) for v in yolo_results.orig_shape)
+        if yolo_results.boxes is None or len(yolo_results.boxes) == 0:
+            return cls.empty(image_shape)
+        return cls(
+            boxes=yolo_results.boxes.xyxy.cpu().numpy().astype(np.float32),
+            confidences=yolo_results.boxes.conf.cpu().numpy().astype(np.float32),
+            class_ids=yolo_results.boxes.cls.cpu().numpy().astype(np.int32),
+            image_shape=image_shape
+        )
+
+    @classmethod
+    def empty(cls, image_shape: Tuple[int, int]) -> "Detections":
+        return cls(
+            boxes=np.zeros((0, 4), dtype=np.float32),
+            confidences=np.zeros(0, dtype=np.float32),
+            class_ids=np.zeros(0, dtype=np.int32),
+            image_shape=image_shape
+        )
+
+    def filter(self, confidence: float) -> "Detections":
+        """
+        Keep only detections with confidence >= the given threshold.
+        """
+        keep = self.confidences >= confidence
+        return Detections(self.boxes[keep], self.confidences[keep], self.class_ids[keep], self.image_shape)
+
+    def __len__(self) -> int:
+        return len(self.confidences)
+
+    def resized(self, image_shape: Tuple[int, int]) -> "Detections":
+        """
+        Map boxes onto the same image at another resolution, e.g. from a
+        reduced decode back to the original upload's pixels.
+        """
+        if tuple(image_shape) == tuple(self.image_shape):
+            return self
+        scale = np.array([
+            image_shape[1] / self.image_shape[1],
+            image_shape[0] / self.image_shape[0],
+        ] * 2, dtype=np.float32)
+        return Detections(self.boxes * scale, self.confidences, self.class_ids, tuple(image_shape))
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-ready form for clients that draw the boxes themselves.
+        """
+        height, width = self.image_shape
+        return {
+            "num_detections": len(self),
+            "boxes": self.boxes.tolist(),
+            "confidences": self.confidences.tolist(),
+            "class_ids": self.class_ids.tolist(),
+            "image_width": width,
+            "image_height": height,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self.boxes.nbytes + self.confidences.nbytes + self.class_ids.nbytes
+
+
+def image_digest(raw: bytes) -> str:
+    """
+    SHA-256 of an upload's bytes; combined with the model id to key cached detections.
+    """
+    return hashlib.sha256(raw).hexdigest()
+
+
+class DetectionCache:
+    """
+    Thread-safe, size-bounded LRU of Detections keyed by (model id, image digest).
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Detections]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Detections]:
+        with self._lock:
+            detections = self._entries.get(key)
+            if detections is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return detections
+
+    def put(self, key: Hashable, detections: Detections):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = detections
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(d.nbytes for d in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,194 @@
+"""
+Content-negotiated image encoding for API responses
+Every image the API returns (annotated scans, masks, registered images, change
+visualisations) is encoded here, as lossless WebP, JPEG at a chosen quality or
+fast-compression PNG, picked from an explicit request parameter or the Accept header
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+import timing
+
+# format name -> media type
+FORMATS = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+_ALIASES = {"jpg": "jpeg", "image/jpg": "jpeg", **{media: name for name, media in FORMATS.items()}}
+
+
+@dataclass(frozen=True)
+class OutputEncoding:
+    """
+    Negotiated encoding for one request.
+
+    format: "png", "webp" (always lossless) or "jpeg"
+    quality: JPEG quality 1-95; ignored by the lossless formats
+    """
+    format: str
+    quality: int
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format]
+
+
+def _parse_accept(accept: str):
+    # Yields (media_type, q) in header order
+    for part in accept.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        yield fields[0].lower(), q
+
+
+class EncodingStats:
+    """
+    Per-format encode count, time and output size.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total_bytes = 0
+        self.total_pixels = 0
+        self.total_ms = 0.0
+        self._recent_ms = deque(maxlen=window)
+
+    def record(self, encode_ms: float, nbytes: int, pixels: int):
+        self.count += 1
+        self.total_bytes += nbytes
+        self.total_pixels += pixels
+        self.total_ms += encode_ms
+        self._recent_ms.append(encode_ms)
+
+    def as_dict(self) -> Dict:
+        recent = np.array(self._recent_ms) if self._recent_ms else np.zeros(1)
+        return {
+            "images": self.count,
+            "mean_encode_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_encode_ms": float(np.percentile(recent, 50)),
+            "p95_encode_ms": float(np.percentile(recent, 95)),
+            "mean_bytes": self.total_bytes / self.count if self.count else 0.0,
+            "bits_per_pixel": 8 * self.total_bytes / self.total_pixels if self.total_pixels else 0.0,
+        }
+
+
+class ImageEncoder:
+    """
+    Negotiates and performs image encoding, keeping per-format metrics.
+
+    Masks are never encoded lossily: JPEG requests fall back to PNG for them,
+    and binary masks are written as 1-bit PNG ("png-1bit" in the metrics).
+    """
+
+    def __init__(
+        self,
+        default_format: str = "png",
+        jpeg_quality: int = 90,
+        png_compress_level: int = 1,
+        webp_method: int = 1
+    ):
+        self.default = OutputEncoding(self._format_name(default_format), jpeg_quality)
+        self.png_compress_level = png_compress_level
+        self.webp_method = webp_method
+        self._stats: Dict[str, EncodingStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _format_name(name: str) -> str:
+        name = name.strip().lower()
+        name = _ALIASES.get(name, name)
+        if name not in FORMATS:
+            raise ValueError(f"Unsupported image format '{name}', expected one of: {', '.join(FORMATS)}")
+        return name
+
+    def negotiate(
+        self,
+        accept: Optional[str] = None,
+        image_format: Optional[str] = None,
+        quality: Optional[int] = None
+    ) -> OutputEncoding:
+        """
+        Pick the output encoding for a request.
+
+        An explicit image_format wins; otherwise the supported image type with
+        the highest q in Accept is used, and anything else (JSON, */*, image/*)
+        gets the configured default.
+
+        Raises:
+            ValueError: Unknown image_format or quality outside 1-95
+        """
+        if quality is not None and not 1 <= quality <= 95:
+            raise ValueError("image_quality must be between 1 and 95")
+        quality = quality if quality is not None else self.default.quality
+
+        if image_format:
+            return OutputEncoding(self._format_name(image_format), quality)
+
+        best, best_q = None, 0.0
+        for media_type, q in _parse_accept(accept or ""):
+            name = _ALIASES.get(media_type)
+            if name is not None and q > best_q:
+                best, best_q = name, q
+        return OutputEncoding(best or self.default.format, quality)
+
+    def _save(self, pil: Image.Image, fmt: str, quality: int, key: str) -> bytes:
+        t0 = time.perf_counter()
+        buf = BytesIO()
+        if fmt == "png":
+            pil.save(buf, format="PNG", compress_level=self.png_compress_level)
+        elif fmt == "webp":
+            pil.save(buf, format="WEBP", lossless=True, method=self.webp_method, quality=25)
+        else:
+            pil.save(buf, format="JPEG", quality=quality)
+        data = buf.getvalue()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        timing.add("encode", elapsed_ms)
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = EncodingStats()
+            stats.record(elapsed_ms, len(data), pil.width * pil.height)
+        return data
+
+    def encode(self, image: Union[np.ndarray, Image.Image], encoding: OutputEncoding) -> bytes:
+        """
+        Encode an RGB or grayscale image (uint8 array or PIL image).
+        """
+        pil = image if isinstance(image, Image.Image) else Image.fromarray(image)
+        return self._save(pil, encoding.format, encoding.quality, encoding.format)
+
+    def encode_mask(self, mask: np.ndarray, encoding: OutputEncoding, binary: bool) -> Tuple[bytes, str]:
+        """
+        Encode a uint8 mask losslessly.
+
+        Returns:
+            (encoded bytes, media type)
+        """
+        fmt = "webp" if encoding.format == "webp" else "png"
+        if binary and fmt == "png":
+            return self._save(Image.fromarray(mask > 0), "png", 0, "png-1bit"), FORMATS["png"]
+        return self._save(Image.fromarray(mask.astype(np.uint8)), fmt, 0, fmt), FORMATS[fmt]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            formats = {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
+        return {
+            "default_format": self.default.format,
+            "jpeg_quality": self.default.quality,
+            "png_compress_level": self.png_compress_level,
+            "webp_method": self.webp_method,
+            "formats": formats,
+        }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Export yolo12n_3.pt to the ONNX Runtime / OpenVINO backends, check that they
+agree with PyTorch, and compare their CPU latency
+
+Usage:
+    python export_backends.py export --backend onnx
+    python export_backends.py compare --backends onnx openvino --limit 40
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from backends import BACKENDS, export_backend, load_detector, requires_calibration
+from dataset import dataset_images
+from mask_utils import box_iou, extract_boxes_and_confidences
+import settings
+
+REPORT_DIR = settings.BASE_DIR / "reports"
+
+
+def match_detections(
+    ref_boxes: np.ndarray,
+    ref_confidences: np.ndarray,
+    boxes: np.ndarray,
+    confidences: np.ndarray,
+    iou_threshold: float = 0.9
+) -> Dict:
+    """
+    Greedily match candidate detections to reference detections by IoU.
+
+    Returns:
+        Dictionary with matched/unmatched counts, the IoU of every match and
+        the absolute confidence difference of every match
+    """
+    ious = box_iou(ref_boxes, boxes)
+    matched_ious, conf_deltas = [], []
+    used = set()
+
+    # Highest-confidence reference boxes pick first
+    for i in np.argsort(-ref_confidences):
+        candidates = [j for j in np.argsort(-ious[i]) if j not in used and ious[i, j] >= iou_threshold]
+        if not candidates:
+            continue
+        j = candidates[0]
+        used.add(j)
+        matched_ious.append(float(ious[i, j]))
+        conf_deltas.append(float(abs(ref_confidences[i] - confidences[j])))
+
+    return {
+        "matched": len(matched_ious),
+        "missing": len(ref_boxes) - len(matched_ious),
+        "extra": len(boxes) - len(matched_ious),
+        "ious": matched_ious,
+        "conf_deltas": conf_deltas,
+    }
+
+
+def run_detector(model, images: List[Path], confidence: float, warmup: int = 3) -> Tuple[List, List[float]]:
+    """
+    Predict every image one at a time, recording per-image latency.
+
+    Returns:
+        (detections, latencies_ms) where detections is a list of (boxes, confidences)
+    """
+    pils = [Image.open(p).convert("RGB") for p in images]
+    for pil in pils[:warmup]:
+        model.predict(pil, conf=confidence, verbose=False)
+
+    detections, latencies = [], []
+    for pil in pils:
+        started = time.perf_counter()
+        results = model.predict(pil, conf=confidence, verbose=False)[0]
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        detections.append(extract_boxes_and_confidences(results))
+    return detections, latencies
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    return {
+        "mean_ms": float(np.mean(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def compare_backends(backends: List[str], limit: int, confidence: float, iou_threshold: float, conf_tolerance: float) -> Dict:
+    """
+    Run PyTorch and each backend over the dataset and build the parity/latency report.
+    """
+    images = [path for path, _ in dataset_images(limit_per_class=limit)]
+    print(f"📸 Comparing over {len(images)} images from public/dataset")
+
+    reference, reference_latency = run_detector(
+        load_detector(settings.MODEL_PATH, "pytorch"), images, confidence
+    )
+    report = {
+        "images": len(images),
+        "confidence": confidence,
+        "iou_threshold": iou_threshold,
+        "conf_tolerance": conf_tolerance,
+        "backends": {"pytorch": {"latency": latency_summary(reference_latency)}},
+    }
+
+    for backend in backends:
+        detections, latencies = run_detector(
+            load_detector(settings.MODEL_PATH, backend), images, confidence
+        )
+
+        totals = {"matched": 0, "missing": 0, "extra": 0}
+        ious, deltas, mismatched_images = [], [], []
+        for path, (ref_boxes, ref_conf), (boxes, conf) in zip(images, reference, detections):
+            match = match_detections(ref_boxes, ref_conf, boxes, conf, iou_threshold)
+            for key in totals:
+                totals[key] += match[key]
+            ious.extend(match["ious"])
+            deltas.extend(match["conf_deltas"])
+            if match["missing"] or match["extra"]:
+                mismatched_images.append(path.name)
+
+        max_delta = max(deltas) if deltas else 0.0
+        report["backends"][backend] = {
+            "latency": latency_summary(latencies),
+            "speedup_vs_pytorch": float(np.median(reference_latency) / np.median(latencies)),
+            "parity": {
+                **totals,
+                "mean_iou": float(np.mean(ious)) if ious else 1.0,
+                "max_conf_delta": max_delta,
+                "mismatched_images": mismatched_images,
+                "passed": not mismatched_images and max_delta <= conf_tolerance,
+            },
+        }
+
+    return report
+
+
+def print_report(report: Dict):
+    print("\n" + "=" * 76)
+    print(f"{'backend':<14} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'missing':>8} {'extra':>6} {'max Δconf':>10}  parity")
+    print("=" * 76)
+    for backend, data in report["backends"].items():
+        latency = data["latency"]
+        parity = data.get("parity")
+        if parity is None:
+            print(f"{backend:<14} {latency['p50_ms']:>8.1f} {latency['p95_ms']:>8.1f} {'1.00x':>8}  (reference)")
+            continue
+        print(
+            f"{backend:<14} {latency['p50_ms']:>8.1f} {latency['p95_ms']:>8.1f} "
+            f"{data['speedup_vs_pytorch']:>7.2f}x {parity['missing']:>8} {parity['extra']:>6} "
+            f"{parity['max_conf_delta']:>10.4f}  {'✓' if parity['passed'] else '✗'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export the .pt weights to a backend")
+    export.add_argument(
+        "--backend",
+        choices=[b for b in BACKENDS if BACKENDS[b] and not requires_calibration(b)],
+        nargs="+",
+        required=True,
+        help="INT8 variants are built by quantize_model.py"
+    )
+    export.add_argument("--imgsz", type=int, default=640)
+
+    compare = commands.add_parser("compare", help="Parity and latency check against PyTorch")
+    compare.add_argument("--backends", choices=[b for b in BACKENDS if BACKENDS[b]], nargs="+", required=True)
+    compare.add_argument("--limit", type=int, default=25, help="Images per dataset folder")
+    compare.add_argument("--confidence", type=float, default=0.25)
+    compare.add_argument("--iou", type=float, default=0.9, help="Minimum IoU for matching boxes")
+    compare.add_argument("--conf-tolerance", type=float, default=0.02)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for backend in args.backend:
+            path = export_backend(settings.MODEL_PATH, backend, imgsz=args.imgsz)
+            print(f"✅ Exported {backend} model to {path}")
+        return 0
+
+    report = compare_backends(args.backends, args.limit, args.confidence, args.iou, args.conf_tolerance)
+    print_report(report)
+
+    REPORT_DIR.mkdir(exist_ok=True)
+    report_path = REPORT_DIR / "backend_comparison.json"
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"\n✅ Report written to {report_path}")
+
+    passed = all(data["parity"]["passed"] for data in report["backends"].values() if "parity" in data)
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
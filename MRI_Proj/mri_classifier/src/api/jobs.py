@@ -0,0 +1,389 @@
+"""
+Background jobs for long-running requests
+Work is submitted and runs on the server's own event loop and worker pools,
+detached from the HTTP request; job status and finished results are kept in
+a local SQLite file for a limited time so clients can poll (or long-poll)
+and fetch results later instead of holding a connection open
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from responses import Images
+from worker_pools import ServerBusyError
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id   TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    status   TEXT NOT NULL,
+    created  REAL NOT NULL,
+    started  REAL,
+    finished REAL,
+    expires  REAL,
+    error    TEXT,
+    metadata TEXT,
+    owner    TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires);
+CREATE TABLE IF NOT EXISTS job_images (
+    job_id     TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    data       BLOB NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+FINISHED = ("done", "failed")
+
+# Owner ids of the JobStores open in this process
+_open_owners = set()
+
+
+def _process_start(pid: int) -> str:
+    """
+    Start time of a process in clock ticks since boot, telling a reused pid
+    apart from the process that had it; "" where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """
+    Whether the store that created a job ("host:pid:start:token") may still
+    be running it. Stores on other hosts sharing the file are assumed alive.
+    """
+    if not owner:
+        return False  # created before jobs recorded their owner
+    host, pid, start, _ = owner.rsplit(":", 3)
+    if host != socket.gethostname():
+        return True
+    pid = int(pid)
+    if pid == os.getpid():
+        return owner in _open_owners
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return _process_start(pid) in ("", start)
+
+
+class JobNotFoundError(KeyError):
+    """
+    Raised for unknown job ids, including jobs whose results have expired.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        super().__init__(job_id)
+
+    def __str__(self):
+        return f"Job {self.job_id} not found or expired"
+
+
+@dataclass(frozen=True)
+class JobStatus:
+    """
+    Public view of a job.
+
+    status: "queued", "running", "done" or "failed"
+    created/started/finished/expires: Unix timestamps (None until reached);
+    results are deleted at expires, TTL seconds after the job finished
+    """
+    job_id: str
+    kind: str
+    status: str
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    expires: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class JobStore:
+    """
+    Job status and results persisted in SQLite.
+
+    Results (JSON metadata plus encoded images) are stored when a job
+    finishes and deleted once it expires. Several processes (uvicorn workers)
+    can share the file: each job records the store that created it, and jobs
+    whose store has gone (its process exited, or it was closed) are marked
+    failed on open and on every purge_expired.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 3600):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.expired = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "owner" not in columns:  # file from before jobs recorded their owner
+            with self._conn:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+        pid = os.getpid()
+        self.owner = f"{socket.gethostname()}:{pid}:{_process_start(pid)}:{uuid.uuid4().hex[:8]}"
+        _open_owners.add(self.owner)
+        self._fail_interrupted()
+
+    def _fail_interrupted(self) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            orphaned = [
+                (job_id,) for job_id, owner in self._conn.execute(
+                    "SELECT job_id, owner FROM jobs WHERE status NOT IN ('done', 'failed')"
+                ).fetchall()
+                if not _owner_alive(owner)
+            ]
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'failed', finished = ?, expires = ?, "
+                "error = 'Server restarted before the job finished' "
+                "WHERE job_id = ? AND status NOT IN ('done', 'failed')",
+                [(now, now + self.ttl_seconds, job_id) for (job_id,) in orphaned]
+            )
+        if orphaned:
+            log.warning("Job store: %d unfinished jobs of stopped processes marked failed", len(orphaned))
+        return len(orphaned)
+
+    def create(self, job_id: str, kind: str) -> JobStatus:
+        status = JobStatus(job_id, kind, "queued", time.time())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, created, owner) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, status.status, status.created, self.owner)
+            )
+        return status
+
+    def set_running(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? WHERE job_id = ?", (time.time(), job_id)
+            )
+
+    def set_done(self, job_id: str, metadata: Dict, images: Images):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_images VALUES (?, ?, ?, ?)",
+                [(job_id, name, media_type, data) for name, (data, media_type) in images.items()]
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, expires = ?, metadata = ? WHERE job_id = ?",
+                (now, now + self.ttl_seconds, json.dumps(metadata), job_id)
+            )
+
+    def set_failed(self, job_id: str, error: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, expires = ?, error = ? WHERE job_id = ?",
+                (now, now + self.ttl_seconds, error, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, created, started, finished, expires, error "
+                "FROM jobs WHERE job_id = ? AND (expires IS NULL OR expires > ?)",
+                (job_id, time.time())
+            ).fetchone()
+        return JobStatus(*row) if row is not None else None
+
+    def result(self, job_id: str) -> Optional[Tuple[Dict, Images]]:
+        """(metadata, images) of a finished, unexpired job, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata FROM jobs WHERE job_id = ? AND status = 'done' AND expires > ?",
+                (job_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            images = {
+                name: (bytes(data), media_type)
+                for name, media_type, data in self._conn.execute(
+                    "SELECT name, media_type, data FROM job_images WHERE job_id = ? ORDER BY rowid", (job_id,)
+                )
+            }
+        return json.loads(row[0]), images
+
+    def purge_expired(self) -> int:
+        # Also catches jobs of workers that died while this one kept running
+        self._fail_interrupted()
+        with self._lock, self._conn:
+            expired = [
+                job_id for (job_id,) in self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE expires <= ?", (time.time(),)
+                )
+            ]
+            self._conn.executemany("DELETE FROM job_images WHERE job_id = ?", [(j,) for j in expired])
+            self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(j,) for j in expired])
+        self.expired += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            (result_bytes,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM job_images").fetchone()
+        return {
+            "path": str(self.path),
+            "ttl_seconds": self.ttl_seconds,
+            "jobs": counts,
+            "result_bytes": result_bytes,
+            "expired": self.expired,
+        }
+
+    def close(self):
+        _open_owners.discard(self.owner)
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """
+    Runs submitted jobs in the background, at most max_running at once.
+
+    Up to max_queued jobs may be waiting or running; further submissions are
+    rejected with ServerBusyError. run_blocking runs the store's SQLite calls
+    off the event loop (e.g. WorkerPools.run_cpu).
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        max_running: int = 2,
+        max_queued: int = 32,
+        retry_after: int = 1,
+        run_blocking: Optional[Callable[..., Awaitable]] = None
+    ):
+        self.store = store
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self.submitted = 0
+        self.rejected = 0
+        self._run_blocking = run_blocking or asyncio.to_thread
+        self._semaphore = asyncio.Semaphore(max_running)
+        self._max_running = max_running
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    async def submit(self, kind: str, fn: Callable[[], Awaitable[Tuple[Dict, Images]]]) -> JobStatus:
+        """
+        Start fn() as a background job; it must return (metadata, images).
+        """
+        if len(self._tasks) >= self.max_queued:
+            self.rejected += 1
+            raise ServerBusyError("/jobs", self.retry_after)
+
+        job_id = uuid.uuid4().hex
+        status = await self._run_blocking(self.store.create, job_id, kind)
+        self._finished[job_id] = asyncio.Event()
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, kind, fn))
+        self.submitted += 1
+        return status
+
+    async def _run(self, job_id: str, kind: str, fn: Callable[[], Awaitable[Tuple[Dict, Images]]]):
+        try:
+            async with self._semaphore:
+                await self._run_blocking(self.store.set_running, job_id)
+                t0 = time.perf_counter()
+                try:
+                    metadata, images = await fn()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning("Job %s (%s) failed: %s", job_id, kind, e)
+                    await self._run_blocking(self.store.set_failed, job_id, str(e) or type(e).__name__)
+                else:
+                    await self._run_blocking(self.store.set_done, job_id, metadata, images)
+                    log.info("Job %s (%s) done in %.1f s", job_id, kind, time.perf_counter() - t0)
+        finally:
+            self._tasks.pop(job_id, None)
+            self._finished.pop(job_id).set()
+
+    async def get(self, job_id: str) -> JobStatus:
+        status = await self._run_blocking(self.store.get, job_id)
+        if status is None:
+            raise JobNotFoundError(job_id)
+        return status
+
+    async def wait(self, job_id: str, timeout: float, poll_interval: float = 0.5) -> JobStatus:
+        """
+        Status once the job has finished, or after timeout seconds (long polling).
+        Jobs started by another process sharing the store are polled instead.
+        """
+        deadline = time.monotonic() + timeout
+        status = await self.get(job_id)
+        while not status.complete:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            finished = self._finished.get(job_id)
+            try:
+                if finished is not None:
+                    await asyncio.wait_for(finished.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+            status = await self.get(job_id)
+        return status
+
+    async def result(self, job_id: str) -> Optional[Tuple[Dict, Images]]:
+        return await self._run_blocking(self.store.result, job_id)
+
+    async def purge_periodically(self, interval: float):
+        """Delete expired jobs every interval seconds; run as a background task."""
+        while True:
+            await asyncio.sleep(interval)
+            purged = await self._run_blocking(self.store.purge_expired)
+            if purged:
+                log.info("Job store: purged %d expired jobs", purged)
+
+    async def close(self):
+        """Cancel unfinished jobs (marked failed on the next open) and close the store."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.store.close()
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self._tasks),
+            "max_running": self._max_running,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "store": self.store.stats(),
+        }
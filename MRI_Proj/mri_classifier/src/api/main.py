@@ -1,27 +1,75 @@
 # src/api/main.py
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+import os
+import sys
+from pathlib import Path
+# Add current directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+import settings
+import native_threads
+# Cap BLAS threads before NumPy and OpenCV load it (see native_threads.py)
+native_threads.limit_env(settings.BLAS_THREADS)
+import asyncio
+import base64
+import cv2
+import hmac
+import itertools
+import queue
+import time
+from fastapi import Depends, FastAPI, File, UploadFile, Form, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from io import BytesIO
-from PIL import Image
-from ultralytics import YOLO          # pip install ultralytics
-from pathlib import Path
+import json
 import logging
 import numpy as np
-import sys
-from typing import Optional
-import base64
-# Add current directory to path for imports
-sys.path.insert(0, str(Path(__file__).parent))
-from mask_utils import extract_boxes_and_confidences, boxes_to_binary_mask, boxes_to_confidence_mask
-from registration_utils import register_images, register_and_apply_to_mask, preprocess_for_registration
-from change_metrics import (
-    compute_change_metrics,
-    compute_area_change,
-    create_change_visualization
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from mask_utils import (
+    MASK_FORMATS, boxes_to_binary_mask, boxes_to_confidence_mask,
+    boxes_to_mask_dict, mask_to_rle, mask_from_dict
 )
+from backends import load_detector, backend_model_path, model_fingerprint, model_footprint, served_model_id
+from batching import MicroBatcher
+from detection_cache import DetectionCache, Detections
+from result_store import ResultStore
+from render import OverlayRenderer
+from encoding import ImageEncoder, OutputEncoding
+from decoding import ImageDecoder, DecodedImage, ImageTooLargeError
+from responses import Images, build_response, negotiate_payload
+from jobs import JobManager, JobNotFoundError, JobStatus, JobStore
+from uploads import UploadLimitMiddleware, SpooledUpload, accept_upload, configure_spooling, extract_archive, holding
+from singleflight import SingleFlight
+from tiling import TilingConfig, tiled_predict
+from cascade import CascadeGate, gate_path
+from model_registry import ModelNotFoundError, ModelRegistry, ModelSpec, parse_model_specs
+from timing import ServerTimingMiddleware, stage, timed
+import metrics
+from metrics import Counter, Gauge, Histogram, Metric, MetricsMiddleware
+from profiling import ProfilingMiddleware, record_parameters
+from pipelines import run_registration, run_comparison, RegistrationError
+from worker_pools import WorkerPools, ConcurrencyLimiter, ServerBusyError, WorkerCrashedError
+from warmup import Readiness, NotReadyError, warm_detector, dummy_registration_pair
+from native_threads import ThreadLimits
+
+# record_parameters notes the form fields and upload hashes of profiled requests
+app = FastAPI(title="MRI-Tumour Scanner", dependencies=[Depends(record_parameters)])
+
+MB = 1024 * 1024
+
+# Maximum request body per upload endpoint
+UPLOAD_LIMITS = {
+    **{
+        path: settings.UPLOAD_MAX_REQUEST_MB * MB
+        for path in ("/scan", "/scan-with-mask", "/detect", "/register-scans", "/compare-scans")
+    },
+    "/scan-batch": settings.UPLOAD_MAX_BATCH_MB * MB,
+    "/jobs/compare-scans": settings.UPLOAD_MAX_REQUEST_MB * MB,
+    "/register-scans/stream": settings.UPLOAD_MAX_REQUEST_MB * MB,
+}
 
-app = FastAPI(title="MRI-Tumour Scanner")
+# Reject oversized or non-multipart upload requests before (or while) reading them;
+# added first so CORS headers still wrap its responses
+app.add_middleware(UploadLimitMiddleware, limits=UPLOAD_LIMITS)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -30,16 +78,168 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Model", "X-Tiling", "X-Profile-Id"],
 )
 
+# Per-stage durations in a Server-Timing header and a log line per request
+# (see timing.py). Its total covers the upload limit and CORS middleware; the
+# metrics and profiling middleware added below run outside it
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware, logger=logging.getLogger("uvicorn.timing"))
+
+# Request counts, latency histograms and in-flight requests for GET /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# cProfile for requests sending X-Profile: <PROFILING_TOKEN>, or to PROFILE_PATHS
+# (see profiling.py); outermost, so the other middleware is profiled too
+if settings.PROFILING_TOKEN or settings.PROFILE_PATHS:
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=settings.PROFILE_DIR,
+        token=settings.PROFILING_TOKEN,
+        paths=settings.PROFILE_PATHS,
+        keep=settings.PROFILE_KEEP,
+        logger=logging.getLogger("uvicorn.profiling")
+    )
+
 BASE_DIR = Path(__file__).resolve().parent      # → src/api/
-MODEL_PATH = BASE_DIR / "yolo12n_3.pt"      
+MODEL_PATH = settings.MODEL_PATH
+
+
+@dataclass
+class ServingModel:
+    """
+    A loaded detector and everything serving it needs. model_id
+    ("name/backend:weights-fingerprint", plus the cascade gate if any) keys
+    its cached and stored results.
+    """
+    name: str
+    model: Any
+    model_id: str
+    batcher: MicroBatcher  # concurrent requests for this model share batched predict calls
+    renderer: OverlayRenderer  # labelled with the model's class names
+    nbytes: int
+    gate: Optional[CascadeGate] = None  # screens scans before detection, if CASCADE_ENABLED
+    result_store: Optional[ResultStore] = None  # on-disk copy of its results, surviving restarts
+
+
+# Detectors by name: MODEL_PATH (named after its file) plus any in MODELS.
+# The default is loaded during startup (see _start_up) and others on their
+# first request, so importing this module stays cheap
+registry = ModelRegistry(
+    [ModelSpec(MODEL_PATH.stem, MODEL_PATH, settings.MODEL_BACKEND)]
+    + parse_model_specs(settings.MODELS, settings.MODEL_DIR),
+    default=settings.DEFAULT_MODEL,
+    load=lambda spec: _load_model(spec),
+    unload=lambda served: _unload_model(served),
+    footprint=lambda served: served.nbytes,
+    describe=lambda served: _describe_model(served),
+    memory_budget=settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+    idle_seconds=settings.MODEL_IDLE_SECONDS
+)
+readiness = Readiness()
+
+# Raw detections per upload and model, so confidence slider changes skip inference
+detection_cache = DetectionCache(max_entries=settings.DETECTION_CACHE_ENTRIES)
 
-model = YOLO(str(MODEL_PATH))                   # load once
-# ↑ adjust relative path if best.pt lives elsewhere
+# Uploaded files beyond UPLOAD_SPOOL_KB go to temporary files instead of memory
+configure_spooling(settings.UPLOAD_SPOOL_KB * 1024)
+
+# Uploads are decoded only as large as each use needs, straight from their spool
+decoder = ImageDecoder(
+    detect_side=settings.DECODE_DETECT_SIDE,
+    max_side=settings.DECODE_MAX_SIDE,
+    max_pixels=settings.UPLOAD_MAX_PIXELS
+)
+
+# Output image format/quality per request, with per-format encode metrics
+encoder = ImageEncoder(
+    default_format=settings.IMAGE_FORMAT,
+    jpeg_quality=settings.JPEG_QUALITY,
+    png_compress_level=settings.PNG_COMPRESS_LEVEL,
+    webp_method=settings.WEBP_METHOD
+)
+
+# Identical concurrent uploads share one in-flight computation
+inflight = SingleFlight()
+
+# Native library threads of this process, applied at startup
+thread_limits = ThreadLimits(
+    torch=settings.TORCH_THREADS,
+    torch_interop=settings.TORCH_INTEROP_THREADS,
+    opencv=settings.OPENCV_THREADS,
+    sitk=settings.SITK_THREADS,
+    blas=settings.BLAS_THREADS
+)
+
+# Blocking work runs on these pools so the event loop stays responsive
+pools = WorkerPools(
+    cpu_threads=settings.CPU_POOL_THREADS,
+    registration_processes=settings.REGISTRATION_PROCESSES,
+    initializer=native_threads.apply,
+    initargs=(thread_limits.for_registration_worker(),)
+)
+
+# Background comparison jobs; the store is opened at startup
+jobs = None
+
+# Per-endpoint admission control: (max running, max waiting)
+limiters = {
+    name: ConcurrencyLimiter(name, max_concurrent, max_queued, settings.RETRY_AFTER_SECONDS)
+    for name, (max_concurrent, max_queued) in {
+        "/scan": (settings.SCAN_MAX_CONCURRENT, settings.SCAN_MAX_QUEUED),
+        "/scan-with-mask": (settings.SCAN_MAX_CONCURRENT, settings.SCAN_MAX_QUEUED),
+        "/detect": (settings.SCAN_MAX_CONCURRENT, settings.SCAN_MAX_QUEUED),
+        "/register-scans": (settings.REGISTRATION_MAX_CONCURRENT, settings.REGISTRATION_MAX_QUEUED),
+        "/compare-scans": (settings.REGISTRATION_MAX_CONCURRENT, settings.REGISTRATION_MAX_QUEUED),
+        "/scan-batch": (settings.SCAN_BATCH_MAX_CONCURRENT, settings.SCAN_BATCH_MAX_QUEUED),
+    }.items()
+}
 
 log = logging.getLogger("uvicorn")  # reuse Uvicorn logger
 
+
+@app.exception_handler(ServerBusyError)
+async def server_busy_handler(request: Request, exc: ServerBusyError):
+    log.warning("   %s rejected: queue full", exc.endpoint)
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(WorkerCrashedError)
+async def worker_crashed_handler(request: Request, exc: WorkerCrashedError):
+    # The pool has been replaced, so the same request can be retried
+    log.error("   %s failed: %s", request.url.path, exc)
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)}
+    )
+
+@app.exception_handler(ImageTooLargeError)
+async def image_too_large_handler(request: Request, exc: ImageTooLargeError):
+    log.warning("   %s rejected: %s", request.url.path, exc)
+    return JSONResponse({"detail": str(exc)}, status_code=413)
+
+@app.exception_handler(JobNotFoundError)
+async def job_not_found_handler(request: Request, exc: JobNotFoundError):
+    return JSONResponse({"detail": str(exc)}, status_code=404)
+
+@app.exception_handler(ModelNotFoundError)
+async def model_not_found_handler(request: Request, exc: ModelNotFoundError):
+    return JSONResponse({"detail": str(exc)}, status_code=404)
+
+@app.exception_handler(NotReadyError)
+async def not_ready_handler(request: Request, exc: NotReadyError):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint - API information"""
@@ -49,171 +249,906 @@ async def root():
         "endpoints": {
             "/scan": "POST - Scan MRI image for tumors",
             "/scan-with-mask": "POST - Scan MRI image and return mask",
+            "/detect": "POST - Detect tumors and return boxes only (JSON, no rendering)",
             "/register-scans": "POST - Register (align) two MRI scans",
+            "/register-scans/stream": "POST - Register two scans, streaming optimizer progress (SSE)",
             "/compare-scans": "POST - Compare two MRI scans for changes",
+            "/scan-batch": "POST - Scan many images (files or a zip), streaming NDJSON results",
+            "/jobs/compare-scans": "POST - Start /compare-scans as a background job",
+            "/jobs/{job_id}": "GET - Job status (?wait=N to long-poll); /jobs/{job_id}/result for its result",
+            "/models": "GET - Registered detectors; POST to register weights; /models/{name}/load, /models/{name}/default; DELETE to unload",
             "/docs": "GET - Interactive API documentation (Swagger UI)",
             "/redoc": "GET - Alternative API documentation (ReDoc)",
-            "/health": "GET - Health check endpoint"
+            "/health": "GET - Liveness check endpoint",
+            "/ready": "GET - Readiness check (503 until the model is loaded and warmed up)",
+            "/stats": "GET - Inference batching and worker pool statistics",
+            "/metrics": "GET - Prometheus metrics (text exposition format)"
         }
     }
 
 @app.get("/health")
 async def health():
-    """Health check endpoint for monitoring"""
+    """Liveness check for monitoring; answers even while the model is still loading"""
     return {"status": "healthy", "service": "MRI Tumor Scanner API"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness check for load balancers; 503 until startup and warm-up finish"""
+    return JSONResponse(readiness.stats(), status_code=200 if readiness.ready else 503)
+
+@app.get("/stats")
+async def stats():
+    """Batching, worker pool and per-endpoint queue statistics for tuning"""
+    # The job and result stores are read from SQLite, so like /metrics this runs off the event loop
+    return await pools.run_cpu(_stats)
+
+
+def _stats() -> Dict:
+    return {
+        "models": registry.stats(),  # per model: batching, cascade gate and result store
+        "detection_cache": detection_cache.stats(),
+        "coalescing": inflight.stats(),
+        "decoding": decoder.stats.as_dict(),
+        "encoding": encoder.stats(),
+        "pools": pools.stats(),
+        "threads": {"limits": asdict(thread_limits), "actual": native_threads.report()},
+        "jobs": jobs.stats(),
+        "endpoints": {name: limiter.stats() for name, limiter in limiters.items()}
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: requests, latency, batching, caches, queues and process memory"""
+    # Collectors read SQLite-backed stores, so render off the event loop
+    return Response(await pools.run_cpu(metrics.REGISTRY.render), media_type=metrics.CONTENT_TYPE)
+
+
+# Per-model counters summed over every instance a model name has had, so hot
+# swaps and evictions don't reset them (see CumulativeTotals)
+model_totals = metrics.CumulativeTotals()
+
+
+def _model_counts(served: ServingModel) -> Dict[tuple, float]:
+    """Running counts of one loaded model instance, keyed for model_totals"""
+    batching = served.batcher.stats()
+    counts = {("batches", served.name): batching["batches"]}
+    for size, count in batching["batch_size_histogram"].items():
+        counts[("batch_size", served.name, int(size))] = count
+    if served.gate is not None:
+        counts[("cascade_skipped", served.name)] = served.gate.stats()["skipped"]
+    if served.result_store is not None:
+        counts[("result_store_hits", served.name)] = served.result_store.hits
+        counts[("result_store_misses", served.name)] = served.result_store.misses
+    return counts
+
+
+def _collect_metrics() -> List[Metric]:
+    """Scrape-time view of the statistics /stats reports"""
+    batch_size = Histogram(
+        "inference_batch_size", "Images per batched predict call", ("model",),
+        buckets=range(1, settings.BATCH_MAX_SIZE + 1)
+    )
+    batches = Counter("inference_batches_total", "Batched predict calls", ("model",))
+    batch_queue = Gauge("inference_queue_depth", "Images waiting for the next batch", ("model",))
+    gate_skipped = Counter("cascade_skipped_total", "Scans the cascade gate answered without detection", ("model",))
+    model_bytes = Gauge("model_memory_bytes", "Approximate memory held by each loaded model", ("model",))
+    cache_hits = Counter("cache_hits_total", "Cache lookups answered", ("cache",))
+    cache_misses = Counter("cache_misses_total", "Cache lookups missed", ("cache",))
+    cache_ratio = Gauge("cache_hit_ratio", "Share of cache lookups answered since start", ("cache",))
+    active = Gauge("endpoint_active_requests", "Requests holding a concurrency slot", ("endpoint",))
+    waiting = Gauge("endpoint_queued_requests", "Requests waiting for a concurrency slot", ("endpoint",))
+    rejected = Counter("endpoint_rejected_total", "Requests rejected with 503 at capacity", ("endpoint",))
+    coalesced = Counter("coalesced_requests_total", "Requests that shared an identical in-flight computation")
+    coalescing = Gauge("coalescing_in_flight", "Distinct computations in flight")
+    ready = Gauge("ready", "1 once the model is loaded and warmed up")
+
+    def count_cache(name: str, cache_stats: Dict):
+        cache_hits.labels(cache=name).inc(cache_stats["hits"])
+        cache_misses.labels(cache=name).inc(cache_stats["misses"])
+        cache_ratio.labels(cache=name).set(cache_stats["hit_ratio"])
+
+    for name, served in registry.loaded().items():
+        model_totals.update(id(served), _model_counts(served))
+        model_bytes.labels(model=name).set(served.nbytes)
+        batch_queue.labels(model=name).set(served.batcher.stats()["queue_depth"])
+
+    totals = model_totals.totals()
+    for key, value in totals.items():
+        kind, name = key[0], key[1]
+        if kind == "batches":
+            batches.labels(model=name).inc(value)
+        elif kind == "batch_size":
+            batch_size.labels(model=name).observe(key[2], int(value))
+        elif kind == "cascade_skipped":
+            gate_skipped.labels(model=name).inc(value)
+        elif kind == "result_store_hits":
+            hits = value
+            misses = totals.get(("result_store_misses", name), 0)
+            lookups = hits + misses
+            count_cache(f"result_store:{name}", {
+                "hits": hits, "misses": misses, "hit_ratio": hits / lookups if lookups else 0.0
+            })
+    count_cache("detections", detection_cache.stats())
+
+    for name, limiter in limiters.items():
+        endpoint_stats = limiter.stats()
+        active.labels(endpoint=name).set(endpoint_stats["active"])
+        waiting.labels(endpoint=name).set(endpoint_stats["waiting"])
+        rejected.labels(endpoint=name).inc(endpoint_stats["rejected"])
+
+    inflight_stats = inflight.stats()
+    coalesced.inc(inflight_stats["coalesced"])
+    coalescing.set(inflight_stats["in_flight"])
+    ready.set(readiness.ready)
+    return [
+        batch_size, batches, batch_queue, gate_skipped, model_bytes, cache_hits, cache_misses, cache_ratio,
+        active, waiting, rejected, coalesced, coalescing, ready,
+    ]
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+@app.on_event("startup")
+async def startup():
+    global jobs
+    native_threads.apply(thread_limits)
+    log.info("Native threads: %s", native_threads.describe(thread_limits))
+    if thread_limits.blas > 0 and not native_threads.blas_controllable():
+        log.warning(
+            "BLAS_THREADS=%d is only applied through the environment: threadpoolctl is not installed, "
+            "so BLAS libraries loaded before startup keep their own thread counts", thread_limits.blas
+        )
+    jobs = JobManager(
+        JobStore(settings.JOBS_STORE_PATH, settings.JOBS_TTL_SECONDS),
+        max_running=settings.JOBS_MAX_RUNNING,
+        max_queued=settings.JOBS_MAX_QUEUED,
+        retry_after=settings.RETRY_AFTER_SECONDS,
+        run_blocking=pools.run_cpu
+    )
+    app.state.purge_task = asyncio.create_task(jobs.purge_periodically(min(60, settings.JOBS_TTL_SECONDS)))
+    app.state.evict_task = asyncio.create_task(registry.evict_periodically(min(60, settings.MODEL_IDLE_SECONDS or 60)))
+    # Load and warm up in the background so /health answers meanwhile
+    app.state.startup_task = asyncio.create_task(_start_up())
+
+@app.on_event("shutdown")
+async def shutdown():
+    startup_task = getattr(app.state, "startup_task", None)
+    if startup_task is not None and not startup_task.done():
+        startup_task.cancel()
+    app.state.purge_task.cancel()
+    app.state.evict_task.cancel()
+    await jobs.close()
+    await registry.close()
+    pools.shutdown()
+
+
+async def _load_model(spec: ModelSpec) -> ServingModel:
+    """Load a registered detector with its cascade gate and result store (ModelRegistry load)."""
+    model = await pools.run_cpu(load_detector, spec.path, spec.backend)
+    model_path = backend_model_path(spec.path, spec.backend)
+    fingerprint = await pools.run_cpu(model_fingerprint, model_path)
+
+    gate = None
+    if settings.CASCADE_ENABLED:
+        # CASCADE_GATE_PATH belongs to MODEL_PATH; other weights use their own gate if one was calibrated
+        gate_file = settings.CASCADE_GATE_PATH if spec.path == MODEL_PATH else gate_path(spec.path)
+        if spec.path == MODEL_PATH or gate_file.exists():
+            gate = await pools.run_cpu(CascadeGate.load, gate_file, spec.path, settings.CASCADE_MARGIN)
+    # Gated results differ from the detector's alone, so cache them apart
+    model_id = served_model_id(spec.name, spec.backend, fingerprint, gate.id if gate is not None else None)
+
+    result_store = None
+    if settings.RESULT_STORE_ENABLED:
+        result_store = await pools.run_cpu(
+            ResultStore,
+            settings.RESULT_STORE_PATH,
+            model_id,
+            settings.RESULT_STORE_MAX_ENTRIES,
+            settings.RESULT_STORE_MAX_MB * 1024 * 1024
+        )
+
+    return ServingModel(
+        name=spec.name,
+        model=model,
+        model_id=model_id,
+        batcher=MicroBatcher(
+            lambda images, conf: model.predict(images, conf=conf),
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS
+        ),
+        renderer=OverlayRenderer(model.names),
+        nbytes=await pools.run_cpu(model_footprint, model, model_path),
+        gate=gate,
+        result_store=result_store
+    )
+
+
+async def _unload_model(served: ServingModel):
+    # Its last counts, so per-model counters carry on from them after a swap or eviction
+    model_totals.retire(id(served), _model_counts(served))
+    await served.batcher.close()
+    if served.result_store is not None:
+        served.result_store.close()
+
+
+def _describe_model(served: ServingModel) -> Dict:
+    return {
+        "model_id": served.model_id,
+        "batching": served.batcher.stats(),
+        "cascade": served.gate.stats() if served.gate is not None else None,
+        "result_store": served.result_store.stats() if served.result_store is not None else None,
+    }
+
+
+async def _warm(served: ServingModel):
+    # Through the batcher, so the inference thread itself is warmed
+    await warm_detector(
+        lambda image: served.batcher.predict(image, settings.DETECTION_CONF_FLOOR),
+        settings.WARMUP_SIZES,
+        settings.WARMUP_RUNS
+    )
+
+
+async def _start_up():
+    try:
+        readiness.set_phase("loading")
+        with readiness.step("load_model"):
+            served = await registry.load(registry.default)
+
+        if settings.WARMUP_ENABLED:
+            readiness.set_phase("warming")
+            with readiness.step("warm_detector"):
+                await _warm(served)
+            if settings.WARMUP_REGISTRATION:
+                with readiness.step("warm_registration"):
+                    # One job per worker process, so every process is spawned and has SimpleITK loaded
+                    fixed, moving = dummy_registration_pair()
+                    await asyncio.gather(*[
+                        pools.run_registration(run_registration, fixed, moving, "rigid")
+                        for _ in range(max(1, settings.REGISTRATION_PROCESSES))
+                    ])
+        readiness.set_phase("ready")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        readiness.fail(e)
+
+
+def _require_ready():
+    if not readiness.ready:
+        raise NotReadyError(readiness.phase, settings.RETRY_AFTER_SECONDS)
+
+
+# Masks may also be compact JSON masks from /scan-with-mask
+MASK_UPLOAD_TYPES = ("image/", "application/octet-stream", "application/json")
+ARCHIVE_UPLOAD_TYPES = ("application/zip", "application/x-zip-compressed", "application/octet-stream")
+
+
+def _accept(
+    upload: UploadFile, allowed_types=("image/", "application/octet-stream"), detach: bool = False
+) -> SpooledUpload:
+    """Size- and type-check an uploaded file (413 / 415) and wrap its spool."""
+    return accept_upload(upload, settings.UPLOAD_MAX_FILE_MB * MB, allowed_types, detach)
+
+
+@timed("decode")
+def _decode_display(upload: SpooledUpload) -> DecodedImage:
+    with upload.open() as f:
+        decoded = decoder.for_display(f)
+    log.info("   decoded %s -> %s in %.1f ms", decoded.original_size, decoded.image.size, decoded.decode_ms)
+    return decoded
+
+
+@timed("decode")
+def _decode_detection(upload: SpooledUpload) -> DecodedImage:
+    with upload.open() as f:
+        return decoder.for_detection(f)
+
+
+@timed("decode")
+def _decode_mask(upload: SpooledUpload, image_shape: Tuple[int, int]) -> np.ndarray:
+    """
+    A mask upload (grayscale image, or a compact JSON mask from /scan-with-mask),
+    resized to its scan's decoded (height, width) if the scan was reduced.
+    """
+    with upload.open() as f:
+        is_json = upload.content_type == "application/json" or f.read(64).lstrip()[:1] == b"{"
+    if is_json:
+        try:
+            mask = mask_from_dict(json.loads(upload.read()))
+        except ValueError as e:  # includes JSONDecodeError
+            raise HTTPException(status_code=400, detail=f"Invalid compact mask: {e}")
+    else:
+        with upload.open() as f:
+            mask = np.array(decoder.decode(f, "L").image)
+    if mask.shape != image_shape:
+        mask = cv2.resize(mask, (image_shape[1], image_shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask
+
+
+def _negotiate(accept: Optional[str], image_format: Optional[str], image_quality: Optional[int]) -> OutputEncoding:
+    try:
+        return encoder.negotiate(accept, image_format, image_quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _detect(
+    served: ServingModel,
+    digest: str,
+    upload: SpooledUpload,
+    confidence: float,
+    decoded: Optional[DecodedImage] = None
+) -> Detections:
+    """
+    Detections for an upload at the requested threshold.
+
+    Inference always runs at DETECTION_CONF_FLOOR and the raw arrays are
+    cached by model and upload hash (in memory, then on disk), so re-posting the same
+    file with a different threshold is answered by filtering instead of
+    predicting again. Thresholds below the floor behave like the floor.
+    The upload is only decoded on a miss, at detection resolution, unless the
+    caller already decoded it. Boxes are always in original upload pixels.
+    With CASCADE_ENABLED, scans the gate clears get no detections without
+    running the detector.
+    """
+    key = (served.model_id, digest)
+    detections = detection_cache.get(key)
+    if detections is not None:
+        log.info("   detection cache hit")
+    else:
+        # Concurrent misses for the same image share one lookup/prediction
+        detections = await inflight.do(
+            ("detect",) + key, holding(upload, lambda: _detect_uncached(served, digest, upload, decoded))
+        )
+    return detections.filter(confidence)
+
+
+async def _detect_uncached(
+    served: ServingModel, digest: str, upload: SpooledUpload, decoded: Optional[DecodedImage]
+) -> Detections:
+    floor = settings.DETECTION_CONF_FLOOR
+    key = (served.model_id, digest)
+    result_store, gate = served.result_store, served.gate
+
+    if result_store is not None:
+        detections = await pools.run_cpu(result_store.get, digest, floor)
+        if detections is not None:
+            log.info("   result store hit")
+            detection_cache.put(key, detections)
+            return detections
+
+    if decoded is None:
+        decoded = await pools.run_cpu(_decode_detection, upload)
+    passed = True
+    if gate is not None:
+        with stage("gate"):
+            passed, score = await pools.run_cpu(gate.screen, decoded.image)
+        if not passed:
+            log.info("   cascade gate: clean (score %.3f), detector skipped", score)
+    if passed:
+        with stage("detect"):
+            results = await served.batcher.predict(decoded.image, floor)
+        detections = Detections.from_results(results).resized(decoded.original_shape)
+    else:
+        detections = Detections.empty(decoded.original_shape)
+    detection_cache.put(key, detections)
+    if result_store is not None:
+        await pools.run_cpu(result_store.put, digest, floor, detections)
+    return detections
+
+
+def _tiling(tiled: bool, tile_size: Optional[int], tile_overlap: Optional[float]) -> Optional[TilingConfig]:
+    if not tiled:
+        return None
+    try:
+        return TilingConfig(
+            tile_size=tile_size or settings.TILE_SIZE,
+            overlap=settings.TILE_OVERLAP if tile_overlap is None else tile_overlap,
+            merge=settings.TILE_MERGE,
+            iou_threshold=settings.TILE_IOU_THRESHOLD,
+            include_full=settings.TILE_INCLUDE_FULL,
+            max_tiles=settings.TILE_MAX_TILES
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@timed("decode")
+def _decode_full(upload: SpooledUpload) -> DecodedImage:
+    with upload.open() as f:
+        return decoder.decode(f, "RGB")
+
+
+@timed("decode")
+def _decode_tiled(upload: SpooledUpload) -> Tuple[DecodedImage, DecodedImage]:
+    """(full resolution for sliced inference, display image reduced from it): one decode"""
+    with upload.open() as f:
+        full = decoder.decode(f, "RGB")
+    return full, decoder.display_from(full)
+
+
+async def _detect_tiled(
+    served: ServingModel,
+    digest: str,
+    upload: SpooledUpload,
+    confidence: float,
+    tiling: TilingConfig,
+    decoded: Optional[DecodedImage] = None
+) -> Tuple[Detections, Dict]:
+    """
+    _detect with sliced inference (see tiling.py) on the full-resolution upload.
+
+    Results are cached and stored under the upload hash plus the tiling
+    settings. The report (tile count, per-tile timing) is only available when
+    inference actually ran; cached answers report {"cached": true}. decoded,
+    if given, must be the upload at full resolution (see _decode_tiled).
+    """
+    key = f"{digest}:{tiling.key}"
+    detections = detection_cache.get((served.model_id, key))
+    if detections is not None:
+        log.info("   detection cache hit (tiled)")
+        return detections.filter(confidence), {"cached": True}
+    detections, report = await inflight.do(
+        ("detect", served.model_id, key), holding(upload, lambda: _detect_tiled_uncached(served, key, upload, tiling, decoded))
+    )
+    return detections.filter(confidence), report
+
+
+async def _detect_tiled_uncached(
+    served: ServingModel, key: str, upload: SpooledUpload, tiling: TilingConfig, decoded: Optional[DecodedImage]
+) -> Tuple[Detections, Dict]:
+    floor = settings.DETECTION_CONF_FLOOR
+    result_store = served.result_store
+
+    if result_store is not None:
+        detections = await pools.run_cpu(result_store.get, key, floor)
+        if detections is not None:
+            log.info("   result store hit (tiled)")
+            detection_cache.put((served.model_id, key), detections)
+            return detections, {"cached": True}
+
+    if decoded is None:
+        decoded = await pools.run_cpu(_decode_full, upload)
+    # Every tile goes to the batcher at once, so they share batched predict calls
+    with stage("detect"):
+        detections, report = await tiled_predict(
+            lambda tile: served.batcher.predict(tile, floor), decoded.image, tiling, pools.run_cpu
+        )
+    report["decode_ms"] = decoded.decode_ms
+    log.info("   tiled inference: %d tiles, %d -> %d boxes in %.0f ms",
+             report["tiles"], report["detections_before_merge"], len(detections), report["total_ms"])
+
+    detection_cache.put((served.model_id, key), detections)
+    if result_store is not None:
+        await pools.run_cpu(result_store.put, key, floor, detections)
+    return detections, report
+
+
+@timed("render")
+def _plot(decoded: DecodedImage, detections: Detections, renderer: OverlayRenderer) -> np.ndarray:
+    """Draw detections onto the scan (RGB; reused per-thread buffer, encode before the next call)"""
+    image = np.asarray(decoded.image)
+    detections = detections.resized(image.shape[:2])  # boxes onto a reduced decode
+    return renderer.draw(image, detections.boxes, detections.confidences, detections.class_ids)
+
+
+def _render_scan(
+    decoded: DecodedImage, detections: Detections, encoding: OutputEncoding, renderer: OverlayRenderer
+) -> bytes:
+    annotated = _plot(decoded, detections, renderer)  # numpy
+    log.info("   annotated array shape %s", annotated.shape)
+    return encoder.encode(annotated, encoding)
+
+
+def _rasterize_mask(detections: Detections, mask_type: str) -> np.ndarray:
+    """uint8 mask of the detections in original upload pixels"""
+    if mask_type == "confidence":
+        mask = boxes_to_confidence_mask(detections.boxes, detections.confidences, detections.image_shape)
+        # Convert to 0-255 range for visualization
+        return (mask * 255).astype(np.uint8)
+    # binary
+    return boxes_to_binary_mask(detections.boxes, detections.image_shape, detections.confidences)
+
+
+def _render_scan_with_mask(
+    decoded: DecodedImage,
+    detections: Detections,
+    mask_type: str,
+    mask_format: str,
+    encoding: OutputEncoding,
+    renderer: OverlayRenderer
+) -> Tuple[dict, Images]:
+    image_shape = detections.image_shape
+    boxes, confidences = detections.boxes, detections.confidences
+    metadata = {
+        "mask_type": mask_type,
+        "mask_format": mask_format,
+        "num_detections": len(boxes),
+        "boxes": boxes.tolist() if len(boxes) > 0 else [],
+        "confidences": confidences.tolist() if len(confidences) > 0 else []
+    }
+
+    # Create annotated image
+    annotated = _plot(decoded, detections, renderer)  # numpy array
+    images = {"annotated_image": (encoder.encode(annotated, encoding), encoding.media_type)}
+
+    # Rectangle lists need no rasterising at all
+    if mask_format == "boxes":
+        metadata["mask"] = boxes_to_mask_dict(boxes, confidences, image_shape, mask_type)
+        return metadata, images
+
+    mask_uint8 = _rasterize_mask(detections, mask_type)
+    log.info("   mask shape %s, unique values: %s", mask_uint8.shape, np.unique(mask_uint8))
+
+    if mask_format == "rle":
+        metadata["mask"] = mask_to_rle(mask_uint8)
+        return metadata, images
+
+    # Encode the mask like the annotated image (masks stay lossless); build_response
+    # packs both as base64 JSON, multipart or MessagePack
+    images["mask"] = encoder.encode_mask(mask_uint8, encoding, binary=mask_type != "confidence")
+    return metadata, images
+
+
 @app.post("/scan")
 async def scan(
     img: UploadFile = File(...),
-    confidence: float = Form(0.5)  # default confidence threshold
+    confidence: float = Form(0.5),  # default confidence threshold
+    image_format: Optional[str] = Form(None),  # "png", "webp" or "jpeg"; defaults from Accept
+    image_quality: Optional[int] = Form(None),  # JPEG quality
+    tiled: bool = Form(False),  # sliced inference for high-resolution scans
+    tile_size: Optional[int] = Form(None),
+    tile_overlap: Optional[float] = Form(None),
+    model: Optional[str] = Form(None),  # registered model name; defaults to the current default
+    accept: Optional[str] = Header(None)
 ):
     log.info("▶️  /scan called with %s (%s bytes), confidence=%.2f", 
              img.filename, img.size or "?", confidence)
+    _require_ready()
+    encoding = _negotiate(accept, image_format, image_quality)
+    tiling = _tiling(tiled, tile_size, tile_overlap)
+    model_name = registry.resolve(model)
 
-    raw = await img.read()
-    pil = Image.open(BytesIO(raw)).convert("RGB")
-    log.info("   image size %s", pil.size)
+    # Detached: a computation coalesced with other requests may outlive this one
+    upload = _accept(img, detach=True)
+    try:
+        digest = await pools.run_cpu(upload.digest)
 
-    # Pass confidence threshold to YOLO
-    results = model.predict(pil, conf=confidence)[0]
-    log.info("   found %d detections", len(results.boxes.xyxy))
+        async with registry.use(model_name) as served:
+            async def compute() -> Tuple[bytes, Optional[Dict]]:
+                async with limiters["/scan"].slot():
+                    # Batched with concurrent requests, or filtered from the detection cache
+                    report = None
+                    if tiling is not None:
+                        # One full-resolution decode serves both the tiles and the display image
+                        full, decoded = await pools.run_cpu(_decode_tiled, upload)
+                        detections, report = await _detect_tiled(served, digest, upload, confidence, tiling, full)
+                    else:
+                        decoded = await pools.run_cpu(_decode_display, upload)
+                        detections = await _detect(served, digest, upload, confidence, decoded)
+                    log.info("   found %d detections", len(detections))
 
-    annotated = results.plot()  # numpy
-    log.info("   annotated array shape %s", annotated.shape)
+                    return await pools.run_cpu(_render_scan, decoded, detections, encoding, served.renderer), report
 
-    buf = BytesIO()
-    Image.fromarray(annotated).save(buf, format="PNG")
-    buf.seek(0)
-    log.info("⬅️  returning %d bytes", buf.getbuffer().nbytes)
+            # Identical concurrent uploads share one computation
+            data, report = await inflight.do(
+                ("/scan", served.model_id, digest, confidence, encoding, tiling), holding(upload, compute)
+            )
+    finally:
+        upload.close()
+    log.info("⬅️  returning %d bytes of %s", len(data), encoding.media_type)
 
-    return StreamingResponse(buf, media_type="image/png")
+    headers = {"Vary": "Accept", "X-Model": model_name}
+    if report is not None:
+        # Summary only; per-tile timing is in /scan-with-mask's "tiling"
+        headers["X-Tiling"] = json.dumps({k: v for k, v in report.items() if k != "per_tile"}, separators=(",", ":"))
+    return StreamingResponse(BytesIO(data), media_type=encoding.media_type, headers=headers)
 
 
 @app.post("/scan-with-mask")
 async def scan_with_mask(
     img: UploadFile = File(...),
     confidence: float = Form(0.5),
-    mask_type: str = Form("binary")  # "binary" or "confidence"
+    mask_type: str = Form("binary"),  # "binary" or "confidence"
+    mask_format: str = Form("png"),  # "png", "boxes" or "rle"
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    tiled: bool = Form(False),
+    tile_size: Optional[int] = Form(None),
+    tile_overlap: Optional[float] = Form(None),
+    model: Optional[str] = Form(None),
+    accept: Optional[str] = Header(None)
 ):
     """
     Scan image and return both annotated image and mask.
-    Returns JSON with base64-encoded image and mask.
+    Returns JSON with base64-encoded image and mask; "media_types" gives each one's format.
+    Send Accept: multipart/mixed or application/msgpack to receive raw image bytes instead.
+    mask_format "boxes" or "rle" returns the mask as a compact JSON object (see
+    mask_utils.boxes_to_mask_dict / mask_to_rle) that /compare-scans also accepts.
+    tiled=true runs sliced inference on the full-resolution image and adds a
+    "tiling" report with per-tile timing. model selects a registered detector;
+    the X-Model response header names the one that answered.
     """
     log.info("▶️  /scan-with-mask called with %s, confidence=%.2f, mask_type=%s", 
              img.filename, confidence, mask_type)
+    _require_ready()
+    encoding = _negotiate(accept, image_format, image_quality)
+    if mask_format not in MASK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"mask_format must be one of: {', '.join(MASK_FORMATS)}")
+    tiling = _tiling(tiled, tile_size, tile_overlap)
+    model_name = registry.resolve(model)
 
-    raw = await img.read()
-    pil = Image.open(BytesIO(raw)).convert("RGB")
-    image_array = np.array(pil)
-    image_shape = image_array.shape[:2]  # (height, width)
-    
-    log.info("   image size %s", pil.size)
+    # Detached: a computation coalesced with other requests may outlive this one
+    upload = _accept(img, detach=True)
+    try:
+        digest = await pools.run_cpu(upload.digest)
 
-    # Run YOLO prediction
-    results = model.predict(pil, conf=confidence)[0]
-    log.info("   found %d detections", len(results.boxes.xyxy))
+        async with registry.use(model_name) as served:
+            async def compute() -> Tuple[dict, Images]:
+                async with limiters["/scan-with-mask"].slot():
+                    # Batched with concurrent requests, or filtered from the detection cache
+                    if tiling is not None:
+                        # One full-resolution decode serves both the tiles and the display image
+                        full, decoded = await pools.run_cpu(_decode_tiled, upload)
+                        detections, report = await _detect_tiled(served, digest, upload, confidence, tiling, full)
+                    else:
+                        decoded = await pools.run_cpu(_decode_display, upload)
+                        detections = await _detect(served, digest, upload, confidence, decoded)
+                    log.info("   found %d detections", len(detections))
 
-    # Extract boxes and confidences
-    boxes, confidences = extract_boxes_and_confidences(results)
-    
-    # Generate mask based on type
-    if mask_type == "confidence":
-        mask = boxes_to_confidence_mask(boxes, confidences, image_shape)
-        # Convert to 0-255 range for visualization
-        mask_uint8 = (mask * 255).astype(np.uint8)
-    else:  # binary
-        mask_uint8 = boxes_to_binary_mask(boxes, image_shape, confidences)
-    
-    log.info("   mask shape %s, unique values: %s", mask_uint8.shape, np.unique(mask_uint8))
+                    metadata, images = await pools.run_cpu(
+                        _render_scan_with_mask, decoded, detections, mask_type, mask_format, encoding, served.renderer
+                    )
+                    if tiling is not None:
+                        metadata["tiling"] = report
+                    return metadata, images
 
-    # Create annotated image
-    annotated = results.plot()  # numpy array
-    
-    # Convert both to PIL Images and encode
-    annotated_pil = Image.fromarray(annotated)
-    mask_pil = Image.fromarray(mask_uint8, mode='L')  # Grayscale
-    
-    # Save to bytes
-    annotated_buf = BytesIO()
-    annotated_pil.save(annotated_buf, format="PNG")
-    annotated_buf.seek(0)
-    
-    mask_buf = BytesIO()
-    mask_pil.save(mask_buf, format="PNG")
-    mask_buf.seek(0)
-    
-    # Return as JSON with base64 encoding
-    import base64
-    from fastapi.responses import JSONResponse
-    
-    return JSONResponse({
-        "annotated_image": base64.b64encode(annotated_buf.read()).decode('utf-8'),
-        "mask": base64.b64encode(mask_buf.read()).decode('utf-8'),
-        "mask_type": mask_type,
-        "num_detections": len(boxes),
-        "boxes": boxes.tolist() if len(boxes) > 0 else [],
-        "confidences": confidences.tolist() if len(confidences) > 0 else []
-    })
+            # Identical concurrent uploads share one computation
+            metadata, images = await inflight.do(
+                ("/scan-with-mask", served.model_id, digest, confidence, mask_type, mask_format, encoding, tiling),
+                holding(upload, compute)
+            )
+    finally:
+        upload.close()
+
+    response = await pools.run_cpu(build_response, metadata, images, negotiate_payload(accept))
+    response.headers["X-Model"] = model_name
+    return response
+
+
+@app.post("/detect")
+async def detect(
+    img: UploadFile = File(...),
+    confidence: float = Form(0.5),
+    model: Optional[str] = Form(None)
+):
+    """
+    Detect tumours and return only boxes, confidences, class ids and image size.
+    No annotation, mask or PNG encoding happens, so clients that draw the boxes
+    themselves get the cheapest path; cached uploads are not even decoded.
+    """
+    log.info("▶️  /detect called with %s, confidence=%.2f", img.filename, confidence)
+    _require_ready()
+    model_name = registry.resolve(model)
+
+    # Detached: the detection may be shared with, and outlive, this request
+    upload = _accept(img, detach=True)
+    try:
+        async with limiters["/detect"].slot(), registry.use(model_name) as served:
+            digest = await pools.run_cpu(upload.digest)
+            detections = await _detect(served, digest, upload, confidence)
+            log.info("   found %d detections", len(detections))
+    finally:
+        upload.close()
+
+    return JSONResponse(detections.to_dict(), headers={"X-Model": model_name})
 
 
 @app.post("/register-scans")
 async def register_scans(
     fixed_img: UploadFile = File(...),
     moving_img: UploadFile = File(...),
-    registration_type: str = Form("rigid")  # "rigid" or "affine"
+    registration_type: str = Form("rigid"),  # "rigid" or "affine"
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    accept: Optional[str] = Header(None)
 ):
     """
     Register (align) two scans so they can be compared.
     Returns the registered moving image aligned to the fixed image.
     """
     log.info("▶️  /register-scans called, type=%s", registration_type)
-    
-    # Read both images
-    fixed_raw = await fixed_img.read()
-    moving_raw = await moving_img.read()
-    
-    fixed_pil = Image.open(BytesIO(fixed_raw)).convert("RGB")
-    moving_pil = Image.open(BytesIO(moving_raw)).convert("RGB")
-    
-    fixed_array = np.array(fixed_pil)
-    moving_array = np.array(moving_pil)
-    
+    encoding = _negotiate(accept, image_format, image_quality)
+
+    # Both images stay in their upload spools until decoded
+    fixed_upload = _accept(fixed_img)
+    moving_upload = _accept(moving_img)
+
+    async with limiters["/register-scans"].slot():
+        # Very large scans are registered at DECODE_MAX_SIDE
+        fixed_array = np.array((await pools.run_cpu(_decode_display, fixed_upload)).image)
+        moving_array = np.array((await pools.run_cpu(_decode_display, moving_upload)).image)
+
+        log.info("   Fixed image shape: %s", fixed_array.shape)
+        log.info("   Moving image shape: %s", moving_array.shape)
+
+        # Register images in a worker process
+        try:
+            registered_rgb = await pools.run_registration(
+                run_registration,
+                fixed_array,
+                moving_array,
+                registration_type
+            )
+            log.info("   Registration successful")
+        except RegistrationError as e:
+            log.error("   Registration failed: %s", str(e))
+            raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
+
+        data = await pools.run_cpu(encoder.encode, registered_rgb, encoding)
+
+    log.info("⬅️  returning registered image")
+
+    return StreamingResponse(BytesIO(data), media_type=encoding.media_type, headers={"Vary": "Accept"})
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+def _drain(progress) -> List[dict]:
+    # A Manager queue proxy round-trips to the manager process on every call,
+    # so this runs on the CPU pool, not the event loop
+    events = []
+    while True:
+        try:
+            events.append(progress.get_nowait())
+        except queue.Empty:
+            return events
+
+
+async def _registration_events(
+    fixed_array: np.ndarray, moving_array: np.ndarray, registration_type: str, encoding: OutputEncoding
+):
+    """
+    Server-Sent Events for one registration: "progress" while the optimizer
+    runs, then "result" (the registered image, base64) or "error".
+    """
+    interval = settings.REGISTRATION_PROGRESS_INTERVAL_MS / 1000
+    task = None
+    try:
+        async with limiters["/register-scans"].slot():
+            progress = await pools.run_cpu(pools.progress_queue)
+            task = asyncio.ensure_future(pools.run_registration(
+                run_registration, fixed_array, moving_array, registration_type, progress, interval
+            ))
+            last_sent = time.monotonic()
+            while not task.done():
+                await asyncio.wait({task}, timeout=interval)
+                events = await pools.run_cpu(_drain, progress)
+                for event in events:
+                    yield _sse("progress", event)
+                if events:
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent > 15:
+                    # Comment line keeps proxies from closing a queued, silent stream
+                    yield b": waiting\n\n"
+                    last_sent = time.monotonic()
+
+            registered_rgb = task.result()
+            data = await pools.run_cpu(encoder.encode, registered_rgb, encoding)
+        log.info("⬅️  streamed registration result")
+        yield _sse("result", {
+            "registered_image": base64.b64encode(data).decode("utf-8"),
+            "media_type": encoding.media_type,
+        })
+    except RegistrationError as e:
+        log.error("   Registration failed: %s", str(e))
+        yield _sse("error", {"detail": f"Registration failed: {str(e)}"})
+    except (ServerBusyError, WorkerCrashedError) as e:  # queue filled up after the early check, or worker died
+        yield _sse("error", {"detail": str(e)})
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+
+
+@app.post("/register-scans/stream")
+async def register_scans_stream(
+    fixed_img: UploadFile = File(...),
+    moving_img: UploadFile = File(...),
+    registration_type: str = Form("rigid"),
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    accept: Optional[str] = Header(None)
+):
+    """
+    /register-scans with live progress, as a text/event-stream response.
+
+    Sends "progress" events ({"iteration", "metric", "elapsed_ms"}, at most one
+    per REGISTRATION_PROGRESS_INTERVAL_MS) while SimpleITK optimizes, then one
+    "result" event with the registered image as base64 and its "media_type",
+    or an "error" event. Read it with fetch(); EventSource cannot POST.
+    """
+    log.info("▶️  /register-scans/stream called, type=%s", registration_type)
+    encoding = _negotiate(accept, image_format, image_quality)
+    limiters["/register-scans"].check()
+
+    # Decoded before streaming starts, as the uploads close when this returns
+    fixed_array = np.array((await pools.run_cpu(_decode_display, _accept(fixed_img))).image)
+    moving_array = np.array((await pools.run_cpu(_decode_display, _accept(moving_img))).image)
+
+    return StreamingResponse(
+        _registration_events(fixed_array, moving_array, registration_type, encoding),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _compare(
+    fixed: SpooledUpload,
+    moving: SpooledUpload,
+    fixed_mask: Optional[SpooledUpload],
+    moving_mask: Optional[SpooledUpload],
+    registration_type: str,
+    intensity_threshold: float,
+    return_visualization: bool,
+    encoding: OutputEncoding
+) -> Tuple[dict, Images]:
+    """
+    Decode, register and compare two scans; shared by /compare-scans and its
+    background job. Returns the response metadata and encoded images.
+    """
+    # Very large scans are registered at DECODE_MAX_SIDE
+    fixed_array = np.array((await pools.run_cpu(_decode_display, fixed)).image)
+    moving_array = np.array((await pools.run_cpu(_decode_display, moving)).image)
+
     log.info("   Fixed image shape: %s", fixed_array.shape)
     log.info("   Moving image shape: %s", moving_array.shape)
-    
-    # Preprocess images
-    fixed_processed = preprocess_for_registration(fixed_array)
-    moving_processed = preprocess_for_registration(moving_array)
-    
-    # Register images
+
+    # Read masks if provided
+    fixed_mask_array = None
+    moving_mask_array = None
+
+    # Masks can be images or compact JSON masks from /scan-with-mask (mask_format=boxes|rle)
+    if fixed_mask:
+        fixed_mask_array = await pools.run_cpu(_decode_mask, fixed_mask, fixed_array.shape[:2])
+        log.info("   Fixed mask provided, shape: %s", fixed_mask_array.shape)
+
+    if moving_mask:
+        moving_mask_array = await pools.run_cpu(_decode_mask, moving_mask, moving_array.shape[:2])
+        log.info("   Moving mask provided, shape: %s", moving_mask_array.shape)
+
+    # Register and compute change metrics in a worker process
     try:
-        registered_image, transform = register_images(
-            fixed_processed,
-            moving_processed,
-            registration_type
+        comparison = await pools.run_registration(
+            run_comparison,
+            fixed_array,
+            moving_array,
+            fixed_mask_array,
+            moving_mask_array,
+            registration_type,
+            intensity_threshold,
+            return_visualization
         )
-        log.info("   Registration successful")
-    except Exception as e:
+    except RegistrationError as e:
         log.error("   Registration failed: %s", str(e))
-        from fastapi import HTTPException
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
-    
-    # Convert registered image back to RGB for display
-    # (SimpleITK returns grayscale, so we'll create RGB version)
-    if len(registered_image.shape) == 2:
-        registered_rgb = np.stack([registered_image] * 3, axis=2)
-    else:
-        registered_rgb = registered_image
-    
-    # Save to buffer
-    registered_pil = Image.fromarray(registered_rgb.astype(np.uint8))
-    buf = BytesIO()
-    registered_pil.save(buf, format="PNG")
-    buf.seek(0)
-    
-    log.info("⬅️  returning registered image")
-    
-    return StreamingResponse(buf, media_type="image/png")
+
+    metadata = {
+        "metrics": comparison["metrics"],
+        "registration_type": registration_type
+    }
+    images = {}
+
+    if comparison["visualization"] is not None:
+        vis_bytes = await pools.run_cpu(encoder.encode, comparison["visualization"], encoding)
+        images["visualization"] = (vis_bytes, encoding.media_type)
+
+    # Also include registered image
+    reg_bytes = await pools.run_cpu(encoder.encode, comparison["registered_image"], encoding)
+    images["registered_image"] = (reg_bytes, encoding.media_type)
+    return metadata, images
 
 
 @app.post("/compare-scans")
@@ -224,7 +1159,10 @@ async def compare_scans(
     moving_mask: Optional[UploadFile] = File(None),
     registration_type: str = Form("rigid"),
     intensity_threshold: float = Form(10.0),
-    return_visualization: bool = Form(True)
+    return_visualization: bool = Form(True),
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    accept: Optional[str] = Header(None)
 ):
     """
     Compare two scans: register them, compute change metrics, and return results.
@@ -233,119 +1171,334 @@ async def compare_scans(
     1. Registers (aligns) the moving image to the fixed image
     2. Computes change metrics (intensity, area, pixel differences)
     3. Optionally returns a visualization of changes
+
+    Images are base64 in JSON by default; send Accept: multipart/mixed or
+    application/msgpack to receive them as raw bytes. For slow (e.g. affine)
+    registrations, POST /jobs/compare-scans runs the same comparison in the background.
     """
     log.info("▶️  /compare-scans called, type=%s, threshold=%.2f", registration_type, intensity_threshold)
-    
-    # Read images
-    fixed_raw = await fixed_img.read()
-    moving_raw = await moving_img.read()
-    
-    fixed_pil = Image.open(BytesIO(fixed_raw)).convert("RGB")
-    moving_pil = Image.open(BytesIO(moving_raw)).convert("RGB")
-    
-    fixed_array = np.array(fixed_pil)
-    moving_array = np.array(moving_pil)
-    
-    log.info("   Fixed image shape: %s", fixed_array.shape)
-    log.info("   Moving image shape: %s", moving_array.shape)
-    
-    # Read masks if provided
-    fixed_mask_array = None
-    moving_mask_array = None
-    registered_mask_array = None
-    
-    if fixed_mask:
-        fixed_mask_raw = await fixed_mask.read()
-        fixed_mask_pil = Image.open(BytesIO(fixed_mask_raw)).convert("L")
-        fixed_mask_array = np.array(fixed_mask_pil)
-        log.info("   Fixed mask provided, shape: %s", fixed_mask_array.shape)
-    
-    if moving_mask:
-        moving_mask_raw = await moving_mask.read()
-        moving_mask_pil = Image.open(BytesIO(moving_mask_raw)).convert("L")
-        moving_mask_array = np.array(moving_mask_pil)
-        log.info("   Moving mask provided, shape: %s", moving_mask_array.shape)
-    
-    # Preprocess and register
-    fixed_processed = preprocess_for_registration(fixed_array)
-    
-    # Resize moving to match fixed
-    from PIL import Image as PILImage
-    moving_resized = moving_pil.resize(fixed_pil.size, PILImage.Resampling.LANCZOS)
-    moving_processed = preprocess_for_registration(np.array(moving_resized))
-    
-    # Resize moving mask if provided
-    if moving_mask_array is not None:
-        moving_mask_resized = Image.fromarray(moving_mask_array, mode='L')
-        moving_mask_resized = moving_mask_resized.resize(fixed_pil.size, PILImage.Resampling.LANCZOS)
-        moving_mask_array = np.array(moving_mask_resized)
-    
-    # Register images
-    try:
-        registered_image, transform = register_images(
-            fixed_processed,
-            moving_processed,
-            registration_type
+    encoding = _negotiate(accept, image_format, image_quality)
+
+    # Images and masks stay in their upload spools until decoded
+    fixed_upload = _accept(fixed_img)
+    moving_upload = _accept(moving_img)
+    fixed_mask_upload = _accept(fixed_mask, MASK_UPLOAD_TYPES) if fixed_mask else None
+    moving_mask_upload = _accept(moving_mask, MASK_UPLOAD_TYPES) if moving_mask else None
+
+    async with limiters["/compare-scans"].slot():
+        metadata, images = await _compare(
+            fixed_upload, moving_upload, fixed_mask_upload, moving_mask_upload,
+            registration_type, intensity_threshold, return_visualization, encoding
         )
-        log.info("   Registration successful")
-        
-        # Register masks if provided
-        if moving_mask_array is not None:
-            registered_image_full, registered_mask_array = register_and_apply_to_mask(
-                fixed_processed,
-                moving_processed,
-                moving_mask_array,
-                registration_type
+
+    log.info("⬅️  returning comparison results")
+
+    return await pools.run_cpu(build_response, metadata, images, negotiate_payload(accept))
+
+
+@app.post("/jobs/compare-scans", status_code=202)
+async def submit_compare_job(
+    fixed_img: UploadFile = File(...),
+    moving_img: UploadFile = File(...),
+    fixed_mask: Optional[UploadFile] = File(None),
+    moving_mask: Optional[UploadFile] = File(None),
+    registration_type: str = Form("rigid"),
+    intensity_threshold: float = Form(10.0),
+    return_visualization: bool = Form(True),
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Start /compare-scans as a background job and return its id at once (202).
+
+    Takes the same fields as /compare-scans; image_format/Accept choose the
+    result image format now, the result payload (JSON, multipart, MessagePack)
+    is negotiated when fetching it. Poll GET /jobs/{job_id} (add ?wait=N to
+    long-poll) and fetch GET /jobs/{job_id}/result once it is done.
+    """
+    log.info("▶️  /jobs/compare-scans called, type=%s, threshold=%.2f", registration_type, intensity_threshold)
+    encoding = _negotiate(accept, image_format, image_quality)
+
+    # The job outlives this request, so it takes over the upload spools
+    uploads: List[SpooledUpload] = []
+
+    def take(upload: Optional[UploadFile], allowed_types=("image/", "application/octet-stream")):
+        if upload is None:
+            return None
+        uploads.append(_accept(upload, allowed_types, detach=True))
+        return uploads[-1]
+
+    async def run() -> Tuple[dict, Images]:
+        try:
+            return await _compare(
+                fixed, moving, fixed_mask_upload, moving_mask_upload,
+                registration_type, intensity_threshold, return_visualization, encoding
             )
-            log.info("   Mask registration successful")
-        
-    except Exception as e:
-        log.error("   Registration failed: %s", str(e))
-        from fastapi import HTTPException
-        raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
-    
-    # Compute change metrics
-    log.info("   Computing change metrics...")
-    metrics = compute_change_metrics(
-        fixed_processed,
-        registered_image,
-        fixed_mask_array,
-        registered_mask_array,
-        intensity_threshold
-    )
-    
-    # Add area change if both masks provided
-    if fixed_mask_array is not None and registered_mask_array is not None:
-        area_metrics = compute_area_change(fixed_mask_array, registered_mask_array)
-        metrics["area_change"] = area_metrics
-    
-    # Create visualization if requested
-    result = {
-        "metrics": metrics,
-        "registration_type": registration_type
-    }
-    
-    if return_visualization:
-        log.info("   Creating change visualization...")
-        visualization = create_change_visualization(
-            fixed_processed,
-            registered_image
+        finally:
+            for upload in uploads:
+                upload.close()
+
+    try:
+        fixed, moving = take(fixed_img), take(moving_img)
+        fixed_mask_upload = take(fixed_mask, MASK_UPLOAD_TYPES)
+        moving_mask_upload = take(moving_mask, MASK_UPLOAD_TYPES)
+        job = await jobs.submit("compare-scans", run)
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+
+    log.info("⬅️  job %s queued", job.job_id)
+    return JSONResponse(_job_body(job), status_code=202, headers={"Location": f"/jobs/{job.job_id}"})
+
+
+def _job_body(job: JobStatus) -> dict:
+    body = {**job.to_dict(), "status_url": f"/jobs/{job.job_id}"}
+    if job.status == "done":
+        body["result_url"] = f"/jobs/{job.job_id}/result"
+    return body
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = 0):
+    """
+    Status of a background job. With wait > 0 the request is held until the
+    job finishes or wait seconds pass (at most JOBS_MAX_WAIT_SECONDS).
+    """
+    wait = min(max(wait, 0.0), settings.JOBS_MAX_WAIT_SECONDS)
+    job = await jobs.wait(job_id, wait) if wait else await jobs.get(job_id)
+    return _job_body(job)
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, accept: Optional[str] = Header(None)):
+    """
+    Result of a finished job, in the same shape as the synchronous endpoint's
+    response. 409 while the job is still queued or running, or if it failed.
+    """
+    job = await jobs.get(job_id)
+    if job.status != "done":
+        detail = f"Job failed: {job.error}" if job.status == "failed" else f"Job is {job.status}"
+        raise HTTPException(status_code=409, detail=detail)
+    result = await jobs.result(job_id)
+    if result is None:  # expired between the two lookups
+        raise JobNotFoundError(job_id)
+    metadata, images = result
+    return await pools.run_cpu(build_response, metadata, images, negotiate_payload(accept))
+
+
+def _accept_batch(files: List[UploadFile], archive: Optional[UploadFile]) -> List[SpooledUpload]:
+    """
+    Check and take over a batch's spools: each file, plus every member of the
+    zip archive if one was sent. The caller closes the returned uploads.
+    """
+    uploads: List[SpooledUpload] = []
+    try:
+        for upload in files:
+            uploads.append(_accept(upload, detach=True))
+        if archive is not None:
+            uploads += extract_archive(
+                _accept(archive, ARCHIVE_UPLOAD_TYPES),
+                max_member_bytes=settings.UPLOAD_MAX_FILE_MB * MB,
+                max_total_bytes=settings.UPLOAD_MAX_BATCH_MB * MB,
+                max_members=settings.SCAN_BATCH_MAX_FILES,
+                spool_bytes=settings.UPLOAD_SPOOL_KB * 1024
+            )
+        if not uploads:
+            raise HTTPException(status_code=400, detail="Send images as files and/or a zip archive")
+        if len(uploads) > settings.SCAN_BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"At most {settings.SCAN_BATCH_MAX_FILES} images per batch")
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+    return uploads
+
+
+def _batch_result(
+    index: int, upload: SpooledUpload, detections: Detections, mask_type: str, mask_format: Optional[str]
+) -> dict:
+    result = {"index": index, "filename": upload.filename, **detections.to_dict()}
+    if mask_format == "boxes":
+        result["mask"] = boxes_to_mask_dict(
+            detections.boxes, detections.confidences, detections.image_shape, mask_type
         )
-        vis_pil = Image.fromarray(visualization)
-        vis_buf = BytesIO()
-        vis_pil.save(vis_buf, format="PNG")
-        vis_buf.seek(0)
-        
-        result["visualization"] = base64.b64encode(vis_buf.read()).decode('utf-8')
-    
-    # Also include registered image
-    registered_pil = Image.fromarray(registered_image.astype(np.uint8), mode='L')
-    reg_buf = BytesIO()
-    registered_pil.save(reg_buf, format="PNG")
-    reg_buf.seek(0)
-    
-    result["registered_image"] = base64.b64encode(reg_buf.read()).decode('utf-8')
-    
-    log.info("⬅️  returning comparison results")
-    
-    return JSONResponse(result)
+    elif mask_format == "rle":
+        result["mask"] = mask_to_rle(_rasterize_mask(detections, mask_type))
+    return result
+
+
+async def _scan_batch_item(
+    served: ServingModel,
+    index: int,
+    upload: SpooledUpload,
+    confidence: float,
+    mask_type: str,
+    mask_format: Optional[str]
+) -> dict:
+    try:
+        digest = await pools.run_cpu(upload.digest)
+        # Batched with the rest of this request and any concurrent scans
+        detections = await _detect(served, digest, upload, confidence)
+        return await pools.run_cpu(_batch_result, index, upload, detections, mask_type, mask_format)
+    except Exception as e:  # e.g. undecodable or oversized; one bad image must not end the stream
+        log.warning("   /scan-batch item %d (%s) failed: %r", index, upload.filename, e)
+        return {"index": index, "filename": upload.filename, "error": str(e)}
+    finally:
+        upload.close()
+
+
+async def _scan_batch_stream(
+    uploads: List[SpooledUpload], confidence: float, mask_type: str, mask_format: Optional[str], model_name: str
+):
+    """
+    NDJSON lines in completion order, keeping SCAN_BATCH_INFLIGHT images in
+    flight so the micro-batcher always has a full batch to run.
+    """
+    queue = iter(enumerate(uploads))
+    pending = set()
+    completed = 0
+    try:
+        async with limiters["/scan-batch"].slot(), registry.use(model_name) as served:
+            while True:
+                for index, upload in itertools.islice(queue, settings.SCAN_BATCH_INFLIGHT - len(pending)):
+                    pending.add(asyncio.ensure_future(
+                        _scan_batch_item(served, index, upload, confidence, mask_type, mask_format)
+                    ))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    completed += 1
+                    yield (json.dumps(task.result(), separators=(",", ":")) + "\n").encode("utf-8")
+    except ServerBusyError as e:  # the queue filled up after the early check in scan_batch
+        yield (json.dumps({"error": str(e)}) + "\n").encode("utf-8")
+    finally:
+        for task in pending:
+            task.cancel()
+        for upload in uploads:
+            upload.close()
+        log.info("⬅️  /scan-batch streamed %d of %d results", completed, len(uploads))
+
+
+@app.post("/scan-batch")
+async def scan_batch(
+    files: List[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),  # zip of images, alone or alongside files
+    confidence: float = Form(0.5),
+    mask_type: str = Form("binary"),  # "binary" or "confidence"
+    mask_format: Optional[str] = Form(None),  # "boxes" or "rle" to include a compact mask
+    model: Optional[str] = Form(None)
+):
+    """
+    Scan many images in one request.
+
+    Images go through batched inference and the response streams one
+    application/x-ndjson line per image as soon as it finishes (not in upload
+    order): index and filename, the /detect fields, and a compact mask when
+    mask_format is given. Images that cannot be decoded get a line with
+    "error" instead.
+    """
+    log.info("▶️  /scan-batch called with %d files%s, confidence=%.2f",
+             len(files or []), " and an archive" if archive else "", confidence)
+    _require_ready()
+    if mask_format not in (None, "boxes", "rle"):
+        raise HTTPException(status_code=400, detail="mask_format must be boxes or rle")
+    limiters["/scan-batch"].check()
+    model_name = registry.resolve(model)
+    # Load failures are answered here rather than in the middle of the stream
+    await registry.load(model_name)
+
+    uploads = await pools.run_cpu(_accept_batch, files or [], archive)
+    return StreamingResponse(
+        _scan_batch_stream(uploads, confidence, mask_type, mask_format, model_name),
+        media_type="application/x-ndjson",
+        headers={"X-Model": model_name}
+    )
+
+
+def _model_spec(name: str, path: str, backend: str) -> ModelSpec:
+    """A ModelSpec for weights under MODEL_DIR; 400 for anything else"""
+    # Lexical check: weights may be symlinks into a mounted volume
+    model_dir = Path(os.path.abspath(settings.MODEL_DIR))
+    weights = Path(os.path.normpath(model_dir / path))
+    if not weights.is_relative_to(model_dir):
+        raise HTTPException(status_code=400, detail="Model path must be inside MODEL_DIR")
+    if not weights.is_file():
+        raise HTTPException(status_code=400, detail=f"Model weights not found: {path}")
+    try:
+        return ModelSpec(name, weights, backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Model management needs X-Admin-Token matching ADMIN_TOKEN; without one set it is off"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model management is disabled; set ADMIN_TOKEN to enable it")
+    # Constant time, so the token cannot be guessed from response times
+    if x_admin_token is None or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token")
+
+
+async def _load_and_warm(name: str):
+    served = await registry.load(name)
+    if settings.WARMUP_ENABLED:
+        await _warm(served)
+
+
+@app.get("/models")
+async def list_models():
+    """Registered detectors, which are loaded, and the default"""
+    return registry.stats()
+
+
+@app.post("/models", dependencies=[Depends(_require_admin)])
+async def register_model(
+    name: str = Form(...),
+    path: str = Form(...),  # weights file, relative to MODEL_DIR
+    backend: str = Form("pytorch"),
+    load: bool = Form(False)
+):
+    """
+    Register weights under a name, or point an existing name at new weights.
+    A loaded model being replaced keeps answering until the new weights have
+    loaded; requests already running finish on the old ones.
+    """
+    spec = _model_spec(name, path, backend)
+    await registry.register(spec)
+    if load:
+        await _load_and_warm(spec.name)
+    log.info("Registered model %s -> %s (%s)", spec.name, spec.path, spec.backend)
+    return registry.stats()["models"][spec.name]
+
+
+@app.post("/models/{name}/load", dependencies=[Depends(_require_admin)])
+async def load_model(name: str):
+    """Load (and warm up) a model ahead of its first request"""
+    await _load_and_warm(registry.resolve(name))
+    return registry.stats()["models"][name]
+
+
+@app.post("/models/{name}/default", dependencies=[Depends(_require_admin)])
+async def set_default_model(name: str):
+    """
+    Make a model the default for requests without a "model" field. It is
+    loaded and warmed up first; requests running on the old default finish on it.
+    """
+    await _load_and_warm(registry.resolve(name))
+    await registry.set_default(name)
+    return registry.stats()
+
+
+@app.delete("/models/{name}", dependencies=[Depends(_require_admin)])
+async def unload_model(name: str):
+    """Unload a model (it stays registered and loads again on its next request)"""
+    try:
+        await registry.unload(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return registry.stats()["models"][name]
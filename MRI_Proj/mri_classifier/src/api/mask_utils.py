@@ -3,7 +3,27 @@ Utility functions for converting YOLO bounding boxes to pixel masks
 """
 import numpy as np
 import cv2
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
+
+MASK_FORMATS = ("png", "boxes", "rle")
+
+
+def clip_boxes_to_mask(boxes: np.ndarray, image_shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Integer pixel rectangles exactly as the mask rasterisers fill them.
+    
+    Args:
+        boxes: Array of bounding boxes [[x1, y1, x2, y2], ...], shape (N, 4)
+        image_shape: Tuple of (height, width) of the image
+    
+    Returns:
+        int32 array of shape (N, 4); each box covers rows y1:y2 and columns x1:x2
+    """
+    height, width = image_shape
+    rects = np.asarray(boxes).reshape(-1, 4).astype(int)
+    rects[:, [0, 2]] = np.clip(rects[:, [0, 2]], 0, width - 1)
+    rects[:, [1, 3]] = np.clip(rects[:, [1, 3]], 0, height - 1)
+    return rects.astype(np.int32)
 
 
 def boxes_to_binary_mask(
@@ -32,15 +52,8 @@ def boxes_to_binary_mask(
     if confidences is not None:
         boxes = boxes[confidences >= 0.5]
     
-    # Draw rectangles for each bounding box
-    for box in boxes:
-        x1, y1, x2, y2 = box.astype(int)
-        # Ensure coordinates are within image bounds
-        x1 = max(0, min(x1, width - 1))
-        y1 = max(0, min(y1, height - 1))
-        x2 = max(0, min(x2, width - 1))
-        y2 = max(0, min(y2, height - 1))
-        
+    # Draw rectangles for each bounding box, clipped to the image bounds
+    for x1, y1, x2, y2 in clip_boxes_to_mask(boxes, image_shape):
         # Fill rectangle in mask
         mask[y1:y2, x1:x2] = 255
     
@@ -71,15 +84,8 @@ def boxes_to_confidence_mask(
     height, width = image_shape
     mask = np.zeros((height, width), dtype=np.float32)
     
-    # Draw rectangles with confidence values
-    for box, conf in zip(boxes, confidences):
-        x1, y1, x2, y2 = box.astype(int)
-        # Ensure coordinates are within image bounds
-        x1 = max(0, min(x1, width - 1))
-        y1 = max(0, min(y1, height - 1))
-        x2 = max(0, min(x2, width - 1))
-        y2 = max(0, min(y2, height - 1))
-        
+    # Draw rectangles with confidence values, clipped to the image bounds
+    for (x1, y1, x2, y2), conf in zip(clip_boxes_to_mask(boxes, image_shape), confidences):
         # Use maximum confidence for overlapping regions
         mask[y1:y2, x1:x2] = np.maximum(mask[y1:y2, x1:x2], conf)
     
@@ -106,3 +112,137 @@ def extract_boxes_and_confidences(yolo_results) -> Tuple[np.ndarray, np.ndarray]
     
     return boxes, confidences
 
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise intersection-over-union between two sets of boxes.
+    
+    Args:
+        boxes_a: Array of boxes [[x1, y1, x2, y2], ...], shape (N, 4)
+        boxes_b: Array of boxes [[x1, y1, x2, y2], ...], shape (M, 4)
+    
+    Returns:
+        IoU matrix of shape (N, M) with values in [0, 1]
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    
+    # Intersection rectangle for every pair
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    
+    return intersection / np.maximum(union, 1e-8)
+
+
+def boxes_to_mask_dict(
+    boxes: np.ndarray,
+    confidences: np.ndarray,
+    image_shape: Tuple[int, int],
+    mask_type: str = "binary"
+) -> Dict:
+    """
+    Describe a mask as the rectangles it is made of, without rasterising it.
+    
+    Decoding with mask_from_dict gives exactly the uint8 mask /scan-with-mask
+    would otherwise send as a PNG (255 inside boxes for "binary", confidence
+    x 255 with the maximum on overlaps for "confidence").
+    
+    Args:
+        boxes: Array of bounding boxes [[x1, y1, x2, y2], ...], shape (N, 4)
+        confidences: Array of confidence scores, shape (N,)
+        image_shape: Tuple of (height, width) of the image
+        mask_type: "binary" (boxes with confidence >= 0.5) or "confidence"
+    
+    Returns:
+        {"format": "boxes", "size": [h, w], "boxes": [[x1, y1, x2, y2], ...]}
+        plus "values" (0-255 per box) for confidence masks
+    """
+    height, width = image_shape
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    confidences = np.asarray(confidences, dtype=np.float32)
+    result = {"format": "boxes", "size": [int(height), int(width)]}
+    if mask_type == "confidence":
+        result["boxes"] = clip_boxes_to_mask(boxes, image_shape).tolist()
+        result["values"] = (confidences * 255).astype(np.uint8).tolist()
+    else:
+        result["boxes"] = clip_boxes_to_mask(boxes[confidences >= 0.5], image_shape).tolist()
+    return result
+
+
+def mask_to_rle(mask: np.ndarray) -> Dict:
+    """
+    Run-length encode a uint8 mask in row-major order.
+    
+    Binary (0/255) masks store only alternating run lengths, starting with a
+    (possibly empty) background run. Other masks also store each run's value.
+    
+    Returns:
+        {"format": "rle", "size": [h, w], "counts": [...]} and, for non-binary
+        masks, "values": [...] with one entry per count
+    """
+    height, width = mask.shape
+    flat = np.ascontiguousarray(mask, dtype=np.uint8).ravel()
+    starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+    counts = np.diff(np.concatenate([starts, [flat.size]]))
+    values = flat[starts]
+
+    result = {"format": "rle", "size": [int(height), int(width)]}
+    if np.isin(values, (0, 255)).all():
+        # Alternating runs beginning with background
+        if flat.size and values[0] == 255:
+            counts = np.concatenate([[0], counts])
+        result["counts"] = counts.tolist()
+    else:
+        result["counts"] = counts.tolist()
+        result["values"] = values.tolist()
+    return result
+
+
+def mask_from_dict(data: Dict) -> np.ndarray:
+    """
+    Rasterise a compact mask produced by boxes_to_mask_dict or mask_to_rle.
+    
+    Raises:
+        ValueError: If the description is malformed
+    
+    Returns:
+        uint8 mask of shape (height, width)
+    """
+    try:
+        fmt = data["format"]
+        height, width = (int(v) for v in data["size"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Compact mask needs 'format' and 'size': [height, width]")
+    if height <= 0 or width <= 0:
+        raise ValueError("Compact mask size must be positive")
+
+    if fmt == "boxes":
+        boxes = np.asarray(data.get("boxes", []), dtype=np.float64).reshape(-1, 4)
+        values = data.get("values")
+        values = np.full(len(boxes), 255) if values is None else np.asarray(values)
+        if len(values) != len(boxes):
+            raise ValueError("Compact mask 'values' must have one entry per box")
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for (x1, y1, x2, y2), value in zip(clip_boxes_to_mask(boxes, (height, width)), values):
+            mask[y1:y2, x1:x2] = np.maximum(mask[y1:y2, x1:x2], np.uint8(value))
+        return mask
+
+    if fmt == "rle":
+        counts = np.asarray(data.get("counts", []), dtype=np.int64)
+        if "values" in data:
+            values = np.asarray(data["values"], dtype=np.uint8)
+        else:
+            values = np.where(np.arange(len(counts)) % 2 == 0, 0, 255).astype(np.uint8)
+        if len(values) != len(counts) or (counts < 0).any() or counts.sum() != height * width:
+            raise ValueError("RLE counts must be non-negative and sum to height * width")
+        return np.repeat(values, counts).reshape(height, width)
+
+    raise ValueError(f"Unknown compact mask format '{fmt}', expected 'boxes' or 'rle'")
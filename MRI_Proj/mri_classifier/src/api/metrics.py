@@ -0,0 +1,387 @@
+"""
+Prometheus metrics without a client library
+Counters, gauges and histograms kept in process and rendered in the Prometheus
+text exposition format (0.0.4) for GET /metrics. Statistics the API already
+keeps (batching, caches, queues) are read by collectors at scrape time instead
+of being counted twice, and observations made in registration worker
+processes are relayed back with the result
+"""
+import logging
+import math
+import os
+import resource
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Set by run_collected: histogram observations made in a worker process land
+# here instead of in that process's own (never scraped) registry
+_relay: ContextVar[Optional[list]] = ContextVar("metric_relay", default=None)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class Metric:
+    """
+    A metric family: one series per combination of label values.
+
+    Labelled metrics are used through labels(**values), as in
+    prometheus_client; metrics without labels can be used directly.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self, labels: Dict[str, str]):
+        raise NotImplementedError
+
+    def labels(self, **values):
+        if set(values) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(values)}")
+        key = tuple(str(values[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child(dict(zip(self.labelnames, key)))
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use labels()")
+        return self.labels()
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.help)}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples()]
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        yield name, labels, self.value
+
+
+class _CounterValue(_Value):
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        super().inc(amount)
+
+
+class Counter(Metric):
+    """Monotonically increasing count; the name should end in _total"""
+    type = "counter"
+
+    def _new_child(self, labels: Dict[str, str]):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    type = "gauge"
+
+    def _new_child(self, labels: Dict[str, str]):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, metric: "Histogram", labels: Dict[str, str]):
+        self._metric = metric
+        self._labels = labels
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(metric.buckets) + 1)  # the last is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float, count: int = 1):
+        """Record value (count times, for pre-aggregated data)"""
+        relay = _relay.get()
+        if relay is not None:
+            relay.append((self._metric.name, self._labels, value, count))
+            return
+        index = bisect_left(self._metric.buckets, value)
+        with self._lock:
+            self.counts[index] += count
+            self.sum += value * count
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for upper, count in zip(self._metric.buckets + (math.inf,), counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(upper)}, cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, cumulative
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed, cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+
+    def _new_child(self, labels: Dict[str, str]):
+        # Knows its labels, to relay observations by name and labels
+        return _HistogramValue(self, labels)
+
+    def observe(self, value: float, count: int = 1):
+        self._unlabelled().observe(value, count)
+
+
+class Registry:
+    """
+    Named metrics plus collectors, rendered together for a scrape.
+
+    A collector is called on every scrape and returns freshly built metrics,
+    for values that already live elsewhere (batch statistics, cache hit
+    counts); a collector that raises is skipped for that scrape.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric; registering a name again returns the existing metric"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for collector in list(self._collectors):
+            try:
+                metrics.extend(collector())
+            except Exception:  # one broken collector must not take down the scrape
+                log.exception("Metrics collector %r failed", collector)
+        return metrics
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.collect():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def replay(self, observations: Iterable[Tuple[str, Dict[str, str], float, int]]):
+        """Apply histogram observations relayed from a worker process (see run_collected)"""
+        for name, labels, value, count in observations:
+            metric = self._metrics.get(name)
+            if isinstance(metric, Histogram):
+                metric.labels(**labels).observe(value, count)
+
+
+class CumulativeTotals:
+    """
+    Counter totals over sources that come and go, such as models that are
+    swapped or evicted, each keeping its own running counts from zero.
+
+    Collectors call update(source, counts) with a source's current counts on
+    every scrape, and retire(source, counts) once with its final counts when
+    it goes away. Only increases are added, so the totals never go back down
+    and Prometheus never sees a counter reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Hashable, float] = {}
+        self._reported: Dict[Hashable, Dict[Hashable, float]] = {}
+
+    def update(self, source: Hashable, counts: Dict[Hashable, float]):
+        with self._lock:
+            reported = self._reported.setdefault(source, {})
+            for key, value in counts.items():
+                self._totals.setdefault(key, 0)
+                increase = value - reported.get(key, 0)
+                if increase > 0:
+                    self._totals[key] = self._totals.get(key, 0) + increase
+                    reported[key] = value
+
+    def retire(self, source: Hashable, counts: Dict[Hashable, float]):
+        self.update(source, counts)
+        with self._lock:
+            self._reported.pop(source, None)
+
+    def totals(self) -> Dict[Hashable, float]:
+        with self._lock:
+            return dict(self._totals)
+
+
+REGISTRY = Registry()
+
+
+def run_collected(fn: Callable, *args, **kwargs):
+    """
+    Call fn, capturing the histogram observations it makes instead of
+    recording them, and return (result, observations) for Registry.replay.
+    Used around calls sent to worker processes. Picklable, like fn must be.
+    """
+    observations = []
+    token = _relay.set(observations)
+    try:
+        return fn(*args, **kwargs), observations
+    finally:
+        _relay.reset(token)
+
+
+def _rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+_START_TIME = time.time()
+
+
+def process_metrics() -> List[Metric]:
+    """Standard process_* metrics: resident memory, CPU time and start time"""
+    rss = Gauge("process_resident_memory_bytes", "Resident memory size in bytes")
+    rss.set(_rss_bytes())
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = Counter("process_cpu_seconds_total", "User and system CPU time spent in seconds")
+    cpu.inc(usage.ru_utime + usage.ru_stime)
+    start = Gauge("process_start_time_seconds", "Start time of the process since the Unix epoch in seconds")
+    start.set(_START_TIME)
+    return [rss, cpu, start]
+
+
+REGISTRY.add_collector(process_metrics)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests.
+
+    Requests are labelled by route template (/jobs/{job_id}, not each job id)
+    so the number of series stays bounded; requests that match no route are
+    counted under "other".
+    """
+
+    def __init__(self, app, registry: Registry = REGISTRY):
+        self.app = app
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route, method and status", ("path", "method", "status")
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Time until the response was complete, by route",
+            ("path", "method")
+        )
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # if the app raises before responding
+
+        async def counting_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            self.in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "other")
+            self.latency.labels(path=path, method=scope["method"]).observe(time.perf_counter() - t0)
+            self.requests.labels(path=path, method=scope["method"], status=str(status)).inc()
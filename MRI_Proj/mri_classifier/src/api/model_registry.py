@@ -0,0 +1,316 @@
+"""
+Registry of named detector models
+Several weights files can be registered and served side by side; models load
+on first use, requests pick one by name or get the current default, and a
+model that is swapped out, replaced or evicted is only unloaded once the
+requests holding it have finished
+"""
+import asyncio
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Generic, Iterable, List, Optional, TypeVar
+
+from backends import BACKENDS
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class ModelNotFoundError(KeyError):
+    """
+    Raised for model names that are not registered.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(name)
+
+    def __str__(self):
+        return f"Model '{self.name}' is not registered"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """
+    A registered model: name, weights file and serving backend (see backends.py).
+    """
+    name: str
+    path: Path
+    backend: str = "pytorch"
+
+    def __post_init__(self):
+        if not _NAME.match(self.name):
+            raise ValueError(f"Invalid model name '{self.name}': use letters, digits, '.', '_' and '-'")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend '{self.backend}', expected one of: {', '.join(BACKENDS)}")
+
+
+def parse_model_specs(value: str, base_dir: Path) -> List[ModelSpec]:
+    """
+    Parse "name=path[@backend],..." (as in the MODELS setting). Relative paths
+    are resolved against base_dir; the backend defaults to pytorch.
+    """
+    specs = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, target = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected name=path[@backend], got '{item}'")
+        path, _, backend = target.partition("@")
+        specs.append(ModelSpec(name.strip(), base_dir / path.strip(), backend.strip() or "pytorch"))
+    return specs
+
+
+@dataclass(eq=False)
+class _Entry(Generic[T]):
+    spec: ModelSpec
+    value: T
+    nbytes: int
+    load_ms: float
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    active: int = 0
+    requests: int = 0
+    retired: bool = False
+
+
+class ModelRegistry(Generic[T]):
+    """
+    Named models, loaded on demand and shared by concurrent requests.
+
+    load(spec) builds whatever serving a model needs and unload(value) releases
+    it; footprint(value) reports its memory in bytes and describe(value) any
+    extra statistics. Loaded models other than the default are unloaded when
+    the total footprint exceeds memory_budget (least recently used first) or
+    after idle_seconds without requests; 0 disables either limit.
+
+    A request holds its model from use() until it finishes, so swapping the
+    default, replacing a model's weights or evicting it never affects
+    requests already running.
+    """
+
+    def __init__(
+        self,
+        specs: Iterable[ModelSpec],
+        default: str,
+        load: Callable[[ModelSpec], Awaitable[T]],
+        unload: Callable[[T], Awaitable[None]],
+        footprint: Callable[[T], int],
+        describe: Optional[Callable[[T], Dict]] = None,
+        memory_budget: int = 0,
+        idle_seconds: float = 0
+    ):
+        self._specs: Dict[str, ModelSpec] = {}
+        for spec in specs:
+            self._specs[spec.name] = spec
+        if default not in self._specs:
+            raise ModelNotFoundError(default)
+        self._default = default
+        self._load = load
+        self._unload = unload
+        self._footprint = footprint
+        self._describe = describe
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self._loaded: Dict[str, _Entry[T]] = {}
+        self._draining: List[_Entry[T]] = []
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def default(self) -> str:
+        return self._default
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """The registered name a request for `name` (None = default) gets"""
+        name = name or self._default
+        if name not in self._specs:
+            raise ModelNotFoundError(name)
+        return name
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        return self._locks.setdefault(name, asyncio.Lock())
+
+    async def _load_entry(self, spec: ModelSpec) -> _Entry[T]:
+        t0 = time.perf_counter()
+        value = await self._load(spec)
+        entry = _Entry(spec, value, self._footprint(value), (time.perf_counter() - t0) * 1000)
+        self.loads += 1
+        log.info("Model registry: loaded %s (%s, %s) in %.0f ms, %.1f MB",
+                 spec.name, spec.path.name, spec.backend, entry.load_ms, entry.nbytes / 2**20)
+        return entry
+
+    async def _entry(self, name: str) -> _Entry[T]:
+        entry = self._loaded.get(name)
+        if entry is not None:
+            return entry
+        # Concurrent first requests share one load
+        async with self._lock(name):
+            entry = self._loaded.get(name)
+            if entry is None:
+                entry = await self._load_entry(self._specs[name])
+                self._loaded[name] = entry
+                await self._enforce_budget(keep=name)
+        return entry
+
+    async def _retire(self, entry: _Entry[T]):
+        """Take a model out of service, unloading it once no request holds it."""
+        if self._loaded.get(entry.spec.name) is entry:
+            del self._loaded[entry.spec.name]
+        entry.retired = True
+        if entry.active:
+            self._draining.append(entry)
+        else:
+            await self._release(entry)
+
+    async def _release(self, entry: _Entry[T]):
+        if entry in self._draining:
+            self._draining.remove(entry)
+        await self._unload(entry.value)
+        log.info("Model registry: unloaded %s", entry.spec.name)
+
+    @asynccontextmanager
+    async def use(self, name: Optional[str] = None):
+        """
+        Hold a model for one request: `name`, or the default at the time of the call.
+        Loads it first if necessary.
+        """
+        entry = await self._entry(self.resolve(name))
+        entry.active += 1
+        entry.requests += 1
+        try:
+            yield entry.value
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired and entry.active == 0:
+                await self._release(entry)
+
+    def loaded(self) -> Dict[str, T]:
+        """The loaded models by name (not retired ones still finishing requests)"""
+        return {name: entry.value for name, entry in list(self._loaded.items())}
+
+    async def load(self, name: str) -> T:
+        """Load a model now (if it is not loaded) instead of on its first request."""
+        return (await self._entry(self.resolve(name))).value
+
+    async def set_default(self, name: str):
+        """Make `name` the default once it is loaded; running requests keep their model."""
+        name = self.resolve(name)
+        await self._entry(name)
+        previous, self._default = self._default, name
+        if previous != name:
+            log.info("Model registry: default model %s -> %s", previous, name)
+
+    async def register(self, spec: ModelSpec):
+        """
+        Add a model, or point an existing name at new weights. A loaded model
+        being replaced keeps serving until the new weights have loaded.
+        """
+        async with self._lock(spec.name):
+            old = self._loaded.get(spec.name)
+            if old is not None:
+                new = await self._load_entry(spec)
+                self._specs[spec.name] = spec
+                self._loaded[spec.name] = new
+                await self._retire(old)
+            else:
+                self._specs[spec.name] = spec
+        await self._enforce_budget(keep=spec.name)
+
+    async def unload(self, name: str):
+        name = self.resolve(name)
+        if name == self._default:
+            raise ValueError("The default model cannot be unloaded; make another model the default first")
+        entry = self._loaded.get(name)
+        if entry is not None:
+            await self._retire(entry)
+
+    def _evictable(self, keep: Optional[str] = None) -> List[_Entry[T]]:
+        # Idle models other than the default, least recently used first
+        return sorted(
+            (e for e in self._loaded.values() if e.active == 0 and e.spec.name not in (keep, self._default)),
+            key=lambda e: e.last_used
+        )
+
+    async def _enforce_budget(self, keep: Optional[str] = None):
+        if not self.memory_budget:
+            return
+        total = sum(e.nbytes for e in self._loaded.values())
+        for entry in self._evictable(keep):
+            if total <= self.memory_budget:
+                break
+            log.info("Model registry: evicting %s to stay within the memory budget", entry.spec.name)
+            await self._retire(entry)
+            total -= entry.nbytes
+            self.evictions += 1
+        if total > self.memory_budget:
+            log.warning("Model registry: %.1f MB loaded, over the %.1f MB budget (models in use are kept)",
+                        total / 2**20, self.memory_budget / 2**20)
+
+    async def evict_idle(self) -> int:
+        """Unload models unused for idle_seconds; returns how many."""
+        if not self.idle_seconds:
+            return 0
+        now = time.monotonic()
+        idle = [e for e in self._evictable() if now - e.last_used >= self.idle_seconds]
+        for entry in idle:
+            log.info("Model registry: evicting %s after %.0f s idle", entry.spec.name, now - entry.last_used)
+            await self._retire(entry)
+        self.evictions += len(idle)
+        return len(idle)
+
+    async def evict_periodically(self, interval: float):
+        """Run evict_idle every interval seconds; run as a background task."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def close(self):
+        for entry in list(self._loaded.values()) + list(self._draining):
+            await self._unload(entry.value)
+        self._loaded.clear()
+        self._draining.clear()
+
+    def _entry_stats(self, entry: _Entry[T]) -> Dict:
+        stats = {
+            "bytes": entry.nbytes,
+            "load_ms": entry.load_ms,
+            "loaded_at": entry.loaded_at,
+            "idle_seconds": time.monotonic() - entry.last_used,
+            "active": entry.active,
+            "requests": entry.requests,
+        }
+        if self._describe is not None:
+            stats.update(self._describe(entry.value))
+        return stats
+
+    def stats(self) -> Dict:
+        # Read from the CPU pool (/stats, /metrics) while the event loop loads models: iterate copies
+        models = {}
+        for name, spec in list(self._specs.items()):
+            entry = self._loaded.get(name)
+            models[name] = {
+                "path": str(spec.path),
+                "backend": spec.backend,
+                "default": name == self._default,
+                "loaded": entry is not None,
+                **(self._entry_stats(entry) if entry is not None else {}),
+            }
+        return {
+            "default": self._default,
+            "memory_budget_bytes": self.memory_budget,
+            "loaded_bytes": sum(e.nbytes for e in list(self._loaded.values())),
+            "idle_seconds": self.idle_seconds,
+            "draining": [e.spec.name for e in list(self._draining)],
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "models": models,
+        }
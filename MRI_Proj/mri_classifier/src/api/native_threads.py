@@ -0,0 +1,133 @@
+"""
+Thread counts of the native libraries the API uses
+PyTorch, OpenCV, SimpleITK and the BLAS under NumPy each start a thread pool
+sized to every core of the machine. With several uvicorn workers, the CPU
+pool's threads and registration worker processes all using them at once, that
+is many times more threads than cores. ThreadLimits caps them per process:
+limit_env before NumPy and OpenCV are imported (their BLAS reads the
+environment once, on load), apply at startup and in each registration worker,
+and report shows what each library actually uses
+"""
+import importlib.util
+import logging
+import os
+import sys
+from dataclasses import asdict, dataclass, replace
+from typing import Dict
+
+log = logging.getLogger(__name__)
+
+# Read by OpenBLAS, MKL and OpenMP runtimes when they load
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+@dataclass(frozen=True)
+class ThreadLimits:
+    """
+    Threads per library in one process; 0 leaves a library at its default.
+
+    torch: intra-op threads of PyTorch inference
+    torch_interop: PyTorch inter-op threads (settable once per process)
+    opencv: OpenCV's parallel_for pool, used inside each cv2 call
+    sitk: SimpleITK's default for registration filters
+    blas: OpenBLAS/MKL/OpenMP threads of NumPy linear algebra
+    """
+    torch: int = 0
+    torch_interop: int = 0
+    opencv: int = 0
+    sitk: int = 0
+    blas: int = 0
+
+    def for_registration_worker(self) -> "ThreadLimits":
+        """Limits for a registration worker process, which never runs PyTorch"""
+        return replace(self, torch=0, torch_interop=0)
+
+
+def limit_env(blas: int):
+    """
+    Cap BLAS and OpenMP threads through the environment, for this process (if
+    NumPy is not imported yet) and every process it starts. Explicitly set
+    variables win.
+    """
+    if blas > 0:
+        for name in BLAS_ENV_VARS:
+            os.environ.setdefault(name, str(blas))
+
+
+def blas_controllable() -> bool:
+    """
+    Whether BLAS pools already loaded in this process can be resized, which
+    needs threadpoolctl. Without it only limit_env's environment applies.
+    """
+    return importlib.util.find_spec("threadpoolctl") is not None
+
+
+def _limit_blas(threads: int):
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:  # startup warns (see blas_controllable); limit_env covers BLAS loaded after it
+        return
+    threadpool_limits(limits=threads, user_api="blas")
+
+
+def _limit_torch(threads: int, interop: int):
+    import torch
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop > 0 and torch.get_num_interop_threads() != interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:  # parallel work already started in this process
+            log.warning("PyTorch inter-op threads already fixed at %d", torch.get_num_interop_threads())
+
+
+def apply(limits: ThreadLimits):
+    """
+    Set each library's thread count in this process. Also the initializer of
+    registration worker processes, so it must stay a picklable module function.
+    """
+    if limits.blas > 0:
+        _limit_blas(limits.blas)
+    if limits.opencv > 0:
+        import cv2
+        cv2.setNumThreads(limits.opencv)
+    if limits.sitk > 0:
+        import SimpleITK as sitk
+        sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(limits.sitk)
+    if limits.torch > 0 or limits.torch_interop > 0:
+        _limit_torch(limits.torch, limits.torch_interop)
+
+
+def report() -> Dict:
+    """
+    Threads each library uses in this process. Libraries not imported yet are
+    left out rather than imported; BLAS and OpenMP pools are listed per loaded
+    library when threadpoolctl is installed, otherwise the environment is.
+    """
+    threads: Dict = {"cpu_count": os.cpu_count()}
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        threads["torch"] = torch.get_num_threads()
+        threads["torch_interop"] = torch.get_num_interop_threads()
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        threads["opencv"] = cv2.getNumThreads()
+    sitk = sys.modules.get("SimpleITK")
+    if sitk is not None:
+        threads["sitk"] = sitk.ProcessObject.GetGlobalDefaultNumberOfThreads()
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        threads["env"] = {name: os.environ.get(name) for name in BLAS_ENV_VARS}
+    else:
+        for pool in threadpool_info():
+            threads.setdefault(pool["user_api"], {})[pool["prefix"]] = pool["num_threads"]
+    return threads
+
+
+def describe(limits: ThreadLimits) -> str:
+    """One-line summary of limits for the startup log"""
+    return ", ".join(
+        f"{name}={value if value > 0 else 'default'}" for name, value in asdict(limits).items()
+    )
@@ -0,0 +1,153 @@
+"""
+CPU-heavy registration and comparison pipelines used by the API endpoints
+Kept free of FastAPI/YOLO state so they can run inside a worker process
+"""
+import numpy as np
+from PIL import Image
+from typing import Any, Dict, Optional
+import logging
+
+from registration_utils import register_images, register_and_apply_to_mask, preprocess_for_registration
+from change_metrics import (
+    compute_change_metrics,
+    compute_area_change,
+    create_change_visualization
+)
+
+log = logging.getLogger(__name__)
+
+
+class RegistrationError(Exception):
+    """Raised when SimpleITK fails to register two scans."""
+
+
+def run_registration(
+    fixed_array: np.ndarray,
+    moving_array: np.ndarray,
+    registration_type: str = "rigid",
+    progress_queue: Optional[Any] = None,
+    progress_interval: float = 0.1
+) -> np.ndarray:
+    """
+    Register a moving scan onto a fixed scan.
+
+    Args:
+        fixed_array: Reference image as RGB uint8 array
+        moving_array: Image to align as RGB uint8 array
+        registration_type: "rigid" or "affine"
+        progress_queue: Optional queue (see WorkerPools.progress_queue) that
+            receives throttled optimizer progress dicts while registering
+        progress_interval: Minimum seconds between progress reports
+
+    Returns:
+        Registered moving image as RGB uint8 array, aligned to the fixed image
+    """
+    # Preprocess images
+    fixed_processed = preprocess_for_registration(fixed_array)
+    moving_processed = preprocess_for_registration(moving_array)
+
+    try:
+        registered_image, _ = register_images(
+            fixed_processed,
+            moving_processed,
+            registration_type,
+            progress=progress_queue.put if progress_queue is not None else None,
+            progress_interval=progress_interval
+        )
+    except Exception as e:
+        raise RegistrationError(str(e)) from e
+
+    # SimpleITK returns grayscale, so build an RGB version for display
+    if len(registered_image.shape) == 2:
+        registered_rgb = np.stack([registered_image] * 3, axis=2)
+    else:
+        registered_rgb = registered_image
+
+    return registered_rgb.astype(np.uint8)
+
+
+def run_comparison(
+    fixed_array: np.ndarray,
+    moving_array: np.ndarray,
+    fixed_mask_array: Optional[np.ndarray] = None,
+    moving_mask_array: Optional[np.ndarray] = None,
+    registration_type: str = "rigid",
+    intensity_threshold: float = 10.0,
+    return_visualization: bool = True
+) -> Dict:
+    """
+    Register two scans and compute change metrics between them.
+
+    Args:
+        fixed_array: Reference image as RGB uint8 array
+        moving_array: Later image as RGB uint8 array
+        fixed_mask_array: Optional grayscale mask for the fixed image
+        moving_mask_array: Optional grayscale mask for the moving image
+        registration_type: "rigid" or "affine"
+        intensity_threshold: Threshold for considering a pixel as "changed"
+        return_visualization: Whether to render the change visualization
+
+    Returns:
+        Dictionary with "metrics", "registered_image" (grayscale uint8 array)
+        and "visualization" (RGB uint8 array or None)
+    """
+    fixed_size = (fixed_array.shape[1], fixed_array.shape[0])  # (width, height)
+
+    # Preprocess and register
+    fixed_processed = preprocess_for_registration(fixed_array)
+
+    # Resize moving to match fixed
+    moving_resized = Image.fromarray(moving_array).resize(fixed_size, Image.Resampling.LANCZOS)
+    moving_processed = preprocess_for_registration(np.array(moving_resized))
+
+    # Resize moving mask if provided
+    if moving_mask_array is not None:
+        moving_mask_resized = Image.fromarray(moving_mask_array, mode='L')
+        moving_mask_resized = moving_mask_resized.resize(fixed_size, Image.Resampling.LANCZOS)
+        moving_mask_array = np.array(moving_mask_resized)
+
+    registered_mask_array = None
+    try:
+        registered_image, _ = register_images(
+            fixed_processed,
+            moving_processed,
+            registration_type
+        )
+        log.info("   Registration successful")
+
+        # Register masks if provided
+        if moving_mask_array is not None:
+            _, registered_mask_array = register_and_apply_to_mask(
+                fixed_processed,
+                moving_processed,
+                moving_mask_array,
+                registration_type
+            )
+            log.info("   Mask registration successful")
+    except Exception as e:
+        raise RegistrationError(str(e)) from e
+
+    # Compute change metrics
+    log.info("   Computing change metrics...")
+    metrics = compute_change_metrics(
+        fixed_processed,
+        registered_image,
+        fixed_mask_array,
+        registered_mask_array,
+        intensity_threshold
+    )
+
+    # Add area change if both masks provided
+    if fixed_mask_array is not None and registered_mask_array is not None:
+        metrics["area_change"] = compute_area_change(fixed_mask_array, registered_mask_array)
+
+    visualization = None
+    if return_visualization:
+        log.info("   Creating change visualization...")
+        visualization = create_change_visualization(fixed_processed, registered_image)
+
+    return {
+        "metrics": metrics,
+        "registered_image": registered_image.astype(np.uint8),
+        "visualization": visualization
+    }
@@ -0,0 +1,300 @@
+"""
+On-demand profiling of single requests
+A request carrying the admin X-Profile header (or sent to a path listed in
+PROFILE_PATHS) runs under cProfile: on the event loop thread, on every CPU
+pool thread doing its work (the active profile follows run_cpu as a context
+variable) and in registration worker processes, whose profiles come back with
+their results, and on the model's batch thread while it runs a batch
+holding the request's images. The merged profile is written to a directory as a .prof file
+for pstats/snakeviz, with a text summary and a JSON record of the request's
+parameters and upload hashes
+"""
+import asyncio
+import cProfile
+import functools
+import hashlib
+import hmac
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+
+log = logging.getLogger(__name__)
+
+HEADER = "x-profile"
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+# cProfile can only have one active profiler per thread, and the event loop
+# thread is shared by all requests, so one request is profiled at a time
+_exclusive = threading.Lock()
+
+# pstats raw data: {(file, line, function): (cc, nc, tt, ct, callers)}
+RawStats = Dict[Tuple[str, int, str], tuple]
+
+
+class _RawStats:
+    """Lets pstats.Stats load raw stats that came from another thread or process"""
+
+    def __init__(self, stats: RawStats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _raw_stats(profiler: cProfile.Profile) -> RawStats:
+    profiler.create_stats()
+    return profiler.stats
+
+
+class RequestProfile:
+    """
+    Profile of one request: the event loop profiler plus the stats of each
+    thread and process call made on its behalf.
+    """
+
+    def __init__(self, method: str, path: str, query: str):
+        self.id = "%s-%s" % (time.strftime("%Y%m%d-%H%M%S"), uuid.uuid4().hex[:8])
+        self.method = method
+        self.path = path
+        self.query = query
+        self.parameters: Dict[str, Any] = {}
+        self.uploads: List[Dict] = []
+        self.thread_calls = 0
+        self.process_calls = 0
+        self._lock = threading.Lock()
+        self._parts: List[RawStats] = []
+        self._loop_profiler = cProfile.Profile()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def start(self):
+        self._loop_profiler.enable()
+
+    def stop(self):
+        self._loop_profiler.disable()
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def add(self, stats: RawStats, process: bool = False):
+        with self._lock:
+            self._parts.append(stats)
+            if process:
+                self.process_calls += 1
+            else:
+                self.thread_calls += 1
+
+    def stats(self) -> pstats.Stats:
+        combined = pstats.Stats(_RawStats(_raw_stats(self._loop_profiler)))
+        with self._lock:
+            parts = list(self._parts)
+        for part in parts:
+            combined.add(_RawStats(part))
+        return combined
+
+    def write(self, directory: Path, status: Optional[int], top: int = 40) -> Path:
+        """Write <id>.prof, <id>.txt (top functions by cumulative time) and <id>.json"""
+        directory.mkdir(parents=True, exist_ok=True)
+        stats = self.stats()
+        prof_path = directory / f"{self.id}.prof"
+        stats.dump_stats(prof_path)
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats("cumulative").print_stats(top)
+        (directory / f"{self.id}.txt").write_text(summary.getvalue())
+
+        (directory / f"{self.id}.json").write_text(json.dumps({
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": status,
+            "duration_ms": self.duration_ms,
+            "parameters": self.parameters,
+            "uploads": self.uploads,
+            "thread_calls": self.thread_calls,
+            "process_calls": self.process_calls,
+            "profile": prof_path.name,
+        }, indent=2))
+        return prof_path
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def _profile_thread_call(profile: RequestProfile, fn: Callable, *args, **kwargs):
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Python 3.12+: the request's profiler already covers every thread
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.add(_raw_stats(profiler))
+
+
+def wrap_thread_call(fn: Callable) -> Callable:
+    """
+    fn, profiled on whichever thread runs it if the current request is being
+    profiled. Call this on the requesting side (it reads the context).
+    """
+    return wrap_for(_current.get(), fn)
+
+
+def wrap_for(profile: Optional[RequestProfile], fn: Callable) -> Callable:
+    """fn, profiled into profile on whichever thread runs it (fn itself if profile is None)"""
+    if profile is None:
+        return fn
+    return functools.partial(_profile_thread_call, profile, fn)
+
+
+def run_profiled(fn: Callable, *args, **kwargs) -> Tuple[Any, RawStats]:
+    """
+    Call fn under cProfile and return (result, raw stats). Used around calls
+    sent to worker processes. Picklable, like fn must be.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # a registration thread on Python 3.12+, already covered
+        return fn(*args, **kwargs), {}
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+    return result, _raw_stats(profiler)
+
+
+def _file_digest(file) -> Dict:
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return {"sha256": digest.hexdigest(), "size": size}
+
+
+async def record_parameters(request: Request):
+    """
+    FastAPI dependency recording the form fields and upload hashes of a
+    profiled request. Added app-wide; a context-variable lookup otherwise.
+    """
+    profile = _current.get()
+    if profile is None:
+        return
+    profile.parameters.update(request.query_params)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return
+    # Already parsed (and cached on the request) by FastAPI for the endpoint
+    form = await request.form()
+    for name, value in form.multi_items():
+        if isinstance(value, str):
+            profile.parameters[name] = value
+        else:
+            upload = {"field": name, "filename": value.filename, "content_type": value.content_type}
+            upload.update(await asyncio.to_thread(_file_digest, value.file))
+            profile.uploads.append(upload)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it.
+
+    A request is profiled if it sends `X-Profile: <token>` (and token is set)
+    or its path is in `paths`. The response gets an X-Profile-Id header naming
+    the files written to `directory`, or "busy" if another request was being
+    profiled. Only the newest `keep` profiles are kept, and each one written
+    is logged to `logger` (this module's logger by default).
+
+    The event loop profiler also sees other requests' coroutines running
+    concurrently, and a batched inference call is profiled whole, including
+    the images other requests added to the batch.
+    """
+
+    def __init__(
+        self, app, directory: Path, token: str = "", paths: Iterable[str] = (), keep: int = 50,
+        logger: Optional[logging.Logger] = None
+    ):
+        self.app = app
+        self.log = logger or log
+        self.directory = Path(directory)
+        self.token = token.encode("utf-8")
+        self.paths = frozenset(paths)
+        self.keep = keep
+
+    def _requested(self, scope) -> bool:
+        if scope["path"] in self.paths or "*" in self.paths:
+            return True
+        if not self.token:
+            return False
+        for name, value in scope["headers"]:
+            if name == HEADER.encode("ascii"):
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    def _prune(self):
+        # Oldest first; ids only sort by the second they were taken in
+        records = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime_ns)
+        for record in records[: max(0, len(records) - self.keep)]:
+            for suffix in (".json", ".prof", ".txt"):
+                record.with_suffix(suffix).unlink(missing_ok=True)
+
+    def _write(self, profile: RequestProfile, status: Optional[int]) -> Path:
+        path = profile.write(self.directory, status)
+        self._prune()
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _exclusive.acquire(blocking=False):
+            await self.app(scope, receive, self._tagged(send, b"busy"))
+            return
+
+        try:
+            profile = RequestProfile(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"))
+            status = None
+
+            tagged_send = self._tagged(send, profile.id.encode("ascii"))
+
+            async def profiled_send(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await tagged_send(message)
+
+            token = _current.set(profile)
+            profile.start()
+            try:
+                await self.app(scope, receive, profiled_send)
+            finally:
+                profile.stop()
+                _current.reset(token)
+                path = await asyncio.to_thread(self._write, profile, status)
+                self.log.info("Profiled %s %s in %.0f ms -> %s", profile.method, profile.path, profile.duration_ms, path)
+        finally:
+            _exclusive.release()
+
+    @staticmethod
+    def _tagged(send, value: bytes):
+        async def tagged_send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", value)]}
+            await send(message)
+        return tagged_send
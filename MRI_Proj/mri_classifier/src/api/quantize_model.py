@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Build the INT8 post-training quantized detector and report how it compares
+with the FP32 model on the bundled dataset
+
+Calibration uses the scans in public/dataset/yes and public/dataset/no.
+Accuracy is measured per image against the folder labels: an image counts as
+positive when it has at least one detection at the report threshold.
+
+Usage:
+    python quantize_model.py                       # export, then report
+    python quantize_model.py --skip-export --limit 50
+    MODEL_BACKEND=openvino_int8 uvicorn main:app   # serve the INT8 model
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from backends import backend_model_path, export_backend, load_detector
+from dataset import DATASET_DIR, dataset_images
+from export_backends import REPORT_DIR, latency_summary, match_detections, run_detector
+import settings
+
+INT8_BACKEND = "openvino_int8"
+
+
+def write_calibration_yaml(directory: Path, names: Dict[int, str]) -> Path:
+    """
+    Write an Ultralytics dataset YAML whose val split is the yes/no scans.
+    """
+    lines = [
+        f"path: {DATASET_DIR}",
+        # quoted: YAML would otherwise read the folder names as booleans
+        "train: ['yes', 'no']",
+        "val: ['yes', 'no']",
+        "names:",
+    ]
+    lines += [f"  {index}: {name}" for index, name in sorted(names.items())]
+    yaml_path = directory / "calibration.yaml"
+    yaml_path.write_text("\n".join(lines) + "\n")
+    return yaml_path
+
+
+def quantize(imgsz: int) -> Path:
+    from ultralytics import YOLO
+
+    names = YOLO(str(settings.MODEL_PATH)).names
+    with tempfile.TemporaryDirectory() as tmp:
+        yaml_path = write_calibration_yaml(Path(tmp), names)
+        return export_backend(settings.MODEL_PATH, INT8_BACKEND, imgsz=imgsz, calibration_data=yaml_path)
+
+
+def image_level_accuracy(detections: List, labels: List[bool]) -> Dict:
+    """
+    Precision/recall of "has a tumour" decisions against the folder labels.
+    """
+    predicted = np.array([len(boxes) > 0 for boxes, _ in detections])
+    actual = np.array(labels)
+    tp = int(np.sum(predicted & actual))
+    fp = int(np.sum(predicted & ~actual))
+    fn = int(np.sum(~predicted & actual))
+    return {
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+    }
+
+
+def build_report(fp32_backends: List[str], limit: int, confidence: float) -> Dict:
+    dataset = dataset_images(limit_per_class=limit)
+    images = [path for path, _ in dataset]
+    labels = [has_tumour for _, has_tumour in dataset]
+    print(f"📸 Evaluating over {len(images)} images ({sum(labels)} yes / {len(labels) - sum(labels)} no)")
+
+    results = {}
+    for backend in fp32_backends + [INT8_BACKEND]:
+        print(f"   Running {backend}...")
+        detections, latencies = run_detector(
+            load_detector(settings.MODEL_PATH, backend), images, confidence
+        )
+        results[backend] = (detections, latencies)
+
+    report = {
+        "images": len(images),
+        "confidence": confidence,
+        "note": "INT8 calibration and evaluation both use public/dataset",
+        "models": {},
+    }
+    for backend, (detections, latencies) in results.items():
+        report["models"][backend] = {
+            "accuracy": image_level_accuracy(detections, labels),
+            "latency": latency_summary(latencies),
+        }
+
+    # How closely INT8 boxes track each FP32 model
+    int8_detections, int8_latencies = results[INT8_BACKEND]
+    for backend in fp32_backends:
+        detections, latencies = results[backend]
+        totals = {"matched": 0, "missing": 0, "extra": 0}
+        for (ref_boxes, ref_conf), (boxes, conf) in zip(detections, int8_detections):
+            match = match_detections(ref_boxes, ref_conf, boxes, conf, iou_threshold=0.5)
+            for key in totals:
+                totals[key] += match[key]
+        report["models"][backend]["int8_box_agreement"] = totals
+        report["models"][backend]["int8_speedup"] = float(
+            np.median(latencies) / np.median(int8_latencies)
+        )
+
+    return report
+
+
+def write_markdown(report: Dict, path: Path):
+    lines = [
+        "# INT8 vs FP32 detector report",
+        "",
+        f"{report['images']} images from public/dataset, threshold {report['confidence']}. "
+        f"{report['note']}.",
+        "",
+        "| model | precision | recall | p50 ms | p95 ms |",
+        "|-------|-----------|--------|--------|--------|",
+    ]
+    for backend, data in report["models"].items():
+        accuracy, latency = data["accuracy"], data["latency"]
+        lines.append(
+            f"| {backend} | {accuracy['precision']:.3f} | {accuracy['recall']:.3f} "
+            f"| {latency['p50_ms']:.1f} | {latency['p95_ms']:.1f} |"
+        )
+    lines.append("")
+    for backend, data in report["models"].items():
+        if "int8_box_agreement" in data:
+            agreement = data["int8_box_agreement"]
+            lines.append(
+                f"- vs {backend}: {data['int8_speedup']:.2f}x faster at p50, "
+                f"{agreement['matched']} boxes matched (IoU ≥ 0.5), "
+                f"{agreement['missing']} missing, {agreement['extra']} extra"
+            )
+    path.write_text("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skip-export", action="store_true", help="Reuse an existing INT8 model")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--limit", type=int, default=None, help="Images per dataset folder")
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument(
+        "--fp32-backends", nargs="+", default=["pytorch"],
+        help="FP32 models to compare against (e.g. pytorch openvino)"
+    )
+    args = parser.parse_args()
+
+    if args.skip_export:
+        print(f"✓ Using existing INT8 model at {backend_model_path(settings.MODEL_PATH, INT8_BACKEND)}")
+    else:
+        print("🔧 Quantizing with calibration images from public/dataset...")
+        print(f"✅ INT8 model written to {quantize(args.imgsz)}")
+
+    report = build_report(args.fp32_backends, args.limit, args.confidence)
+
+    REPORT_DIR.mkdir(exist_ok=True)
+    json_path = REPORT_DIR / "int8_report.json"
+    markdown_path = REPORT_DIR / "int8_report.md"
+    json_path.write_text(json.dumps(report, indent=2))
+    write_markdown(report, markdown_path)
+
+    print("\n" + markdown_path.read_text())
+    print(f"✅ Report written to {json_path} and {markdown_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,17 +4,68 @@ Aligns two MRI scans so they can be compared pixel-by-pixel
 """
 import numpy as np
 import SimpleITK as sitk
+import time
 from PIL import Image
-from typing import Tuple, Optional
+from typing import Callable, Dict, Tuple, Optional
 import logging
 
+from metrics import REGISTRY
+from timing import timed
+
 log = logging.getLogger(__name__)
 
+REGISTRATION_ITERATIONS = REGISTRY.histogram(
+    "registration_iterations", "Optimizer iterations per registration", ("type",),
+    buckets=(5, 10, 15, 20, 25, 30, 40, 50, 100)
+)
+
+
+class IterationReporter:
+    """
+    Throttled progress observer for a SimpleITK ImageRegistrationMethod.
+
+    Attached to sitkIterationEvent, it reads the iteration number and metric
+    value on every optimizer iteration (cheap) but only calls callback when
+    min_interval seconds have passed since the last report, so a slow
+    consumer never slows the optimizer. finish() always reports the final state.
+
+    Each report is {"iteration": int, "metric": float, "elapsed_ms": float}.
+    """
+
+    def __init__(self, method: sitk.ImageRegistrationMethod, callback: Callable[[Dict], None], min_interval: float = 0.1):
+        self.method = method
+        self.callback = callback
+        self.min_interval = min_interval
+        self.reported = 0
+        self._start = time.perf_counter()
+        self._last_report = float("-inf")
+        method.AddCommand(sitk.sitkIterationEvent, self._on_iteration)
+
+    def _report(self, now: float):
+        self._last_report = now
+        self.reported += 1
+        self.callback({
+            "iteration": int(self.method.GetOptimizerIteration()),
+            "metric": float(self.method.GetMetricValue()),
+            "elapsed_ms": (now - self._start) * 1000,
+        })
+
+    def _on_iteration(self):
+        now = time.perf_counter()
+        if now - self._last_report >= self.min_interval:
+            self._report(now)
+
+    def finish(self):
+        self._report(time.perf_counter())
+
 
+@timed("register")
 def register_images(
     fixed_image: np.ndarray,
     moving_image: np.ndarray,
-    registration_type: str = "rigid"
+    registration_type: str = "rigid",
+    progress: Optional[Callable[[Dict], None]] = None,
+    progress_interval: float = 0.1
 ) -> Tuple[np.ndarray, sitk.Transform]:
     """
     Register (align) a moving image to a fixed image.
@@ -23,6 +74,8 @@ def register_images(
         fixed_image: Reference image to align to (numpy array, grayscale or RGB)
         moving_image: Image to be aligned (numpy array, same format as fixed)
         registration_type: "rigid" (translation + rotation) or "affine" (includes scaling/shearing)
+        progress: Optional callback receiving optimizer progress (see IterationReporter)
+        progress_interval: Minimum seconds between progress callbacks
     
     Returns:
         Tuple of (registered_image, transform)
@@ -100,13 +153,20 @@ def register_images(
     # Set initial transform
     registration_method.SetInitialTransform(transform, inPlace=True)
     
+    reporter = None
+    if progress is not None:
+        reporter = IterationReporter(registration_method, progress, progress_interval)
+
     # Execute registration
     log.info("Running registration optimizer...")
     final_transform = registration_method.Execute(fixed_sitk, moving_sitk)
+    if reporter is not None:
+        reporter.finish()
     
     log.info(f"Optimizer stop condition: {registration_method.GetOptimizerStopConditionDescription()}")
     log.info(f"Final metric value: {registration_method.GetMetricValue():.6f}")
     log.info(f"Number of iterations: {registration_method.GetOptimizerIteration()}")
+    REGISTRATION_ITERATIONS.labels(type=registration_type).observe(registration_method.GetOptimizerIteration())
     
     # Apply transform to moving image
     registered_sitk = sitk.Resample(
@@ -154,6 +214,16 @@ def register_and_apply_to_mask(
         fixed_image, moving_image, registration_type
     )
     
+    registered_mask = _warp_mask(fixed_image, moving_mask, transform)
+    
+    log.info("Mask registration completed")
+    
+    return registered_image, registered_mask
+
+
+@timed("warp_mask")
+def _warp_mask(fixed_image: np.ndarray, moving_mask: np.ndarray, transform: sitk.Transform) -> np.ndarray:
+    """Resample a mask into the fixed image's frame with a registration transform"""
     # Convert mask to SimpleITK format (keep as uint8 for binary masks)
     if len(moving_mask.shape) == 3:
         mask_gray = np.mean(moving_mask, axis=2).astype(np.uint8)
@@ -185,13 +255,10 @@ def register_and_apply_to_mask(
         moving_mask_sitk.GetPixelID()
     )
     
-    registered_mask = sitk.GetArrayFromImage(registered_mask_sitk)
-    
-    log.info("Mask registration completed")
-    
-    return registered_image, registered_mask
+    return sitk.GetArrayFromImage(registered_mask_sitk)
 
 
+@timed("preprocess")
 def preprocess_for_registration(
     image: np.ndarray,
     normalize: bool = True,
@@ -0,0 +1,126 @@
+"""
+Lightweight detection overlay renderer
+Draws boxes and confidence labels straight onto a decoded RGB uint8 array with
+OpenCV primitives, replacing the generic results.plot() annotator on the hot path
+"""
+import threading
+from typing import Dict, Mapping, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Ultralytics default palette, as the RGB colours /scan has always shown
+# (results.plot() drew in BGR and the array was then read back as RGB)
+_PALETTE_HEX = (
+    "FF2A04", "EBDB0B", "F3F3F3", "B7DF00", "681F11", "DD6FFF", "4F44FF", "00EDCC", "44F300", "FF00BD",
+    "FFB400", "BA00DD", "FFFF00", "00C026", "B3FF01", "FF247D", "68007B", "6C1BFF", "2F6DFC", "0BFFA2",
+)
+PALETTE = tuple(tuple(int(h[i:i + 2], 16) for i in (0, 2, 4)) for h in _PALETTE_HEX)
+
+_DARK_TEXT = (17, 31, 104)
+_LIGHT_TEXT = (255, 255, 255)
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def class_color(class_id: int) -> Tuple[int, int, int]:
+    return PALETTE[int(class_id) % len(PALETTE)]
+
+
+def _text_color(color: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    # Dark text on light label backgrounds, white otherwise
+    r, g, b = color
+    return _DARK_TEXT if 0.299 * r + 0.587 * g + 0.114 * b > 180 else _LIGHT_TEXT
+
+
+class OverlayRenderer:
+    """
+    Draws detections onto RGB uint8 images.
+
+    Line width and font scale follow the Ultralytics annotator (about 0.3% of
+    the mean image side, at least 2px) so output looks like results.plot().
+    Output is deterministic: coordinates are rounded the same way every time
+    and detections are drawn lowest confidence first, so the most confident
+    label ends up on top regardless of input order.
+
+    Buffers are reused: when not drawing in place, each worker thread keeps one
+    canvas per image shape, and label text sizes are memoised.
+    """
+
+    def __init__(self, names: Optional[Mapping[int, str]] = None):
+        self.names = dict(names or {})
+        self._local = threading.local()
+        self._text_sizes: Dict[Tuple[str, float, int], Tuple[int, int]] = {}
+
+    def _canvas(self, image: np.ndarray) -> np.ndarray:
+        canvases = getattr(self._local, "canvases", None)
+        if canvases is None:
+            canvases = self._local.canvases = {}
+        canvas = canvases.get(image.shape)
+        if canvas is None:
+            canvases.clear()  # keep at most one canvas per thread
+            canvas = canvases[image.shape] = np.empty(image.shape, dtype=np.uint8)
+        np.copyto(canvas, image)
+        return canvas
+
+    def _text_size(self, label: str, scale: float, thickness: int) -> Tuple[int, int]:
+        key = (label, scale, thickness)
+        size = self._text_sizes.get(key)
+        if size is None:
+            (w, h), _ = cv2.getTextSize(label, _FONT, scale, thickness)
+            size = self._text_sizes[key] = (w, h)
+        return size
+
+    def label(self, class_id: int, confidence: float) -> str:
+        return f"{self.names.get(int(class_id), str(int(class_id)))} {confidence:.2f}"
+
+    def draw(
+        self,
+        image: np.ndarray,
+        boxes: np.ndarray,
+        confidences: np.ndarray,
+        class_ids: np.ndarray,
+        inplace: bool = False
+    ) -> np.ndarray:
+        """
+        Draw boxes with "name confidence" labels.
+
+        Args:
+            image: (H, W, 3) RGB uint8 array
+            boxes: (N, 4) [x1, y1, x2, y2] in image pixels
+            confidences: (N,) scores
+            class_ids: (N,) class indices
+            inplace: Draw on image itself (it must be writable and contiguous);
+                     otherwise draw on a reused per-thread copy
+
+        Returns:
+            The annotated array. Without inplace it is only valid until the
+            same thread renders again, so encode or copy it before then.
+        """
+        canvas = image if inplace else self._canvas(image)
+        if len(boxes) == 0:
+            return canvas
+
+        height, width = canvas.shape[:2]
+        lw = max(round((height + width + 3) / 2 * 0.003), 2)
+        thickness = max(lw - 1, 1)
+        scale = lw / 3
+
+        order = np.argsort(confidences, kind="stable")
+        pixels = np.rint(np.asarray(boxes, dtype=np.float64)).astype(np.int64)
+        for i in order:
+            x1, y1, x2, y2 = (int(v) for v in pixels[i])
+            color = class_color(class_ids[i])
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), color, thickness=lw, lineType=cv2.LINE_AA)
+
+            label = self.label(class_ids[i], float(confidences[i]))
+            w, h = self._text_size(label, scale, thickness)
+            h += 3  # padding
+            outside = y1 >= h  # label fits above the box
+            x1 = min(x1, width - w)
+            top, bottom = (y1 - h, y1) if outside else (y1, y1 + h)
+            cv2.rectangle(canvas, (x1, top), (x1 + w, bottom), color, -1, cv2.LINE_AA)
+            cv2.putText(
+                canvas, label, (x1, y1 - 2 if outside else y1 + h - 1),
+                _FONT, scale, _text_color(color), thickness=thickness, lineType=cv2.LINE_AA
+            )
+        return canvas
@@ -0,0 +1,114 @@
+"""
+Response bodies for endpoints that return metadata plus images
+JSON with base64 images stays the default; clients can ask for multipart/mixed
+or MessagePack through Accept to receive the image bytes without base64
+"""
+import base64
+import json
+import secrets
+from typing import Dict, Optional, Tuple
+
+import msgpack
+from fastapi.responses import JSONResponse, Response
+
+import timing
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# name -> (encoded bytes, media type)
+Images = Dict[str, Tuple[bytes, str]]
+
+
+def negotiate_payload(accept: Optional[str]) -> str:
+    """
+    Choose "json", "multipart" or "msgpack" from an Accept header.
+
+    Only explicitly listed types count, in the client's q order; wildcards and
+    missing headers keep JSON.
+    """
+    best, best_q = "json", 0.0
+    for part in (accept or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media_type = fields[0].lower()
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type == "multipart/mixed":
+            mode = "multipart"
+        elif media_type in MSGPACK_TYPES:
+            mode = "msgpack"
+        elif media_type == "application/json":
+            mode = "json"
+        else:
+            continue
+        if q > best_q:
+            best, best_q = mode, q
+    return best
+
+
+def _json(metadata: Dict) -> bytes:
+    return json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+
+
+def multipart_body(metadata: Dict, images: Images, boundary: str) -> bytes:
+    """
+    multipart/mixed body: an application/json part with the metadata, then
+    one part per image carrying its raw bytes, named in Content-Disposition.
+    """
+    delimiter = b"--" + boundary.encode("ascii")
+    chunks = [
+        delimiter,
+        b"\r\nContent-Type: application/json\r\nContent-Disposition: inline; name=\"metadata\"\r\n\r\n",
+        _json(metadata),
+        b"\r\n",
+    ]
+    for name, (data, media_type) in images.items():
+        chunks += [
+            delimiter,
+            (
+                f"\r\nContent-Type: {media_type}\r\n"
+                f"Content-Disposition: inline; name=\"{name}\"\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+            ).encode("ascii"),
+            data,
+            b"\r\n",
+        ]
+    chunks.append(delimiter + b"--\r\n")
+    return b"".join(chunks)
+
+
+@timing.timed("serialize")
+def build_response(metadata: Dict, images: Images, payload: str = "json") -> Response:
+    """
+    Combine metadata and encoded images into the negotiated response.
+
+    json:      metadata plus each image as a base64 string under its name, and
+               "media_types" mapping names to formats (the original shape)
+    multipart: see multipart_body
+    msgpack:   the same map as JSON but with raw bytes instead of base64
+    """
+    media_types = {name: media_type for name, (_, media_type) in images.items()}
+    headers = {"Vary": "Accept"}
+
+    if payload == "multipart":
+        boundary = secrets.token_hex(16)
+        return Response(
+            multipart_body(metadata, images, boundary),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers=headers
+        )
+
+    if payload == "msgpack":
+        body = {**metadata, **{name: data for name, (data, _) in images.items()}, "media_types": media_types}
+        return Response(msgpack.packb(body, use_bin_type=True), media_type="application/msgpack", headers=headers)
+
+    body = {
+        **metadata,
+        **{name: base64.b64encode(data).decode("utf-8") for name, (data, _) in images.items()},
+        "media_types": media_types,
+    }
+    return JSONResponse(body, headers=headers)
@@ -0,0 +1,179 @@
+"""
+Persistent on-disk store of detection results
+SQLite file keyed by (image hash, model id) so work survives process restarts;
+bounded by entry count and byte budget with least-recently-used eviction
+"""
+import logging
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from detection_cache import Detections
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    image_hash  TEXT NOT NULL,
+    model_id    TEXT NOT NULL,
+    conf_floor  REAL NOT NULL,
+    height      INTEGER NOT NULL,
+    width       INTEGER NOT NULL,
+    boxes       BLOB NOT NULL,
+    confidences BLOB NOT NULL,
+    class_ids   BLOB NOT NULL,
+    nbytes      INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (image_hash, model_id)
+);
+CREATE INDEX IF NOT EXISTS detections_last_access ON detections (last_access);
+"""
+
+
+def _weights_id(model_id: str) -> str:
+    """"name/backend:weights-fingerprint" without any cascade gate suffix"""
+    return model_id.split("+", 1)[0]
+
+
+class ResultStore:
+    """
+    Detections persisted in SQLite.
+
+    Rows are stored per model id ("name/backend:weights-fingerprint", plus
+    "+gate..." behind a cascade gate). Opening the store for a model id drops
+    rows from other weights of the same registered model and backend, so
+    replacing yolo12n_3.pt invalidates its results automatically; rows of the
+    same weights with or without a gate are kept.
+    """
+
+    def __init__(self, path: Path, model_id: str, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10.0)
+        # WAL lets several uvicorn workers read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._invalidate_stale()
+
+    def _invalidate_stale(self):
+        # "name/backend:" compared exactly; LIKE would treat _ and % in names as wildcards
+        prefix = self.model_id.split(":", 1)[0] + ":"
+        weights = _weights_id(self.model_id)
+        with self._lock, self._conn:
+            model_ids = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT model_id FROM detections WHERE substr(model_id, 1, ?) = ?",
+                (len(prefix), prefix)
+            )]
+            removed = 0
+            for model_id in model_ids:
+                if _weights_id(model_id) != weights:
+                    removed += self._conn.execute(
+                        "DELETE FROM detections WHERE model_id = ?", (model_id,)
+                    ).rowcount
+        if removed:
+            log.info("Result store: dropped %d rows from previous %s weights", removed, prefix[:-1])
+
+    def get(self, image_hash: str, conf_floor: float) -> Optional[Detections]:
+        """
+        Stored detections for an image, if they were computed at a floor no
+        higher than the one requested.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT conf_floor, height, width, boxes, confidences, class_ids "
+                "FROM detections WHERE image_hash = ? AND model_id = ?",
+                (image_hash, self.model_id)
+            ).fetchone()
+            if row is None or row[0] > conf_floor:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE detections SET last_access = ? WHERE image_hash = ? AND model_id = ?",
+                    (time.time(), image_hash, self.model_id)
+                )
+            self.hits += 1
+
+        _, height, width, boxes, confidences, class_ids = row
+        return Detections(
+            boxes=np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4),
+            confidences=np.frombuffer(confidences, dtype=np.float32),
+            class_ids=np.frombuffer(class_ids, dtype=np.int32),
+            image_shape=(height, width)
+        ).filter(conf_floor)
+
+    def put(self, image_hash: str, conf_floor: float, detections: Detections):
+        now = time.time()
+        height, width = detections.image_shape
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    image_hash, self.model_id, conf_floor, height, width,
+                    detections.boxes.astype(np.float32).tobytes(),
+                    detections.confidences.astype(np.float32).tobytes(),
+                    detections.class_ids.astype(np.int32).tobytes(),
+                    detections.nbytes, now, now
+                )
+            )
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction
+        entries, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM detections"
+        ).fetchone()
+        while entries > self.max_entries or total_bytes > self.max_bytes:
+            # Oldest rows through the last_access index: enough for the entry
+            # budget, and for the byte budget at the average row size
+            excess = max(entries - self.max_entries, 0)
+            if total_bytes > self.max_bytes:
+                excess = max(excess, math.ceil((total_bytes - self.max_bytes) / max(total_bytes / entries, 1)))
+            removed = self._conn.execute(
+                "DELETE FROM detections WHERE rowid IN "
+                "(SELECT rowid FROM detections ORDER BY last_access LIMIT ?)",
+                (excess,)
+            ).rowcount
+            self.evictions += removed
+            if removed == 0:
+                return
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM detections"
+            ).fetchone()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM detections"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
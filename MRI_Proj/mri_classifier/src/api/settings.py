@@ -0,0 +1,171 @@
+"""
+Runtime configuration for the MRI Tumor Scanner API
+Every value can be overridden with an environment variable of the same name
+"""
+import os
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent      # → src/api/
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_int_list(name: str, default: str) -> tuple:
+    return tuple(int(v) for v in _env_str(name, default).split(",") if v.strip())
+
+
+# Detector weights and the backend that serves them (see backends.py)
+MODEL_PATH = Path(_env_str("MODEL_PATH", str(BASE_DIR / "yolo12n_3.pt")))
+MODEL_BACKEND = _env_str("MODEL_BACKEND", "pytorch")  # "pytorch", "onnx", "openvino" or "openvino_int8"
+
+# Server-Timing header and per-request stage log line (see timing.py)
+SERVER_TIMING_ENABLED = _env_bool("SERVER_TIMING_ENABLED", True)
+
+# Prometheus metrics at GET /metrics (see metrics.py); off skips request counting
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+
+# On-demand profiling (see profiling.py): requests sending X-Profile with
+# PROFILING_TOKEN, and every request to PROFILE_PATHS ("/scan,/compare-scans",
+# "*" for all), are run under cProfile. Profiles go to PROFILE_DIR, newest
+# PROFILE_KEEP kept. Both empty (the default) disables profiling
+PROFILING_TOKEN = _env_str("PROFILING_TOKEN", "")
+PROFILE_PATHS = [p.strip() for p in _env_str("PROFILE_PATHS", "").split(",") if p.strip()]
+PROFILE_DIR = Path(_env_str("PROFILE_DIR", str(BASE_DIR / "profiles")))
+PROFILE_KEEP = _env_int("PROFILE_KEEP", 50)
+
+# Token for the model management endpoints (POST /models, /models/{name}/load,
+# /models/{name}/default, DELETE /models/{name}), sent as X-Admin-Token.
+# Empty (the default) disables them; GET /models stays open
+ADMIN_TOKEN = _env_str("ADMIN_TOKEN", "")
+
+# Model registry (see model_registry.py). MODEL_PATH is registered under its
+# file stem; MODELS adds more as "name=path[@backend],..." with paths relative
+# to MODEL_DIR, and requests pick one with the "model" form field. Models other
+# than the default are unloaded after MODEL_IDLE_SECONDS without requests, or
+# least recently used first once MODEL_MEMORY_BUDGET_MB is exceeded (0 = no limit)
+MODEL_DIR = Path(_env_str("MODEL_DIR", str(BASE_DIR)))
+MODELS = _env_str("MODELS", "")
+DEFAULT_MODEL = _env_str("DEFAULT_MODEL", MODEL_PATH.stem)
+MODEL_MEMORY_BUDGET_MB = _env_int("MODEL_MEMORY_BUDGET_MB", 0)
+MODEL_IDLE_SECONDS = _env_int("MODEL_IDLE_SECONDS", 900)
+
+# Two-stage cascade (see cascade.py): a gate trained by calibrate_cascade.py
+# skips the detector for scans it is confident are clean. CASCADE_MARGIN
+# lowers its calibrated threshold for recall: 0 = as calibrated, 1 = never skip
+CASCADE_ENABLED = _env_bool("CASCADE_ENABLED", False)
+CASCADE_GATE_PATH = Path(_env_str("CASCADE_GATE_PATH", str(MODEL_PATH.parent / f"{MODEL_PATH.stem}_gate.json")))
+CASCADE_MARGIN = _env_float("CASCADE_MARGIN", 0.2)
+
+# Micro-batching of YOLO inference (see batching.py)
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 10.0)
+
+# Worker pools and per-endpoint admission control (see worker_pools.py)
+CPU_POOL_THREADS = _env_int("CPU_POOL_THREADS", min(4, os.cpu_count() or 1))
+REGISTRATION_PROCESSES = _env_int("REGISTRATION_PROCESSES", 2)
+SCAN_MAX_CONCURRENT = _env_int("SCAN_MAX_CONCURRENT", 16)
+SCAN_MAX_QUEUED = _env_int("SCAN_MAX_QUEUED", 64)
+REGISTRATION_MAX_CONCURRENT = _env_int("REGISTRATION_MAX_CONCURRENT", 2)
+REGISTRATION_MAX_QUEUED = _env_int("REGISTRATION_MAX_QUEUED", 8)
+SCAN_BATCH_MAX_CONCURRENT = _env_int("SCAN_BATCH_MAX_CONCURRENT", 2)
+SCAN_BATCH_MAX_QUEUED = _env_int("SCAN_BATCH_MAX_QUEUED", 4)
+RETRY_AFTER_SECONDS = _env_int("RETRY_AFTER_SECONDS", 2)
+
+# Native library threads per API process (see native_threads.py). Each of the
+# WEB_CONCURRENCY uvicorn workers gets NATIVE_THREADS, its share of the cores:
+# all of it for PyTorch, whose inference runs on one batch thread at a time,
+# divided between concurrent registrations for SimpleITK, and one thread per
+# call for OpenCV and BLAS, which already run on CPU_POOL_THREADS threads at
+# once. 0 leaves a library at its own default (every core)
+WEB_CONCURRENCY = _env_int("WEB_CONCURRENCY", 1)
+NATIVE_THREADS = _env_int("NATIVE_THREADS", max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY)))
+TORCH_THREADS = _env_int("TORCH_THREADS", NATIVE_THREADS)
+TORCH_INTEROP_THREADS = _env_int("TORCH_INTEROP_THREADS", 1)
+SITK_THREADS = _env_int("SITK_THREADS", max(1, NATIVE_THREADS // max(1, REGISTRATION_MAX_CONCURRENT)))
+OPENCV_THREADS = _env_int("OPENCV_THREADS", 1)
+BLAS_THREADS = _env_int("BLAS_THREADS", 1)
+
+# Minimum time between optimizer progress events on /register-scans/stream
+REGISTRATION_PROGRESS_INTERVAL_MS = _env_int("REGISTRATION_PROGRESS_INTERVAL_MS", 100)
+
+# Confidence-agnostic detection cache (see detection_cache.py)
+DETECTION_CONF_FLOOR = _env_float("DETECTION_CONF_FLOOR", 0.05)
+DETECTION_CACHE_ENTRIES = _env_int("DETECTION_CACHE_ENTRIES", 256)
+
+# Persistent on-disk result store (see result_store.py); point RESULT_STORE_PATH
+# at a persistent disk for results to survive redeploys
+RESULT_STORE_ENABLED = _env_bool("RESULT_STORE_ENABLED", True)
+RESULT_STORE_PATH = Path(_env_str("RESULT_STORE_PATH", str(BASE_DIR / "cache" / "detections.sqlite3")))
+RESULT_STORE_MAX_ENTRIES = _env_int("RESULT_STORE_MAX_ENTRIES", 10000)
+RESULT_STORE_MAX_MB = _env_int("RESULT_STORE_MAX_MB", 64)
+
+# Startup warm-up before /ready reports ready (see warmup.py)
+WARMUP_ENABLED = _env_bool("WARMUP_ENABLED", True)
+WARMUP_SIZES = _env_int_list("WARMUP_SIZES", "256,512,640")  # typical scan sizes in pixels
+WARMUP_RUNS = _env_int("WARMUP_RUNS", 2)
+WARMUP_REGISTRATION = _env_bool("WARMUP_REGISTRATION", True)
+
+# Response image encoding (see encoding.py); requests can override the format
+# with image_format or the Accept header
+IMAGE_FORMAT = _env_str("IMAGE_FORMAT", "png")          # "png", "webp" (lossless) or "jpeg"
+JPEG_QUALITY = _env_int("JPEG_QUALITY", 90)
+PNG_COMPRESS_LEVEL = _env_int("PNG_COMPRESS_LEVEL", 1)  # 0-9; 1 is ~3x faster than Pillow's default 6
+WEBP_METHOD = _env_int("WEBP_METHOD", 1)                # 0-6, higher is smaller and slower
+
+# Upload decoding (see decoding.py): detection-only decodes keep the long side
+# at least DECODE_DETECT_SIDE (the model input size); rendering and registration
+# decode at most DECODE_MAX_SIDE. 0 disables either reduction
+DECODE_DETECT_SIDE = _env_int("DECODE_DETECT_SIDE", 640)
+DECODE_MAX_SIDE = _env_int("DECODE_MAX_SIDE", 2048)
+
+# Sliced inference, opt-in per request with tiled=true on /scan and
+# /scan-with-mask (see tiling.py); requests can override size and overlap
+TILE_SIZE = _env_int("TILE_SIZE", 640)
+TILE_OVERLAP = _env_float("TILE_OVERLAP", 0.2)
+TILE_MERGE = _env_str("TILE_MERGE", "nms")               # "nms" or "fuse"
+TILE_IOU_THRESHOLD = _env_float("TILE_IOU_THRESHOLD", 0.5)
+TILE_INCLUDE_FULL = _env_bool("TILE_INCLUDE_FULL", True)  # also detect on the whole image
+TILE_MAX_TILES = _env_int("TILE_MAX_TILES", 64)
+
+# Upload limits and spooling (see uploads.py): bodies over UPLOAD_MAX_REQUEST_MB
+# and files over UPLOAD_MAX_FILE_MB get 413; each file is kept in memory up to
+# UPLOAD_SPOOL_KB and spilled to a temporary file beyond that. Images with more
+# than UPLOAD_MAX_PIXELS pixels are refused before they are decoded
+UPLOAD_MAX_FILE_MB = _env_int("UPLOAD_MAX_FILE_MB", 20)
+UPLOAD_MAX_REQUEST_MB = _env_int("UPLOAD_MAX_REQUEST_MB", 50)
+UPLOAD_SPOOL_KB = _env_int("UPLOAD_SPOOL_KB", 1024)
+UPLOAD_MAX_PIXELS = _env_int("UPLOAD_MAX_PIXELS", 50_000_000)
+UPLOAD_MAX_BATCH_MB = _env_int("UPLOAD_MAX_BATCH_MB", 1024)  # /scan-batch bodies and unpacked archives
+
+# /scan-batch (see main.scan_batch): images per request, and how many of one
+# request's images are in flight at once (enough to fill inference batches)
+SCAN_BATCH_MAX_FILES = _env_int("SCAN_BATCH_MAX_FILES", 1000)
+SCAN_BATCH_INFLIGHT = _env_int("SCAN_BATCH_INFLIGHT", 2 * BATCH_MAX_SIZE)
+
+# Background jobs (see jobs.py): POST /jobs/compare-scans runs comparisons
+# outside the request; results are kept for JOBS_TTL_SECONDS after finishing
+JOBS_STORE_PATH = Path(_env_str("JOBS_STORE_PATH", str(BASE_DIR / "cache" / "jobs.sqlite3")))
+JOBS_TTL_SECONDS = _env_int("JOBS_TTL_SECONDS", 3600)
+JOBS_MAX_RUNNING = _env_int("JOBS_MAX_RUNNING", max(1, REGISTRATION_PROCESSES))
+JOBS_MAX_QUEUED = _env_int("JOBS_MAX_QUEUED", 32)
+JOBS_MAX_WAIT_SECONDS = _env_int("JOBS_MAX_WAIT_SECONDS", 30)  # longest long-poll on GET /jobs/{id}
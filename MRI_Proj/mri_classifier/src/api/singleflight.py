@@ -0,0 +1,40 @@
+"""
+Single-flight coalescing of identical concurrent requests
+Callers with the same key share one in-flight computation and all receive its result
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async work by key.
+
+    The first caller for a key starts the computation as its own task; callers
+    arriving while it runs await the same task. The task is shielded, so one
+    client disconnecting does not cancel the work the others are waiting for.
+    Keys are forgotten as soon as the computation finishes; this is not a cache.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
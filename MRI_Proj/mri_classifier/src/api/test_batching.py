@@ -0,0 +1,159 @@
+"""
+Test script to verify the micro-batching inference queue
+Run with: python test_batching.py
+"""
+import asyncio
+import numpy as np
+from batching import MicroBatcher
+
+
+class FakeBoxes:
+    def __init__(self, conf):
+        self.conf = np.asarray(conf, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class FakeResults:
+    """Minimal stand-in for an ultralytics Results object"""
+
+    def __init__(self, image_id, conf):
+        self.image_id = image_id
+        self.boxes = FakeBoxes(conf)
+
+    def __getitem__(self, idx):
+        return FakeResults(self.image_id, self.boxes.conf[idx])
+
+
+def make_predict_fn(calls):
+    def predict(images, conf):
+        calls.append((len(images), conf))
+        # Every image yields the same three detections, filtered by the batch floor
+        all_conf = np.array([0.2, 0.55, 0.9])
+        return [FakeResults(image, all_conf[all_conf >= conf]) for image in images]
+    return predict
+
+
+def test_requests_are_batched():
+    """
+    Concurrent requests inside one window should share a single predict call.
+    """
+    print("=" * 60)
+    print("Testing Micro-Batching")
+    print("=" * 60)
+
+    calls = []
+
+    async def run():
+        batcher = MicroBatcher(make_predict_fn(calls), max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(*[batcher.predict(i, 0.1) for i in range(5)])
+        stats = batcher.stats()
+        await batcher.close()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+
+    print(f"   predict calls: {calls}")
+    print(f"   batch histogram: {stats['batch_size_histogram']}")
+    assert calls == [(5, 0.1)]
+    assert [r.image_id for r in results] == list(range(5))
+    assert stats["images"] == 5 and stats["batches"] == 1
+    print("✓ Five concurrent requests served by one batched predict")
+    return True
+
+
+def test_per_request_confidence():
+    """
+    Each request should only see detections at or above its own threshold.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Per-Request Confidence Thresholds")
+    print("=" * 60)
+
+    calls = []
+
+    async def run():
+        batcher = MicroBatcher(make_predict_fn(calls), max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(
+            batcher.predict("a", 0.1),
+            batcher.predict("b", 0.5),
+            batcher.predict("c", 0.95),
+        )
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    counts = [len(r.boxes) for r in results]
+
+    print(f"   predict calls: {calls}")
+    print(f"   detections per request: {counts}")
+    assert calls == [(3, 0.1)]  # batch runs at the lowest requested threshold
+    assert counts == [3, 2, 0]
+    print("✓ Confidence thresholds honoured within a shared batch")
+    return True
+
+
+def test_max_batch_size():
+    """
+    Batches should never exceed max_batch_size.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Max Batch Size")
+    print("=" * 60)
+
+    calls = []
+
+    async def run():
+        batcher = MicroBatcher(make_predict_fn(calls), max_batch_size=4, max_wait_ms=50)
+        await asyncio.gather(*[batcher.predict(i, 0.5) for i in range(10)])
+        stats = batcher.stats()
+        await batcher.close()
+        return stats
+
+    stats = asyncio.run(run())
+
+    print(f"   batch sizes: {[size for size, _ in calls]}")
+    assert sum(size for size, _ in calls) == 10
+    assert max(size for size, _ in calls) <= 4
+    assert stats["batches"] == len(calls)
+    print("✓ Batches capped at max_batch_size")
+    return True
+
+
+def test_predict_errors_propagate():
+    """
+    A failing batch should raise in every waiting handler.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Error Propagation")
+    print("=" * 60)
+
+    def failing_predict(images, conf):
+        raise RuntimeError("model exploded")
+
+    async def run():
+        batcher = MicroBatcher(failing_predict, max_batch_size=8, max_wait_ms=20)
+        outcomes = await asyncio.gather(
+            batcher.predict("a", 0.5),
+            batcher.predict("b", 0.5),
+            return_exceptions=True
+        )
+        stats = batcher.stats()
+        await batcher.close()
+        return outcomes, stats
+
+    outcomes, stats = asyncio.run(run())
+
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+    assert stats["errors"] == 1
+    print("✓ Errors delivered to all waiting requests")
+    return True
+
+
+if __name__ == "__main__":
+    test_requests_are_batched()
+    test_per_request_confidence()
+    test_max_batch_size()
+    test_predict_errors_propagate()
+    print("\n✅ All batching tests passed!")
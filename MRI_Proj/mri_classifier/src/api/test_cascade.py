@@ -0,0 +1,121 @@
+"""
+Test script to verify the cascade gate: training, calibration and screening
+Run with: python test_cascade.py
+"""
+import tempfile
+import numpy as np
+from pathlib import Path
+from PIL import Image
+from cascade import BackboneFeatures, CascadeGate, GateModel, recall_threshold, train_gate
+import settings
+
+
+def make_features(n=200, seed=0):
+    """Two overlapping classes; the first feature carries the signal"""
+    rng = np.random.default_rng(seed)
+    labels = np.arange(n) % 2 == 0
+    features = rng.normal(size=(n, 8)).astype(np.float32)
+    features[:, 0] += np.where(labels, 1.5, -1.5)
+    return features, labels
+
+
+def test_calibration():
+    """
+    The calibrated threshold should pass at least the target share of positives.
+    """
+    print("=" * 60)
+    print("Testing Gate Calibration")
+    print("=" * 60)
+
+    scores = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95])
+    labels = np.ones(10, dtype=bool)
+    assert recall_threshold(scores, labels, 1.0) == 0.1
+    assert recall_threshold(scores, labels, 0.9) == 0.2
+    assert recall_threshold(scores, labels, 0.8) == 0.3
+
+    features, labels = make_features()
+    gate = train_gate(features, labels, 0.95, imgsz=224, layers=(4,), weights_fingerprint="abc")
+    calibration = gate.calibration
+    print(f"   out-of-fold recall {calibration['out_of_fold_recall']:.3f}, "
+          f"clean skipped {calibration['out_of_fold_clean_skipped']:.3f}")
+    assert calibration["out_of_fold_recall"] >= 0.95
+    assert calibration["out_of_fold_clean_skipped"] > 0.5
+
+    # Held-out data from the same distribution
+    test_features, test_labels = make_features(seed=1)
+    passed = gate.score(test_features) >= gate.threshold
+    print(f"   held-out recall {passed[test_labels].mean():.3f}")
+    assert passed[test_labels].mean() >= 0.9
+
+    print("✓ Threshold meets the recall target out of sample")
+    return True
+
+
+def test_screening():
+    """
+    Gates should round-trip through JSON and skip only scans below the (margin-adjusted) threshold.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Screening and Margin")
+    print("=" * 60)
+
+    features, labels = make_features()
+    model = train_gate(features, labels, 0.95, imgsz=224, layers=(4,), weights_fingerprint="abc")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "gate.json"
+        model.save(path)
+        loaded = GateModel.load(path)
+    assert loaded.fingerprint == model.fingerprint and loaded.layers == (4,)
+    np.testing.assert_allclose(loaded.score(features), model.score(features), rtol=1e-5)
+
+    clean = np.full((1, 8), 0, dtype=np.float32)
+    clean[0, 0] = -4.0
+    image = Image.new("RGB", (32, 32))
+    strict = CascadeGate(loaded, lambda images: clean, margin=0.0)
+    passed, score = strict.screen(image)
+    print(f"   clean scan scored {score:.4f} against threshold {strict.threshold:.4f}")
+    assert not passed and strict.stats()["skipped"] == 1
+
+    never_skips = CascadeGate(loaded, lambda images: clean, margin=1.0)
+    assert never_skips.screen(image)[0] and never_skips.stats()["skip_rate"] == 0.0
+    assert strict.id != never_skips.id
+
+    try:
+        CascadeGate(loaded, lambda images: clean, margin=1.5)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    print("✓ Saved gates reload exactly, margin 1 disables skipping")
+    return True
+
+
+def test_backbone_features():
+    """
+    Features should come from the detector's backbone at the gate's input size.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Backbone Features")
+    print("=" * 60)
+
+    if not settings.MODEL_PATH.exists():
+        print(f"   skipped: no weights at {settings.MODEL_PATH}")
+        return True
+
+    features = BackboneFeatures(settings.MODEL_PATH, imgsz=128, layers=(4, 6))
+    images = [Image.new("RGB", (300, 200), (40, 40, 40)), Image.new("RGB", (512, 512), (200, 200, 200))]
+    x = features(images)
+    print(f"   feature shape {x.shape}")
+    assert x.shape[0] == 2 and x.dtype == np.float32
+    assert np.isfinite(x).all() and not np.allclose(x[0], x[1])
+    np.testing.assert_allclose(features(images[:1]), x[:1], rtol=1e-4, atol=1e-5)
+
+    print("✓ Pooled activations per scan")
+    return True
+
+
+if __name__ == "__main__":
+    test_calibration()
+    test_screening()
+    test_backbone_features()
+    print("\n✅ All cascade tests passed!")
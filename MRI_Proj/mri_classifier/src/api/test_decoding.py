@@ -0,0 +1,133 @@
+"""
+Test script to verify size-aware upload decoding
+Run with: python test_decoding.py
+"""
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from decoding import ImageDecoder, ImageTooLargeError
+from detection_cache import Detections
+
+
+def encode(size, fmt, mode="RGB"):
+    rng = np.random.default_rng(0)
+    shape = (size[1], size[0], 3) if mode == "RGB" else (size[1], size[0])
+    buf = BytesIO()
+    Image.fromarray(rng.integers(0, 255, shape, dtype=np.uint8)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_jpeg_draft_decode():
+    """
+    Large JPEGs should be DCT-scaled: >= detect_side for detection, <= max_side for display.
+    """
+    print("=" * 60)
+    print("Testing JPEG Draft Decoding")
+    print("=" * 60)
+
+    decoder = ImageDecoder(detect_side=640, max_side=2048)
+    raw = encode((3000, 2200), "JPEG")
+
+    detect = decoder.for_detection(raw)
+    display = decoder.for_display(raw)
+    full = decoder.decode(raw)
+    print(f"   detection {detect.image.size}, display {display.image.size}, full {full.image.size}")
+
+    assert detect.original_size == (3000, 2200) and detect.original_shape == (2200, 3000)
+    assert 640 <= max(detect.image.size) < 1280 and detect.reduced
+    assert max(display.image.size) <= 2048 and display.image.mode == "RGB"
+    assert full.image.size == (3000, 2200) and not full.reduced
+
+    small = decoder.for_detection(encode((500, 400), "JPEG"))
+    assert small.image.size == (500, 400)
+
+    gray = decoder.decode(encode((1600, 1600), "JPEG", "L"), "L", max_side=512)
+    assert gray.image.mode == "L" and gray.image.size == (400, 400)
+
+    print("✓ JPEGs decoded at reduced resolution")
+    return True
+
+
+def test_non_jpeg_limits():
+    """
+    Formats without DCT scaling decode fully but are still capped at max_side.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Non-JPEG Decoding")
+    print("=" * 60)
+
+    decoder = ImageDecoder(detect_side=640, max_side=1000)
+    raw = encode((2500, 1200), "PNG")
+    assert decoder.for_detection(raw).image.size == (2500, 1200)
+    display = decoder.for_display(raw)
+    print(f"   display {display.image.size}")
+    assert max(display.image.size) <= 1000
+
+    # The tiled path reduces its full decode for display instead of decoding twice
+    derived = decoder.display_from(decoder.decode(raw))
+    assert derived.image.size == display.image.size and derived.original_size == (2500, 1200)
+    assert np.array_equal(np.array(derived.image), np.array(display.image))
+
+    stats = decoder.stats.as_dict()
+    print(f"   stats: {stats}")
+    assert stats["images"] == 3 and stats["reduced"] == 1
+    assert 0 < stats["decoded_pixel_fraction"] < 1
+
+    print("✓ PNG capped with Image.reduce, stats recorded, display derivable from a full decode")
+    return True
+
+
+def test_file_source_and_pixel_limit():
+    """
+    Files decode like bytes; images over max_pixels are refused before decoding.
+    """
+    print("\n" + "=" * 60)
+    print("Testing File Sources and Pixel Limit")
+    print("=" * 60)
+
+    decoder = ImageDecoder(detect_side=640, max_side=2048, max_pixels=1000 * 1000)
+    raw = encode((900, 800), "JPEG")
+    from_file = decoder.for_display(BytesIO(raw))
+    assert np.array_equal(np.array(from_file.image), np.array(decoder.for_display(raw).image))
+
+    try:
+        decoder.decode(encode((1200, 900), "PNG"))
+        assert False, "expected ImageTooLargeError"
+    except ImageTooLargeError as e:
+        print(f"   {e}")
+        assert e.size == (1200, 900)
+    assert decoder.stats.as_dict()["images"] == 2
+
+    print("✓ Spooled files decoded, oversized images refused")
+    return True
+
+
+def test_boxes_mapped_to_original():
+    """
+    Detections from a reduced decode should map back to original pixels.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Box Rescaling")
+    print("=" * 60)
+
+    reduced = Detections(
+        boxes=np.array([[10, 20, 50, 60]], dtype=np.float32),
+        confidences=np.array([0.8], dtype=np.float32),
+        class_ids=np.array([0], dtype=np.int32),
+        image_shape=(550, 500)
+    )
+    original = reduced.resized((2200, 2000))
+    np.testing.assert_allclose(original.boxes, [[40, 80, 200, 240]])
+    assert original.image_shape == (2200, 2000)
+    assert reduced.resized((550, 500)) is reduced
+
+    print("✓ Boxes scaled by the decode ratio")
+    return True
+
+
+if __name__ == "__main__":
+    test_jpeg_draft_decode()
+    test_non_jpeg_limits()
+    test_file_source_and_pixel_limit()
+    test_boxes_mapped_to_original()
+    print("\n✅ All decoding tests passed!")
@@ -0,0 +1,103 @@
+"""
+Test script to verify the confidence-agnostic detection cache
+Run with: python test_detection_cache.py
+"""
+import numpy as np
+from detection_cache import DetectionCache, Detections, image_digest
+
+
+def make_detections():
+    return Detections(
+        boxes=np.array([[10, 10, 50, 50], [60, 60, 90, 90], [5, 5, 20, 20]], dtype=np.float32),
+        confidences=np.array([0.9, 0.4, 0.1], dtype=np.float32),
+        class_ids=np.array([0, 0, 0], dtype=np.int32),
+        image_shape=(100, 100)
+    )
+
+
+def test_filter_by_confidence():
+    """
+    Filtering cached detections should match predicting at that threshold.
+    """
+    print("=" * 60)
+    print("Testing Detection Filtering")
+    print("=" * 60)
+
+    detections = make_detections()
+    for threshold, expected in [(0.05, 3), (0.4, 2), (0.5, 1), (0.95, 0)]:
+        filtered = detections.filter(threshold)
+        print(f"   conf >= {threshold}: {len(filtered)} detections")
+        assert len(filtered) == expected
+        assert filtered.boxes.shape == (expected, 4)
+        assert filtered.image_shape == (100, 100)
+
+    print("✓ Thresholds applied to cached arrays")
+    return True
+
+
+def test_image_digest():
+    """
+    Digests should depend only on the upload bytes.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Image Digests")
+    print("=" * 60)
+
+    assert image_digest(b"scan") == image_digest(b"scan")
+    assert image_digest(b"scan") != image_digest(b"scan2")
+    assert len(image_digest(b"scan")) == 64
+
+    print("✓ Digests change with content")
+    return True
+
+
+def test_to_dict():
+    """
+    The JSON form should carry boxes, confidences, class ids and image size only.
+    """
+    print("\n" + "=" * 60)
+    print("Testing JSON Serialisation")
+    print("=" * 60)
+
+    payload = make_detections().filter(0.4).to_dict()
+    print(f"   payload: {payload}")
+    assert payload["num_detections"] == 2
+    assert payload["boxes"] == [[10.0, 10.0, 50.0, 50.0], [60.0, 60.0, 90.0, 90.0]]
+    assert payload["class_ids"] == [0, 0]
+    assert payload["image_width"] == 100 and payload["image_height"] == 100
+    assert set(payload) == {"num_detections", "boxes", "confidences", "class_ids", "image_width", "image_height"}
+
+    print("✓ Detections serialised without any image data")
+    return True
+
+
+def test_lru_eviction():
+    """
+    The cache should hold at most max_entries, evicting the least recently used.
+    """
+    print("\n" + "=" * 60)
+    print("Testing LRU Eviction")
+    print("=" * 60)
+
+    cache = DetectionCache(max_entries=2)
+    cache.put("a", make_detections())
+    cache.put("b", make_detections())
+    assert cache.get("a") is not None      # "a" becomes most recently used
+    cache.put("c", make_detections())      # evicts "b"
+
+    stats = cache.stats()
+    print(f"   stats: {stats}")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+    print("✓ Least recently used entry evicted")
+    return True
+
+
+if __name__ == "__main__":
+    test_filter_by_confidence()
+    test_image_digest()
+    test_to_dict()
+    test_lru_eviction()
+    print("\n✅ All detection cache tests passed!")
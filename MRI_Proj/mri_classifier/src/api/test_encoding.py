@@ -0,0 +1,103 @@
+"""
+Test script to verify content-negotiated response image encoding
+Run with: python test_encoding.py
+"""
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from encoding import ImageEncoder, OutputEncoding
+
+
+def test_negotiation():
+    """
+    image_format should win over Accept; Accept q-values pick among supported types.
+    """
+    print("=" * 60)
+    print("Testing Format Negotiation")
+    print("=" * 60)
+
+    encoder = ImageEncoder(default_format="png", jpeg_quality=90)
+    cases = [
+        (None, None, "png"),
+        ("application/json", None, "png"),
+        ("*/*", None, "png"),
+        ("image/avif,image/webp,image/apng,image/*,*/*;q=0.8", None, "webp"),
+        ("image/png;q=0.5, image/jpeg;q=0.9", None, "jpeg"),
+        ("image/webp;q=0", None, "png"),
+        ("image/webp", "jpg", "jpeg"),
+    ]
+    for accept, image_format, expected in cases:
+        encoding = encoder.negotiate(accept, image_format)
+        print(f"   Accept={accept!r} image_format={image_format!r} -> {encoding.format}")
+        assert encoding.format == expected
+
+    assert encoder.negotiate(quality=60).quality == 60
+    for bad in ({"image_format": "gif"}, {"quality": 0}):
+        try:
+            encoder.negotiate(**bad)
+            assert False, f"{bad} should be rejected"
+        except ValueError:
+            pass
+
+    print("✓ Formats negotiated and invalid requests rejected")
+    return True
+
+
+def test_round_trip():
+    """
+    PNG and WebP should be lossless; JPEG should decode to the same size.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Encoded Output")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (64, 80, 3), dtype=np.uint8)
+    encoder = ImageEncoder()
+
+    for fmt in ("png", "webp", "jpeg"):
+        data = encoder.encode(image, OutputEncoding(fmt, 85))
+        decoded = np.array(Image.open(BytesIO(data)).convert("RGB"))
+        print(f"   {fmt}: {len(data)} bytes")
+        assert decoded.shape == image.shape
+        if fmt != "jpeg":
+            np.testing.assert_array_equal(decoded, image)
+
+    stats = encoder.stats()["formats"]
+    assert set(stats) == {"png", "webp", "jpeg"} and stats["png"]["images"] == 1
+
+    print("✓ Lossless formats round-trip exactly, metrics recorded per format")
+    return True
+
+
+def test_masks_stay_lossless():
+    """
+    Binary masks become 1-bit PNG; JPEG requests fall back to PNG for masks.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Mask Encoding")
+    print("=" * 60)
+
+    mask = np.zeros((50, 60), dtype=np.uint8)
+    mask[10:30, 20:40] = 255
+    encoder = ImageEncoder()
+
+    data, media_type = encoder.encode_mask(mask, OutputEncoding("jpeg", 50), binary=True)
+    decoded = Image.open(BytesIO(data))
+    assert media_type == "image/png" and decoded.mode == "1"
+    np.testing.assert_array_equal(np.array(decoded.convert("L")), mask)
+
+    confidence_mask = np.linspace(0, 255, 50 * 60).astype(np.uint8).reshape(50, 60)
+    data, media_type = encoder.encode_mask(confidence_mask, OutputEncoding("webp", 90), binary=False)
+    assert media_type == "image/webp"
+    np.testing.assert_array_equal(np.array(Image.open(BytesIO(data)).convert("L")), confidence_mask)
+
+    print("✓ Masks decoded exactly")
+    return True
+
+
+if __name__ == "__main__":
+    test_negotiation()
+    test_round_trip()
+    test_masks_stay_lossless()
+    print("\n✅ All encoding tests passed!")
@@ -0,0 +1,193 @@
+"""
+Test script to verify background jobs and their result store
+Run with: python test_jobs.py
+"""
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from jobs import JobManager, JobNotFoundError, JobStore
+from worker_pools import ServerBusyError
+
+IMAGES = {"registered_image": (b"\x89PNG...", "image/png"), "visualization": (b"RIFF...", "image/webp")}
+
+
+def test_job_lifecycle():
+    """
+    A job should go queued -> running -> done, with its result stored for fetching.
+    """
+    print("=" * 60)
+    print("Testing Job Lifecycle")
+    print("=" * 60)
+
+    async def run(store):
+        manager = JobManager(store, max_running=1)
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return {"metrics": {"pixels_changed": 3}}, IMAGES
+
+        job = await manager.submit("compare-scans", work)
+        assert job.status == "queued"
+        await asyncio.sleep(0.01)
+        running = await manager.get(job.job_id)
+        assert running.status == "running" and await manager.result(job.job_id) is None
+
+        # Long poll times out while running, then returns as soon as the job ends
+        timed_out = await manager.wait(job.job_id, 0.05)
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        t0 = time.perf_counter()
+        done = await manager.wait(job.job_id, 5)
+        waited = time.perf_counter() - t0
+        result = await manager.result(job.job_id)
+        await manager.close()
+        return timed_out, done, waited, result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timed_out, done, waited, result = asyncio.run(run(JobStore(Path(tmp) / "jobs.sqlite3", ttl_seconds=60)))
+
+    print(f"   long poll returned after {waited * 1000:.0f} ms")
+    assert timed_out.status == "running"
+    assert done.status == "done" and done.complete and done.expires > done.finished
+    assert waited < 1
+    assert result == ({"metrics": {"pixels_changed": 3}}, IMAGES)
+    assert list(result[1]) == list(IMAGES)
+
+    print("✓ Status transitions, long polling and stored results")
+    return True
+
+
+def test_failures_and_limits():
+    """
+    Failing jobs keep their error; submissions beyond max_queued are rejected.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Failures and Queue Limit")
+    print("=" * 60)
+
+    async def run(store):
+        manager = JobManager(store, max_running=1, max_queued=2, retry_after=4)
+        never = asyncio.Event()
+
+        async def fail():
+            raise ValueError("cannot identify image file")
+
+        async def block():
+            await never.wait()
+
+        failed = await manager.submit("compare-scans", fail)
+        failed = await manager.wait(failed.job_id, 5)
+
+        await manager.submit("compare-scans", block)
+        await manager.submit("compare-scans", block)
+        try:
+            await manager.submit("compare-scans", block)
+            assert False, "expected ServerBusyError"
+        except ServerBusyError as e:
+            assert e.retry_after == 4
+
+        try:
+            await manager.get("missing")
+            assert False, "expected JobNotFoundError"
+        except JobNotFoundError:
+            pass
+        stats = manager.stats()
+        await manager.close()
+        return failed, stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failed, stats = asyncio.run(run(JobStore(Path(tmp) / "jobs.sqlite3")))
+
+    print(f"   stats: {stats}")
+    assert failed.status == "failed" and failed.error == "cannot identify image file"
+    assert stats["submitted"] == 3 and stats["rejected"] == 1 and stats["active"] == 2
+
+    print("✓ Errors recorded, queue bounded with Retry-After")
+    return True
+
+
+def test_ttl_and_restart():
+    """
+    Results expire after the TTL; unfinished jobs are failed when the store reopens.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Expiry and Restart")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "jobs.sqlite3"
+        store = JobStore(path, ttl_seconds=0.2)
+        store.create("finished", "compare-scans")
+        store.set_done("finished", {}, IMAGES)
+        store.create("interrupted", "compare-scans")
+        store.set_running("interrupted")
+        assert store.result("finished") is not None
+        time.sleep(0.3)
+        assert store.get("finished") is None and store.result("finished") is None
+        assert store.purge_expired() == 1
+        store.close()
+
+        store = JobStore(path, ttl_seconds=60)
+        interrupted = store.get("interrupted")
+        stats = store.stats()
+        store.close()
+
+    print(f"   after restart: {interrupted.status}, {interrupted.error}")
+    assert interrupted.status == "failed"
+    assert stats["jobs"] == {"failed": 1} and stats["result_bytes"] == 0
+
+    print("✓ Expired results purged, interrupted jobs failed on reopen")
+    return True
+
+
+def _start_job_and_exit(path: str):
+    store = JobStore(Path(path))
+    store.create("orphaned", "compare-scans")
+    store.set_running("orphaned")
+    # Exits without closing, like a killed worker
+
+
+def test_shared_store_across_workers():
+    """
+    A store opening a file shared with a running worker should leave that
+    worker's jobs alone, and fail only the jobs of a worker that exited.
+    """
+    print("\n" + "=" * 60)
+    print("Testing a Store Shared by Several Workers")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "jobs.sqlite3"
+        worker = multiprocessing.get_context("spawn").Process(target=_start_job_and_exit, args=(str(path),))
+        worker.start()
+        worker.join()
+
+        first = JobStore(path, ttl_seconds=60)
+        first.create("live", "compare-scans")
+        first.set_running("live")
+        second = JobStore(path, ttl_seconds=60)   # another worker booting
+        live, orphaned = second.get("live"), second.get("orphaned")
+        assert second.purge_expired() == 0 and first.get("live").status == "running"
+
+        first.close()                              # the first worker stops
+        second.purge_expired()
+        stopped = second.get("live")
+        second.close()
+
+    print(f"   while running: {live.status}; exited worker's job: {orphaned.status}; after stop: {stopped.status}")
+    assert live.status == "running"
+    assert orphaned.status == "failed"
+    assert stopped.status == "failed"
+
+    print("✓ Live jobs of other workers kept, jobs of stopped workers failed")
+    return True
+
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_failures_and_limits()
+    test_ttl_and_restart()
+    test_shared_store_across_workers()
+    print("\n✅ All job tests passed!")
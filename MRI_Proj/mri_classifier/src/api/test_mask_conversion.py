@@ -10,7 +10,11 @@ from ultralytics import YOLO
 from mask_utils import (
     extract_boxes_and_confidences,
     boxes_to_binary_mask,
-    boxes_to_confidence_mask
+    boxes_to_confidence_mask,
+    box_iou,
+    boxes_to_mask_dict,
+    mask_to_rle,
+    mask_from_dict
 )
 
 # Add parent directory to path
@@ -202,8 +206,69 @@ def test_with_synthetic_data():
     return True
 
 
+def test_box_iou():
+    """
+    Test pairwise IoU between box sets.
+    """
+    print("\n📐 Testing box IoU...")
+    
+    boxes_a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    boxes_b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]], dtype=np.float32)
+    
+    ious = box_iou(boxes_a, boxes_b)
+    print(f"   IoU matrix:\n{ious}")
+    
+    assert ious.shape == (2, 3)
+    assert np.isclose(ious[0, 0], 1.0)
+    assert np.isclose(ious[0, 1], 50 / 150)  # half overlap: 50 / (100 + 100 - 50)
+    assert np.all(ious[1] == 0)
+    assert box_iou(np.zeros((0, 4)), boxes_b).shape == (0, 3)
+    
+    print("   ✓ IoU values correct")
+    return True
+
+
+def test_compact_masks():
+    """
+    Test that box-list and RLE masks decode to exactly the rasterised masks.
+    """
+    print("\n🗜️  Testing compact mask formats...")
+    
+    boxes = np.array([[10.7, 5.2, 40.9, 30.1], [30, 20, 70, 45], [-5, 40, 20, 60]], dtype=np.float32)
+    confidences = np.array([0.9, 0.6, 0.3], dtype=np.float32)
+    shape = (50, 80)
+    
+    binary = boxes_to_binary_mask(boxes, shape, confidences)
+    confidence = (boxes_to_confidence_mask(boxes, confidences, shape) * 255).astype(np.uint8)
+    
+    for name, mask, mask_type in (("binary", binary, "binary"), ("confidence", confidence, "confidence")):
+        as_boxes = boxes_to_mask_dict(boxes, confidences, shape, mask_type)
+        as_rle = mask_to_rle(mask)
+        print(f"   {name}: {len(as_boxes['boxes'])} boxes, {len(as_rle['counts'])} runs")
+        assert np.array_equal(mask_from_dict(as_boxes), mask)
+        assert np.array_equal(mask_from_dict(as_rle), mask)
+    
+    # Binary RLE alternates background/foreground without storing values
+    rle = mask_to_rle(binary)
+    assert "values" not in rle and sum(rle["counts"]) == 50 * 80
+    full = mask_to_rle(np.full((4, 4), 255, np.uint8))
+    assert full["counts"] == [0, 16]
+    
+    for bad in ({"format": "rle", "size": [2, 2], "counts": [3]}, {"format": "svg", "size": [2, 2]}, {}):
+        try:
+            mask_from_dict(bad)
+            assert False, f"{bad} should be rejected"
+        except ValueError:
+            pass
+    
+    print("   ✓ Compact masks round-trip exactly")
+    return True
+
+
 if __name__ == "__main__":
     # Allow passing image path as argument
     image_path = sys.argv[1] if len(sys.argv) > 1 else None
     test_mask_conversion(image_path)
+    test_box_iou()
+    test_compact_masks()
 
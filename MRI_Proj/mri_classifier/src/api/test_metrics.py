@@ -0,0 +1,190 @@
+"""
+Test script to verify the Prometheus metrics registry and exposition format
+Run with: python test_metrics.py
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from metrics import REGISTRY, CumulativeTotals, Gauge, Histogram, MetricsMiddleware, Registry, run_collected
+from registration_utils import REGISTRATION_ITERATIONS
+
+
+def parse_samples(text: str) -> dict:
+    """{'name{labels}': value} for every sample line of a scrape"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            samples[key] = float(value)
+    return samples
+
+
+def test_exposition_format():
+    """
+    Counters, gauges and histograms should render as Prometheus text, with
+    cumulative buckets and escaped label values.
+    """
+    print("=" * 60)
+    print("Testing the Exposition Format")
+    print("=" * 60)
+
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("path",))
+    requests.labels(path="/scan").inc()
+    requests.labels(path="/scan").inc(2)
+    requests.labels(path='say "hi"').inc()
+    registry.gauge("temperature", "Current temperature").set(21.5)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    def collector():
+        depth = Gauge("queue_depth", "Queued images", ("model",))
+        depth.labels(model="yolo").set(4)
+        return [depth]
+
+    def broken():
+        raise RuntimeError("stats unavailable")
+
+    registry.add_collector(collector)
+    registry.add_collector(broken)
+
+    text = registry.render()
+    print(text)
+    samples = parse_samples(text)
+    assert "# TYPE requests_total counter" in text and "# TYPE latency_seconds histogram" in text
+    assert samples['requests_total{path="/scan"}'] == 3
+    assert samples['requests_total{path="say \\"hi\\""}'] == 1
+    assert samples["temperature"] == 21.5
+    assert samples['latency_seconds_bucket{le="0.1"}'] == 2
+    assert samples['latency_seconds_bucket{le="1"}'] == 3
+    assert samples['latency_seconds_bucket{le="+Inf"}'] == 4
+    assert samples["latency_seconds_count"] == 4 and samples["latency_seconds_sum"] == 3.65
+    assert samples['queue_depth{model="yolo"}'] == 4
+    assert parse_samples(REGISTRY.render())["process_resident_memory_bytes"] > 0
+
+    for bad in (lambda: requests.inc(), lambda: requests.labels(route="/scan"), lambda: requests.labels(path="/").inc(-1)):
+        try:
+            bad()
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+    try:
+        registry.gauge("requests_total", "Requests", ("path",))
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+
+    print("✓ Samples rendered correctly; a failing collector is skipped")
+    return True
+
+
+def _register_in_worker(iterations: int) -> str:
+    REGISTRATION_ITERATIONS.labels(type="rigid").observe(iterations)
+    return "registered"
+
+
+def test_worker_observations_relayed():
+    """
+    Histogram observations made in a worker process should reach the
+    parent's registry through run_collected and replay.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Observations from a Worker Process")
+    print("=" * 60)
+
+    registry = Registry()
+    iterations = registry.register(Histogram(
+        "registration_iterations", "Iterations", ("type",), buckets=REGISTRATION_ITERATIONS.buckets
+    ))
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result, observations = pool.submit(run_collected, _register_in_worker, 37).result()
+    registry.replay(observations)
+
+    samples = parse_samples(registry.render())
+    print(f"   observations: {observations}")
+    assert result == "registered"
+    assert samples['registration_iterations_count{type="rigid"}'] == 1
+    assert samples['registration_iterations_bucket{type="rigid",le="30"}'] == 0
+    assert samples['registration_iterations_bucket{type="rigid",le="40"}'] == 1
+    assert iterations.labels(type="rigid").sum == 37
+
+    print("✓ Worker observation replayed into the parent registry")
+    return True
+
+
+def test_http_middleware():
+    """
+    Requests should be counted by route template and status, with latency
+    histograms and an in-flight gauge.
+    """
+    print("\n" + "=" * 60)
+    print("Testing HTTP Request Metrics")
+    print("=" * 60)
+
+    registry = Registry()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    @app.get("/jobs/{job_id}")
+    async def job(job_id: str):
+        if job_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"job_id": job_id}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in ("/jobs/a", "/jobs/b", "/jobs/missing", "/nowhere"):
+                await client.get(path)
+
+    asyncio.run(run())
+    samples = parse_samples(registry.render())
+    for key, value in samples.items():
+        if key.startswith("http_requests"):
+            print(f"   {key} {value}")
+    assert samples['http_requests_total{path="/jobs/{job_id}",method="GET",status="200"}'] == 2
+    assert samples['http_requests_total{path="/jobs/{job_id}",method="GET",status="404"}'] == 1
+    assert samples['http_requests_total{path="other",method="GET",status="404"}'] == 1
+    assert samples['http_request_duration_seconds_count{path="/jobs/{job_id}",method="GET"}'] == 3
+    assert samples["http_requests_in_flight"] == 0
+
+    print("✓ Requests counted per route template, not per job id")
+    return True
+
+
+def test_totals_survive_swaps():
+    """
+    Totals over sources should keep counting when a source is replaced by
+    one counting from zero, as after a model hot swap or eviction.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Totals Across Swapped Sources")
+    print("=" * 60)
+
+    totals = CumulativeTotals()
+    totals.update("old", {"batches": 5, "skipped": 0})
+    totals.update("old", {"batches": 8, "skipped": 0})
+    totals.retire("old", {"batches": 9, "skipped": 1})
+    totals.update("new", {"batches": 2, "skipped": 0})
+    print(f"   after swap: {totals.totals()}")
+    assert totals.totals() == {"batches": 11, "skipped": 1}
+
+    # Reloading the same weights may reuse a source key; it starts over cleanly
+    totals.retire("new", {"batches": 3, "skipped": 0})
+    totals.update("new", {"batches": 1, "skipped": 0})
+    assert totals.totals() == {"batches": 13, "skipped": 1}
+
+    print("✓ Counters stay monotonic across swaps")
+    return True
+
+
+if __name__ == "__main__":
+    test_exposition_format()
+    test_worker_observations_relayed()
+    test_http_middleware()
+    test_totals_survive_swaps()
+    print("\n✅ All metrics tests passed!")
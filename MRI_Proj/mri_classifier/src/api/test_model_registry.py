@@ -0,0 +1,193 @@
+"""
+Test script to verify the model registry: lazy loading, hot-swapping and eviction
+Run with: python test_model_registry.py
+"""
+import asyncio
+from pathlib import Path
+
+from model_registry import ModelNotFoundError, ModelRegistry, ModelSpec, parse_model_specs
+
+
+class FakeModels:
+    """load/unload callbacks that record what happened instead of loading weights"""
+
+    def __init__(self, nbytes: int = 100, delay: float = 0.02):
+        self.nbytes = nbytes
+        self.delay = delay
+        self.loaded = []
+        self.unloaded = []
+
+    async def load(self, spec: ModelSpec) -> dict:
+        await asyncio.sleep(self.delay)
+        self.loaded.append(spec.name)
+        return {"name": spec.name, "path": spec.path.name}
+
+    async def unload(self, value: dict):
+        self.unloaded.append(value["name"])
+
+    def registry(self, names, default, **kwargs) -> ModelRegistry:
+        specs = [ModelSpec(name, Path(f"{name}.pt")) for name in names]
+        return ModelRegistry(
+            specs, default, self.load, self.unload, footprint=lambda value: self.nbytes, **kwargs
+        )
+
+
+def test_lazy_loading_and_selection():
+    """
+    Models should load on first use, once for concurrent first requests, and
+    unknown names should raise ModelNotFoundError.
+    """
+    print("=" * 60)
+    print("Testing Lazy Loading and Model Selection")
+    print("=" * 60)
+
+    fake = FakeModels()
+
+    async def run():
+        registry = fake.registry(["main", "alt"], "main")
+        assert registry.stats()["models"]["alt"]["loaded"] is False
+
+        async def request(name=None):
+            async with registry.use(name) as value:
+                await asyncio.sleep(0.01)
+                return value["name"]
+
+        names = await asyncio.gather(request(), request("alt"), request("alt"), request("alt"))
+        try:
+            registry.resolve("missing")
+            raise AssertionError("expected ModelNotFoundError")
+        except ModelNotFoundError as e:
+            print(f"   {e}")
+        return registry, names
+
+    registry, names = asyncio.run(run())
+    stats = registry.stats()
+    print(f"   loads: {fake.loaded}")
+    assert names == ["main", "alt", "alt", "alt"]
+    assert sorted(fake.loaded) == ["alt", "main"]
+    assert stats["models"]["alt"]["requests"] == 3 and stats["models"]["alt"]["active"] == 0
+
+    print("✓ Each model loaded once, requests got the model they asked for")
+    return True
+
+
+def test_hot_swap_keeps_running_requests():
+    """
+    Swapping the default or replacing a model's weights should leave requests
+    already holding the old model untouched, and unload it once they finish.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Hot-Swap with Requests in Flight")
+    print("=" * 60)
+
+    fake = FakeModels()
+
+    async def run():
+        registry = fake.registry(["main", "alt"], "main")
+        release = asyncio.Event()
+
+        async def slow_request():
+            async with registry.use() as value:
+                await release.wait()
+                return value["path"]
+
+        running = asyncio.ensure_future(slow_request())
+        await asyncio.sleep(0.05)
+
+        # New weights under the same name while a request holds the old ones
+        await registry.register(ModelSpec("main", Path("main-v2.pt")))
+        async with registry.use("main") as value:
+            replaced = value["path"]
+        draining = registry.stats()["draining"]
+        unloaded_while_running = list(fake.unloaded)
+
+        await registry.set_default("alt")
+        async with registry.use() as value:
+            default = value["name"]
+
+        release.set()
+        return registry, await running, replaced, draining, unloaded_while_running, default
+
+    registry, old, replaced, draining, unloaded_while_running, default = asyncio.run(run())
+    print(f"   running request finished on {old}, new requests got {replaced}")
+    assert old == "main.pt" and replaced == "main-v2.pt"
+    assert draining == ["main"] and unloaded_while_running == []
+    assert fake.unloaded == ["main"] and registry.stats()["draining"] == []
+    assert default == "alt" and registry.default == "alt"
+
+    print("✓ Old weights drained before unloading; default swapped without a gap")
+    return True
+
+
+def test_eviction():
+    """
+    Over the memory budget, idle non-default models should be unloaded least
+    recently used first; idle models should also go after idle_seconds.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Budget and Idle Eviction")
+    print("=" * 60)
+
+    fake = FakeModels(nbytes=100, delay=0)
+
+    async def run():
+        registry = fake.registry(["main", "a", "b", "c"], "main", memory_budget=300, idle_seconds=0.05)
+        for name in ("main", "a", "b"):
+            await registry.load(name)
+        async with registry.use("a"):
+            pass  # a is now more recently used than b
+        await registry.load("c")  # 400 bytes: b goes
+        after_budget = sorted(name for name, m in registry.stats()["models"].items() if m["loaded"])
+
+        try:
+            await registry.unload("main")
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+
+        await asyncio.sleep(0.06)
+        evicted = await registry.evict_idle()
+        remaining = sorted(name for name, m in registry.stats()["models"].items() if m["loaded"])
+        return registry, after_budget, evicted, remaining
+
+    registry, after_budget, evicted, remaining = asyncio.run(run())
+    print(f"   after budget: {after_budget}, after idle: {remaining}")
+    assert after_budget == ["a", "c", "main"]
+    assert evicted == 2 and remaining == ["main"]
+    assert fake.unloaded[0] == "b" and sorted(fake.unloaded) == ["a", "b", "c"]
+    assert registry.evictions == 3
+
+    print("✓ Least recently used model evicted first; the default is never unloaded")
+    return True
+
+
+def test_parse_model_specs():
+    """
+    MODELS entries should resolve relative paths and default to pytorch.
+    """
+    print("\n" + "=" * 60)
+    print("Testing MODELS Parsing")
+    print("=" * 60)
+
+    specs = parse_model_specs("small=yolo12n_3.pt, fast=export/yolo12n_3.onnx@onnx,", Path("/models"))
+    assert specs == [
+        ModelSpec("small", Path("/models/yolo12n_3.pt"), "pytorch"),
+        ModelSpec("fast", Path("/models/export/yolo12n_3.onnx"), "onnx"),
+    ]
+    for bad in ("no-equals-sign", "bad name=x.pt", "x=x.pt@tensorrt"):
+        try:
+            parse_model_specs(bad, Path("/models"))
+            raise AssertionError(f"expected ValueError for {bad!r}")
+        except ValueError as e:
+            print(f"   {bad!r}: {e}")
+
+    print("✓ Entries parsed, malformed entries rejected")
+    return True
+
+
+if __name__ == "__main__":
+    test_lazy_loading_and_selection()
+    test_hot_swap_keeps_running_requests()
+    test_eviction()
+    test_parse_model_specs()
+    print("\n✅ All model registry tests passed!")
@@ -0,0 +1,108 @@
+"""
+Test script to verify native library thread limits
+Run with: python test_native_threads.py
+"""
+import asyncio
+import os
+
+import cv2
+import SimpleITK as sitk
+
+import native_threads
+from native_threads import BLAS_ENV_VARS, ThreadLimits
+from worker_pools import WorkerPools
+
+
+def test_apply_and_report():
+    """
+    apply should set each library's thread count, report should read them
+    back, and 0 should leave a library alone.
+    """
+    print("=" * 60)
+    print("Testing Thread Limits in This Process")
+    print("=" * 60)
+
+    import torch
+
+    original = (cv2.getNumThreads(), sitk.ProcessObject.GetGlobalDefaultNumberOfThreads(), torch.get_num_threads())
+    try:
+        native_threads.apply(ThreadLimits(torch=2, opencv=3, sitk=5))
+        threads = native_threads.report()
+        print(f"   report: {threads}")
+        assert threads["torch"] == 2 and threads["opencv"] == 3 and threads["sitk"] == 5
+        assert threads["cpu_count"] == os.cpu_count()
+
+        native_threads.apply(ThreadLimits(opencv=4))
+        threads = native_threads.report()
+        assert threads["opencv"] == 4 and threads["torch"] == 2 and threads["sitk"] == 5
+        print(f"   described: {native_threads.describe(ThreadLimits(opencv=4))}")
+        assert native_threads.describe(ThreadLimits(opencv=4)).startswith("torch=default, torch_interop=default, opencv=4")
+    finally:
+        cv2.setNumThreads(original[0])
+        sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(original[1])
+        torch.set_num_threads(original[2])
+
+    print("✓ Limits applied and reported; 0 keeps the library default")
+    return True
+
+
+def test_limit_env_keeps_explicit_values():
+    """
+    limit_env should fill in the BLAS variables without overriding ones set
+    by the operator.
+    """
+    print("\n" + "=" * 60)
+    print("Testing BLAS Environment Variables")
+    print("=" * 60)
+
+    saved = {name: os.environ.pop(name, None) for name in BLAS_ENV_VARS}
+    try:
+        os.environ["MKL_NUM_THREADS"] = "6"
+        native_threads.limit_env(0)
+        assert "OMP_NUM_THREADS" not in os.environ
+        native_threads.limit_env(2)
+        values = {name: os.environ[name] for name in BLAS_ENV_VARS}
+        print(f"   environment: {values}")
+        assert values == {"OMP_NUM_THREADS": "2", "OPENBLAS_NUM_THREADS": "2", "MKL_NUM_THREADS": "6"}
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+    print("✓ Unset variables filled in, explicit ones kept")
+    return True
+
+
+def test_registration_worker_limits():
+    """
+    Registration worker processes should start with the SimpleITK and OpenCV
+    limits, without importing PyTorch.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Limits in Registration Workers")
+    print("=" * 60)
+
+    limits = ThreadLimits(torch=2, torch_interop=1, opencv=2, sitk=3, blas=1)
+    pools = WorkerPools(
+        cpu_threads=1, registration_processes=1,
+        initializer=native_threads.apply, initargs=(limits.for_registration_worker(),)
+    )
+    try:
+        threads = asyncio.run(pools.run_registration(native_threads.report))
+    finally:
+        pools.shutdown()
+
+    print(f"   worker report: {threads}")
+    assert threads["sitk"] == 3 and threads["opencv"] == 2
+    assert "torch" not in threads
+
+    print("✓ Worker process started with its own limits")
+    return True
+
+
+if __name__ == "__main__":
+    test_apply_and_report()
+    test_limit_env_keeps_explicit_values()
+    test_registration_worker_limits()
+    print("\n✅ All native thread tests passed!")
@@ -0,0 +1,153 @@
+"""
+Test script to verify on-demand request profiling
+Run with: python test_profiling.py
+"""
+import asyncio
+import hashlib
+import json
+import pstats
+import tempfile
+from pathlib import Path
+
+import httpx
+from fastapi import Depends, FastAPI, File, Form, UploadFile
+
+from batching import MicroBatcher
+from profiling import ProfilingMiddleware, record_parameters
+from worker_pools import WorkerPools
+
+TOKEN = "let-me-profile"
+
+
+def decode_in_thread(data: bytes) -> int:
+    return sum(data)
+
+
+def register_in_process(size: int) -> int:
+    return sum(i * i for i in range(size))
+
+
+def infer_batch(images, confidence):
+    return [len(image) for image in images]
+
+
+def make_app(directory: Path, pools: WorkerPools, keep: int = 50, paths=()) -> FastAPI:
+    app = FastAPI(dependencies=[Depends(record_parameters)])
+    app.add_middleware(ProfilingMiddleware, directory=directory, token=TOKEN, paths=paths, keep=keep)
+    batcher = MicroBatcher(infer_batch, max_batch_size=4, max_wait_ms=1)
+
+    @app.post("/scan")
+    async def scan(file: UploadFile = File(...), conf: float = Form(0.25)):
+        data = await file.read()
+        total = await pools.run_cpu(decode_in_thread, data)
+        registered = await pools.run_registration(register_in_process, 20000)
+        detections = await batcher.predict(data, conf)
+        return {"total": total, "registered": registered, "detections": detections, "conf": conf}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def post_scans(app: FastAPI, headers_list, data: bytes = b"scan bytes"):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.post(
+                    "/scan?debug=1", files={"file": ("scan.png", data, "image/png")},
+                    data={"conf": "0.4"}, headers=headers
+                )
+                for headers in headers_list
+            ]
+    return asyncio.run(run())
+
+
+def test_header_profiles_request():
+    """
+    A request with the right X-Profile token should be profiled on the event
+    loop, the CPU pool, the registration worker process and the batcher's
+    inference thread, and its
+    parameters and upload hash written next to the profile.
+    """
+    print("=" * 60)
+    print("Testing a Profiled Request")
+    print("=" * 60)
+
+    pools = WorkerPools(cpu_threads=2, registration_processes=1)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            app = make_app(directory, pools)
+            plain, wrong, profiled = post_scans(app, [{}, {"X-Profile": "guess"}, {"X-Profile": TOKEN}])
+
+            assert plain.status_code == wrong.status_code == profiled.status_code == 200
+            assert "x-profile-id" not in plain.headers and "x-profile-id" not in wrong.headers
+            profile_id = profiled.headers["x-profile-id"]
+            print(f"   profile id: {profile_id}")
+            assert sorted(p.name for p in directory.iterdir()) == [
+                f"{profile_id}.json", f"{profile_id}.prof", f"{profile_id}.txt"
+            ]
+
+            record = json.loads((directory / f"{profile_id}.json").read_text())
+            print(f"   record: {record}")
+            assert record["path"] == "/scan" and record["status"] == 200
+            assert record["parameters"] == {"debug": "1", "conf": "0.4"}
+            assert record["uploads"] == [{
+                "field": "file", "filename": "scan.png", "content_type": "image/png",
+                "sha256": hashlib.sha256(b"scan bytes").hexdigest(), "size": len(b"scan bytes"),
+            }]
+            assert record["thread_calls"] == 2 and record["process_calls"] == 1
+
+            stats = pstats.Stats(str(directory / f"{profile_id}.prof"))
+            functions = {name for _, _, name in stats.stats}
+            assert {"scan", "decode_in_thread", "register_in_process", "infer_batch"} <= functions
+            assert "function calls" in (directory / f"{profile_id}.txt").read_text()
+    finally:
+        pools.shutdown()
+
+    print("✓ Thread, worker process and batched inference work included in the profile")
+    return True
+
+
+def test_profile_paths_and_pruning():
+    """
+    Requests to a configured path should be profiled without the header,
+    other paths left alone, and only the newest `keep` profiles kept.
+    """
+    print("\n" + "=" * 60)
+    print("Testing PROFILE_PATHS and Pruning")
+    print("=" * 60)
+
+    pools = WorkerPools(cpu_threads=2, registration_processes=0)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            app = make_app(directory, pools, keep=2, paths=["/scan"])
+            responses = post_scans(app, [{}, {}, {}])
+            ids = [response.headers["x-profile-id"] for response in responses]
+
+            async def health():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.get("/health")
+
+            assert "x-profile-id" not in asyncio.run(health()).headers
+            kept = {p.stem for p in directory.glob("*.json")}
+            print(f"   profiled: {ids}")
+            print(f"   kept: {kept}")
+            assert len(set(ids)) == 3 and kept == set(ids[1:])
+            assert len(list(directory.iterdir())) == 6
+    finally:
+        pools.shutdown()
+
+    print("✓ Configured path profiled, oldest profile pruned")
+    return True
+
+
+if __name__ == "__main__":
+    test_header_profiles_request()
+    test_profile_paths_and_pruning()
+    print("\n✅ All profiling tests passed!")
@@ -174,6 +174,37 @@ def test_with_synthetic_data():
     return True
 
 
+def test_progress_reporting():
+    """
+    Progress callbacks should report iterations and the final state, throttled.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Registration Progress Reporting")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    fixed = np.zeros((96, 96), dtype=np.uint8)
+    fixed[30:60, 25:70] = 200
+    fixed = np.clip(fixed + rng.normal(0, 5, fixed.shape), 0, 255).astype(np.uint8)
+    moving = np.roll(fixed, (4, -3), axis=(0, 1))
+
+    every, throttled = [], []
+    register_images(fixed, moving, "rigid", progress=every.append, progress_interval=0)
+    register_images(fixed, moving, "rigid", progress=throttled.append, progress_interval=60)
+
+    print(f"   unthrottled: {len(every)} reports, throttled: {len(throttled)}")
+    assert len(every) >= 3
+    assert [e["iteration"] for e in every[:-1]] == sorted(e["iteration"] for e in every[:-1])
+    assert all(set(e) == {"iteration", "metric", "elapsed_ms"} for e in every)
+    assert every[-1]["elapsed_ms"] >= every[0]["elapsed_ms"]
+    # First iteration plus the final state
+    assert len(throttled) == 2 and throttled[-1]["iteration"] == every[-1]["iteration"]
+
+    print("✓ Iteration, metric and elapsed time reported, throttled by interval")
+    return True
+
+
 if __name__ == "__main__":
     test_registration()
+    test_progress_reporting()
 
@@ -0,0 +1,84 @@
+"""
+Test script to verify JSON, multipart and MessagePack response modes
+Run with: python test_responses.py
+"""
+import base64
+import email
+import json
+import msgpack
+from responses import build_response, negotiate_payload
+
+METADATA = {"mask_type": "binary", "num_detections": 1, "boxes": [[1.0, 2.0, 3.0, 4.0]]}
+IMAGES = {"annotated_image": (b"\x89PNG fake image", "image/png"), "mask": (b"\x00\xffmask", "image/webp")}
+
+
+def test_negotiation():
+    """
+    JSON stays the default; explicit multipart/msgpack types switch modes by q.
+    """
+    print("=" * 60)
+    print("Testing Payload Negotiation")
+    print("=" * 60)
+
+    assert negotiate_payload(None) == "json"
+    assert negotiate_payload("*/*") == "json"
+    assert negotiate_payload("image/webp") == "json"
+    assert negotiate_payload("multipart/mixed") == "multipart"
+    assert negotiate_payload("application/json, multipart/mixed;q=0.5") == "json"
+    assert negotiate_payload("application/json;q=0.5, application/x-msgpack") == "msgpack"
+
+    print("✓ Accept header mapped to response modes")
+    return True
+
+
+def test_json_shape():
+    """
+    Default JSON keeps base64 images under their names plus media_types.
+    """
+    print("\n" + "=" * 60)
+    print("Testing JSON Response")
+    print("=" * 60)
+
+    response = build_response(METADATA, IMAGES)
+    body = json.loads(response.body)
+    assert response.media_type == "application/json"
+    assert base64.b64decode(body["annotated_image"]) == IMAGES["annotated_image"][0]
+    assert body["media_types"] == {"annotated_image": "image/png", "mask": "image/webp"}
+    assert body["boxes"] == METADATA["boxes"]
+
+    print("✓ Original JSON shape preserved")
+    return True
+
+
+def test_binary_modes():
+    """
+    Multipart and MessagePack should carry the raw image bytes unchanged.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Multipart and MessagePack Responses")
+    print("=" * 60)
+
+    response = build_response(METADATA, IMAGES, "multipart")
+    content_type = response.headers["content-type"]
+    message = email.message_from_bytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + response.body)
+    parts = message.get_payload()
+    names = [p.get_param("name", header="content-disposition") for p in parts]
+    print(f"   multipart parts: {names}")
+    assert names == ["metadata", "annotated_image", "mask"]
+    assert json.loads(parts[0].get_payload(decode=True)) == METADATA
+    assert parts[2].get_content_type() == "image/webp"
+    assert parts[2].get_payload(decode=True) == IMAGES["mask"][0]
+    print("✓ Multipart parts decoded")
+
+    body = msgpack.unpackb(build_response(METADATA, IMAGES, "msgpack").body)
+    assert body["annotated_image"] == IMAGES["annotated_image"][0]
+    assert body["media_types"]["mask"] == "image/webp" and body["mask_type"] == "binary"
+    print("✓ MessagePack carries raw bytes")
+    return True
+
+
+if __name__ == "__main__":
+    test_negotiation()
+    test_json_shape()
+    test_binary_modes()
+    print("\n✅ All response mode tests passed!")
@@ -0,0 +1,144 @@
+"""
+Test script to verify the persistent detection result store
+Run with: python test_result_store.py
+"""
+import tempfile
+from pathlib import Path
+import numpy as np
+from backends import served_model_id
+from detection_cache import Detections
+from result_store import ResultStore
+
+
+def make_detections(n=2):
+    return Detections(
+        boxes=np.arange(n * 4, dtype=np.float32).reshape(n, 4),
+        confidences=np.linspace(0.1, 0.9, n).astype(np.float32),
+        class_ids=np.zeros(n, dtype=np.int32),
+        image_shape=(64, 48)
+    )
+
+
+def test_survives_reopen():
+    """
+    Stored detections should be readable after the store is reopened.
+    """
+    print("=" * 60)
+    print("Testing Persistence Across Restarts")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.sqlite3"
+        store = ResultStore(path, "pytorch:aaa")
+        store.put("img1", 0.05, make_detections())
+        store.close()
+
+        store = ResultStore(path, "pytorch:aaa")
+        detections = store.get("img1", 0.05)
+        store.close()
+
+    assert detections is not None
+    assert detections.image_shape == (64, 48)
+    np.testing.assert_array_equal(detections.boxes, make_detections().boxes)
+    print("✓ Detections restored from disk")
+    return True
+
+
+def test_model_change_invalidates():
+    """
+    Opening the store for new weights should drop the old weights' rows only.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Invalidation on Model Change")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.sqlite3"
+        ResultStore(path, "pytorch:old").put("img1", 0.05, make_detections())
+        ResultStore(path, "onnx:xyz").put("img1", 0.05, make_detections())
+
+        new_store = ResultStore(path, "pytorch:new")
+        onnx_store = ResultStore(path, "onnx:xyz")
+        assert new_store.get("img1", 0.05) is None
+        assert onnx_store.get("img1", 0.05) is not None
+        assert new_store.stats()["entries"] == 1
+
+    print("✓ Stale PyTorch rows dropped, other backends untouched")
+    return True
+
+
+def test_invalidation_is_exact():
+    """
+    Only rows of the same registered name and backend with other weights
+    should go: not names matching as LIKE patterns, not the same weights
+    behind a cascade gate.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Exact Invalidation Prefixes")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.sqlite3"
+        ids = [
+            served_model_id("myXmodel", "pytorch", "aaa"),
+            served_model_id("my_model", "pytorch", "aaa"),
+            served_model_id("my_model", "pytorch", "aaa", "gate:g1@0.200"),
+        ]
+        assert ids == ["myXmodel/pytorch:aaa", "my_model/pytorch:aaa", "my_model/pytorch:aaa+gate:g1@0.200"]
+        for model_id in ids:
+            ResultStore(path, model_id).put("img1", 0.05, make_detections())
+
+        ResultStore(path, served_model_id("my_model", "pytorch", "aaa", "gate:g2@0.100"))
+        assert ResultStore(path, ids[1]).stats()["entries"] == 3
+        store = ResultStore(path, served_model_id("my_model", "pytorch", "bbb"))
+        remaining = [row[0] for row in store._conn.execute("SELECT model_id FROM detections")]
+        print(f"   remaining: {remaining}")
+        assert remaining == ["myXmodel/pytorch:aaa"]
+
+    print("✓ Gated rows of unchanged weights and similarly named models kept")
+    return True
+
+
+def test_floor_and_budget():
+    """
+    Rows computed at a higher floor are misses; the entry budget evicts LRU rows.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Floor Check and Eviction")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(Path(tmp) / "store.sqlite3", "pytorch:aaa", max_entries=2)
+        store.put("img1", 0.25, make_detections())
+        assert store.get("img1", 0.05) is None       # needs boxes below 0.25
+        assert store.get("img1", 0.5) is not None
+
+        store.put("img2", 0.05, make_detections())
+        store.get("img1", 0.5)                        # img1 now most recent
+        store.put("img3", 0.05, make_detections())    # evicts img2
+
+        stats = store.stats()
+        print(f"   stats: {stats}")
+        assert store.get("img2", 0.05) is None
+        assert stats["entries"] == 2 and stats["evictions"] == 1
+
+        # The byte budget evicts as many of the oldest rows as it needs
+        small = ResultStore(Path(tmp) / "bytes.sqlite3", "pytorch:aaa", max_bytes=3 * make_detections().nbytes)
+        for i in range(3):
+            small.put(f"img{i}", 0.05, make_detections())
+        small.put("big", 0.05, make_detections(4))   # twice the size: evicts img0 and img1
+        print(f"   byte budget stats: {small.stats()}")
+        assert small.get("img1", 0.05) is None and small.get("img2", 0.05) is not None
+        assert small.get("big", 0.05) is not None
+        assert small.stats()["bytes"] <= small.max_bytes
+
+    print("✓ Floor respected and least recently used row evicted")
+    return True
+
+
+if __name__ == "__main__":
+    test_survives_reopen()
+    test_model_change_invalidates()
+    test_invalidation_is_exact()
+    test_floor_and_budget()
+    print("\n✅ All result store tests passed!")
@@ -0,0 +1,99 @@
+"""
+Test script to verify single-flight coalescing of concurrent requests
+Run with: python test_singleflight.py
+"""
+import asyncio
+from singleflight import SingleFlight
+
+
+def test_identical_keys_share_work():
+    """
+    Concurrent callers with the same key should run the computation once.
+    """
+    print("=" * 60)
+    print("Testing Coalescing of Identical Keys")
+    print("=" * 60)
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("scan", compute) for _ in range(5)])
+        other = await flight.do("other", compute)
+        return flight, results, other
+
+    flight, results, other = asyncio.run(run())
+    stats = flight.stats()
+    print(f"   stats: {stats}")
+    assert results == ["result"] * 5 and other == "result"
+    assert len(calls) == 2
+    assert stats == {"in_flight": 0, "started": 2, "coalesced": 4}
+
+    print("✓ Five identical requests ran once, a different key ran separately")
+    return True
+
+
+def test_errors_reach_every_caller():
+    """
+    A failing computation should raise in every waiting caller, and the key
+    should be retried afterwards rather than remembered.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Error Propagation")
+    print("=" * 60)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad scan")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("scan", fail) for _ in range(3)], return_exceptions=True)
+        retry = await flight.do("scan", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert retry == "ok"
+
+    print("✓ All callers saw the error and the key was not cached")
+    return True
+
+
+def test_cancelled_waiter_keeps_work():
+    """
+    One client going away should not cancel the computation others wait on.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Cancellation Isolation")
+    print("=" * 60)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def run():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("scan", compute))
+        second = asyncio.ensure_future(flight.do("scan", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    value, cancelled = asyncio.run(run())
+    assert cancelled and value == 42
+
+    print("✓ Remaining caller received the result")
+    return True
+
+
+if __name__ == "__main__":
+    test_identical_keys_share_work()
+    test_errors_reach_every_caller()
+    test_cancelled_waiter_keeps_work()
+    print("\n✅ All single-flight tests passed!")
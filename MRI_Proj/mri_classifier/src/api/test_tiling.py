@@ -0,0 +1,155 @@
+"""
+Test script to verify sliced (tiled) inference and merging of tile detections
+Run with: python test_tiling.py
+"""
+import asyncio
+import numpy as np
+import torch
+from PIL import Image
+from detection_cache import Detections
+from tiling import TilingConfig, combine, merge_boxes, tile_grid, tiled_predict
+
+
+def _detections(boxes, confidences, class_ids, image_shape):
+    return Detections(
+        boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+        confidences=np.array(confidences, dtype=np.float32),
+        class_ids=np.array(class_ids, dtype=np.int32),
+        image_shape=image_shape
+    )
+
+
+def test_tile_grid():
+    """
+    Tiles should cover the image with the requested overlap and stay within max_tiles.
+    """
+    print("=" * 60)
+    print("Testing Tile Grid")
+    print("=" * 60)
+
+    config = TilingConfig(tile_size=640, overlap=0.2)
+    grid = tile_grid(2000, 1500, config)
+    xs = sorted({x1 for x1, _, _, _ in grid})
+    print(f"   2000x1500 -> {len(grid)} tiles, x starts {xs}")
+    assert xs == [0, 512, 1024, 1360]
+    assert all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in grid)
+    assert max(x2 for _, _, x2, _ in grid) == 2000 and max(y2 for _, _, _, y2 in grid) == 1500
+
+    assert tile_grid(500, 400, config) == [(0, 0, 500, 400)]
+
+    capped = tile_grid(8000, 8000, TilingConfig(tile_size=256, overlap=0.5, max_tiles=16))
+    print(f"   8000x8000 capped at 16 -> {len(capped)} tiles of {capped[0][2]} px")
+    assert len(capped) <= 16 and capped[-1][2:] == (8000, 8000)
+
+    for bad in ({"tile_size": 32}, {"overlap": 0.95}, {"merge": "wbf"}, {"max_tiles": 0}):
+        try:
+            TilingConfig(**bad)
+            assert False, f"expected ValueError for {bad}"
+        except ValueError:
+            pass
+
+    print("✓ Grid covers the image and respects limits")
+    return True
+
+
+def test_merge_and_combine():
+    """
+    Tile boxes should be shifted into image pixels; nms and fuse should merge duplicates per class.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Merge Modes")
+    print("=" * 60)
+
+    # A lesion found in two overlapping tiles, cut at the first tile's edge
+    left = _detections([[500, 100, 640, 200]], [0.9], [0], (640, 640))
+    right = _detections([[0, 100, 180, 200]], [0.7], [0], (640, 640))
+    # Whole-image pass at half resolution
+    full = _detections([[10, 10, 30, 30]], [0.8], [1], (500, 500))
+    combined = combine(
+        [((0, 0, 640, 640), left), ((460, 0, 1100, 640), right), ((0, 0, 1000, 1000), full)], (1000, 1000)
+    )
+    np.testing.assert_allclose(
+        combined.boxes, [[500, 100, 640, 200], [460, 100, 640, 200], [20, 20, 60, 60]]
+    )
+
+    nms = merge_boxes(combined, "nms", 0.5)
+    print(f"   {len(combined)} boxes -> nms {len(nms)}")
+    assert len(nms) == 2
+    np.testing.assert_allclose(nms.boxes[0], [500, 100, 640, 200])
+
+    fused = merge_boxes(combined, "fuse", 0.5)
+    print(f"   {len(combined)} boxes -> fuse {len(fused)}")
+    assert len(fused) == 2
+    np.testing.assert_allclose(fused.boxes[0], [460, 100, 640, 200])
+    assert fused.confidences[0] == np.float32(0.9)
+
+    # Overlapping boxes of different classes are both kept
+    mixed = _detections([[0, 0, 10, 10], [0, 0, 10, 10]], [0.9, 0.8], [0, 1], (20, 20))
+    assert len(merge_boxes(mixed, "nms", 0.5)) == 2
+
+    print("✓ Offsets, class-aware NMS and box fusion")
+    return True
+
+
+def test_tiled_predict():
+    """
+    Every tile should be predicted concurrently and reported with its timing.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Tiled Predict")
+    print("=" * 60)
+
+    class FakeBoxes:
+        def __init__(self, xyxy):
+            self.xyxy = torch.tensor(xyxy, dtype=torch.float32).reshape(-1, 4)
+            self.conf = torch.full((len(self.xyxy),), 0.9)
+            self.cls = torch.zeros(len(self.xyxy))
+
+        def __len__(self):
+            return len(self.xyxy)
+
+    class FakeResults:
+        """Minimal stand-in for an ultralytics Results object"""
+
+        def __init__(self, xyxy, shape):
+            self.boxes = FakeBoxes(xyxy)
+            self.orig_shape = shape
+            self.speed = {"preprocess": 0.1, "inference": 5.0, "postprocess": 0.2}
+
+    # One bright square; each tile "detects" it wherever it appears
+    array = np.zeros((1000, 1200, 3), dtype=np.uint8)
+    array[450:550, 560:660] = 255
+    in_flight, peak = 0, 0
+
+    async def predict(tile):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        ys, xs = np.nonzero(np.asarray(tile)[:, :, 0])
+        xyxy = [[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]] if len(xs) else []
+        return FakeResults(xyxy, (tile.height, tile.width))
+
+    # The first column of tiles cuts the square; fusing rejoins it
+    config = TilingConfig(tile_size=640, overlap=0.25, merge="fuse", include_full=True)
+    merged, report = asyncio.run(tiled_predict(predict, Image.fromarray(array), config))
+
+    print(f"   {report['tiles']} tiles, {report['detections_before_merge']} -> {len(merged)} boxes, "
+          f"{report['total_ms']:.1f} ms")
+    assert report["tiles"] == 7 and len(report["per_tile"]) == 7  # 3x2 grid + whole image
+    assert peak == 7
+    assert report["detections_before_merge"] == 7 and len(merged) == 1
+    assert merged.image_shape == (1000, 1200)
+    np.testing.assert_allclose(merged.boxes[0], [560, 450, 660, 550])
+    assert all(t["inference_ms"] == 5.0 and t["latency_ms"] > 0 for t in report["per_tile"])
+
+    print("✓ Tiles predicted together, boxes merged in image pixels")
+    return True
+
+
+if __name__ == "__main__":
+    test_tile_grid()
+    test_merge_and_combine()
+    test_tiled_predict()
+    print("\n✅ All tiling tests passed!")
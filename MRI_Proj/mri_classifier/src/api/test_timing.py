@@ -0,0 +1,123 @@
+"""
+Test script to verify per-request stage timing and the Server-Timing header
+Run with: python test_timing.py
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+from fastapi import FastAPI
+
+import timing
+from timing import ServerTimingMiddleware, StageTimer, run_timed, stage, timed
+
+
+@timed("work")
+def work(seconds: float) -> str:
+    time.sleep(seconds)
+    return "done"
+
+
+def test_stages_need_a_timer():
+    """
+    Outside a timed request the helpers should do nothing; inside one,
+    repeated stages should be summed and counted.
+    """
+    print("=" * 60)
+    print("Testing Stage Recording")
+    print("=" * 60)
+
+    assert work(0) == "done" and timing.current_timer() is None
+    with stage("ignored"):
+        pass
+
+    timer = StageTimer()
+    token = timing._current.set(timer)
+    try:
+        work(0.01)
+        work(0.01)
+        with stage("block"):
+            time.sleep(0.005)
+        timing.add("measured", 2.5)
+    finally:
+        timing._current.reset(token)
+
+    stages = {name: (ms, count) for name, ms, count in timer.stages()}
+    print(f"   stages: {stages}")
+    print(f"   header: {timer.header()}")
+    assert list(stages) == ["work", "block", "measured"]
+    assert stages["work"][1] == 2 and stages["work"][0] >= 20
+    assert stages["measured"] == (2.5, 1)
+    assert timer.header().startswith('work;dur=') and 'desc="x2"' in timer.header()
+    assert timer.header().split(", ")[-1].startswith("total;dur=")
+
+    print("✓ Stages summed per name, nothing recorded without a timer")
+    return True
+
+
+def test_stages_from_worker_process():
+    """
+    run_timed should bring the stages of a call in another process back.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Stages from a Worker Process")
+    print("=" * 60)
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result, stages = pool.submit(run_timed, work, 0.01).result()
+
+    timer = StageTimer()
+    timer.merge(stages)
+    print(f"   stages: {timer.stages()}")
+    assert result == "done"
+    assert [name for name, _, _ in timer.stages()] == ["work"]
+
+    print("✓ Worker stages merged into the request timer")
+    return True
+
+
+def test_server_timing_header():
+    """
+    The middleware should time each request separately and send its stages
+    in the Server-Timing header, including stages run on worker threads.
+    """
+    print("\n" + "=" * 60)
+    print("Testing the Server-Timing Header")
+    print("=" * 60)
+
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/slow")
+    async def slow():
+        with stage("prepare"):
+            await asyncio.sleep(0.01)
+        # Thread hops keep the context, so the stage lands on this request's timer
+        return {"result": await asyncio.to_thread(work, 0.01)}
+
+    @app.get("/fast")
+    async def fast():
+        return {}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(client.get("/slow"), client.get("/fast"))
+
+    slow_response, fast_response = asyncio.run(run())
+    print(f"   /slow: {slow_response.headers['server-timing']}")
+    print(f"   /fast: {fast_response.headers['server-timing']}")
+    names = [part.split(";")[0] for part in slow_response.headers["server-timing"].split(", ")]
+    assert names == ["prepare", "work", "total"]
+    assert fast_response.headers["server-timing"].startswith("total;dur=")
+
+    print("✓ Each request reported only its own stages")
+    return True
+
+
+if __name__ == "__main__":
+    test_stages_need_a_timer()
+    test_stages_from_worker_process()
+    test_server_timing_header()
+    print("\n✅ All timing tests passed!")
@@ -0,0 +1,208 @@
+"""
+Test script to verify upload limits and spooled uploads
+Run with: python test_uploads.py
+"""
+import asyncio
+import zipfile
+from io import BytesIO
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from detection_cache import image_digest
+from singleflight import SingleFlight
+from uploads import UploadLimitMiddleware, accept_upload, configure_spooling, extract_archive, holding
+
+
+def make_app(max_body_bytes=4096, max_file_bytes=2048):
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, limits={"/upload": max_body_bytes})
+
+    @app.post("/upload")
+    async def upload(img: UploadFile = File(...)):
+        spooled = accept_upload(img, max_file_bytes)
+        return {"size": spooled.size, "digest": spooled.digest(), "on_disk": spooled.on_disk}
+
+    return app
+
+
+def test_request_limits():
+    """
+    Non-multipart and oversized bodies should be refused with 415 / 413.
+    """
+    print("=" * 60)
+    print("Testing Request Limits")
+    print("=" * 60)
+
+    client = TestClient(make_app())
+
+    assert client.post("/upload", content=b"x" * 10, headers={"Content-Type": "image/png"}).status_code == 415
+    declared = client.post("/upload", files={"img": ("a.png", b"x" * 8192, "image/png")})
+    assert declared.status_code == 413
+
+    # No Content-Length: counted while streaming
+    def chunks():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"img\"; filename=\"a.png\"\r\n"
+        yield b"Content-Type: image/png\r\n\r\n"
+        for _ in range(8):
+            yield b"x" * 1024
+    streamed = client.post("/upload", content=chunks(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    print(f"   streamed status {streamed.status_code}: {streamed.json()}")
+    assert streamed.status_code == 413
+
+    print("✓ Content-Type, Content-Length and streamed size enforced")
+    return True
+
+
+def test_file_checks_and_spooling():
+    """
+    Per-file size and type checks, with large files spooled to disk and hashed from there.
+    """
+    print("\n" + "=" * 60)
+    print("Testing File Checks and Spooling")
+    print("=" * 60)
+
+    configure_spooling(1024)
+    try:
+        client = TestClient(make_app(max_body_bytes=1 << 20, max_file_bytes=64 * 1024))
+        data = bytes(range(256)) * 40
+
+        ok = client.post("/upload", files={"img": ("a.png", data, "image/png")}).json()
+        print(f"   accepted: {ok}")
+        assert ok == {"size": len(data), "digest": image_digest(data), "on_disk": True}
+
+        small = client.post("/upload", files={"img": ("a.png", b"tiny", "image/png")}).json()
+        assert small["on_disk"] is False
+
+        assert client.post("/upload", files={"img": ("a.txt", b"hi", "text/plain")}).status_code == 415
+        big = client.post("/upload", files={"img": ("a.png", b"x" * (65 * 1024), "image/png")})
+        assert big.status_code == 413
+    finally:
+        configure_spooling(1024 * 1024)
+
+    print("✓ Files checked, spooled past the threshold and hashed from the spool")
+    return True
+
+
+def test_spooled_reads_repeat():
+    """
+    open() and read() should always start from the beginning of the spool.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Repeated Reads")
+    print("=" * 60)
+
+    spooled = accept_upload(UploadFile(BytesIO(b"scan bytes"), filename="a.png"), 1024)
+    assert spooled.size == 10
+    with spooled.open() as f:
+        assert f.read(4) == b"scan"
+    assert spooled.read() == b"scan bytes"
+    assert spooled.digest() == image_digest(b"scan bytes")
+
+    print("✓ Reads rewind the spool")
+    return True
+
+
+def test_shared_upload_outlives_leader():
+    """
+    A coalesced computation should keep reading the upload of the request
+    that started it after that request is cancelled and closes its upload.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Uploads Held by Coalesced Work")
+    print("=" * 60)
+
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def request(data: bytes):
+            upload = accept_upload(UploadFile(BytesIO(data), filename="a.png"), 1024, detach=True)
+
+            async def compute():
+                started.set()
+                await asyncio.sleep(0.05)
+                return upload.read()
+            try:
+                return await flight.do("scan", holding(upload, compute))
+            finally:
+                upload.close()  # as the endpoint does when it returns or is cancelled
+
+        leader = asyncio.ensure_future(request(b"leader bytes"))
+        await started.wait()
+        follower = asyncio.ensure_future(request(b"leader bytes"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, leader
+
+    result, leader = asyncio.run(run())
+    assert leader.cancelled()
+    assert result == b"leader bytes"
+
+    spooled = accept_upload(UploadFile(BytesIO(b"scan"), filename="a.png"), 1024, detach=True)
+    spooled.close()
+    spooled.close()  # owner closes are idempotent
+    try:
+        spooled.read()
+        raise AssertionError("expected a closed spool")
+    except ValueError:
+        pass
+
+    print("✓ Follower read the cancelled leader's upload; spool closed after the last holder")
+    return True
+
+
+def make_zip(members):
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_extract_archive():
+    """
+    Zip members should be spooled individually, skipping metadata, within the limits.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Archive Extraction")
+    print("=" * 60)
+
+    raw = make_zip({"scans/a.jpg": b"a" * 3000, "scans/b.png": b"b", "__MACOSX/scans/._a.jpg": b"x", "scans/.DS_Store": b"x"})
+    archive = accept_upload(UploadFile(BytesIO(raw), filename="scans.zip"), 1 << 20)
+
+    members = extract_archive(archive, max_member_bytes=4096, max_total_bytes=8192, max_members=10, spool_bytes=1024)
+    assert [m.filename for m in members] == ["scans/a.jpg", "scans/b.png"]
+    assert [m.content_type for m in members] == ["image/jpeg", "image/png"]
+    assert members[0].read() == b"a" * 3000 and members[0].on_disk and not members[1].on_disk
+    for member in members:
+        member.close()
+
+    for limits, status in [
+        (dict(max_member_bytes=2048, max_total_bytes=8192, max_members=10), 413),
+        (dict(max_member_bytes=4096, max_total_bytes=2048, max_members=10), 413),
+        (dict(max_member_bytes=4096, max_total_bytes=8192, max_members=1), 413),
+    ]:
+        try:
+            extract_archive(archive, spool_bytes=1024, **limits)
+            assert False, "expected HTTPException"
+        except HTTPException as e:
+            assert e.status_code == status
+
+    not_zip = accept_upload(UploadFile(BytesIO(b"not a zip"), filename="a.zip"), 1024)
+    try:
+        extract_archive(not_zip, 4096, 8192, 10, 1024)
+        assert False, "expected HTTPException"
+    except HTTPException as e:
+        print(f"   {e.detail}")
+        assert e.status_code == 400
+
+    print("✓ Members spooled, metadata skipped, limits and bad archives rejected")
+    return True
+
+
+if __name__ == "__main__":
+    test_request_limits()
+    test_file_checks_and_spooling()
+    test_spooled_reads_repeat()
+    test_shared_upload_outlives_leader()
+    test_extract_archive()
+    print("\n✅ All upload tests passed!")
@@ -0,0 +1,121 @@
+"""
+Test script to verify per-endpoint admission control and the worker pools
+Run with: python test_worker_pools.py
+"""
+import asyncio
+import os
+import threading
+from worker_pools import ConcurrencyLimiter, ServerBusyError, WorkerCrashedError, WorkerPools
+
+
+def crash_worker():
+    os._exit(1)
+
+
+def test_limiter_rejects_when_full():
+    """
+    Requests beyond max_concurrent + max_queued should be rejected immediately.
+    """
+    print("=" * 60)
+    print("Testing Concurrency Limiter")
+    print("=" * 60)
+
+    async def run():
+        limiter = ConcurrencyLimiter("/test", max_concurrent=2, max_queued=1, retry_after=3)
+        release = asyncio.Event()
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.stats()["active"])
+                await release.wait()
+
+        tasks = [asyncio.create_task(request()) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        try:
+            limiter.check()
+            assert False, "expected ServerBusyError"
+        except ServerBusyError:
+            pass
+        release.set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        return limiter, peak, outcomes
+
+    limiter, peak, outcomes = asyncio.run(run())
+    rejected = [o for o in outcomes if isinstance(o, ServerBusyError)]
+
+    print(f"   peak concurrency: {peak}")
+    print(f"   rejected: {len(rejected)}")
+    assert peak == 2
+    assert len(rejected) == 2
+    assert limiter.stats()["rejected"] == 3  # including check()
+    assert rejected[0].retry_after == 3
+    assert limiter.stats()["admitted"] == 3
+    assert limiter.stats()["active"] == 0 and limiter.stats()["waiting"] == 0
+    print("✓ Two running, one queued, two rejected with Retry-After")
+    return True
+
+
+def test_cpu_pool_runs_off_loop():
+    """
+    run_cpu should execute on a pool thread, not the event loop thread.
+    """
+    print("\n" + "=" * 60)
+    print("Testing CPU Pool")
+    print("=" * 60)
+
+    pools = WorkerPools(cpu_threads=2, registration_processes=0)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        worker_thread = await pools.run_cpu(threading.get_ident)
+        total = await pools.run_registration(sum, [1, 2, 3])
+        return loop_thread, worker_thread, total
+
+    try:
+        loop_thread, worker_thread, total = asyncio.run(run())
+    finally:
+        pools.shutdown()
+
+    assert loop_thread != worker_thread
+    assert total == 6
+    print("✓ Work executed on worker threads")
+    return True
+
+
+def test_registration_pool_restarts_after_crash():
+    """
+    A registration worker process dying should raise WorkerCrashedError for
+    its call and leave a working pool behind, not a broken one.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Registration Worker Crash")
+    print("=" * 60)
+
+    pools = WorkerPools(cpu_threads=1, registration_processes=1)
+
+    async def run():
+        try:
+            await pools.run_registration(crash_worker)
+            assert False, "expected WorkerCrashedError"
+        except WorkerCrashedError as e:
+            print(f"   {e}")
+        return await pools.run_registration(sum, [1, 2, 3])
+
+    try:
+        total = asyncio.run(run())
+    finally:
+        pools.shutdown()
+
+    assert total == 6
+    assert pools.stats()["registration_restarts"] == 1
+    print("✓ Crashed call failed cleanly, next call ran on a new pool")
+    return True
+
+
+if __name__ == "__main__":
+    test_limiter_rejects_when_full()
+    test_cpu_pool_runs_off_loop()
+    test_registration_pool_restarts_after_crash()
+    print("\n✅ All worker pool tests passed!")
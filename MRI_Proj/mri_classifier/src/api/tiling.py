@@ -0,0 +1,221 @@
+"""
+Sliced (tiled) inference for high-resolution scans
+The image is cut into overlapping tiles that the detector sees at its own input
+size, instead of downsampling the whole scan, and the per-tile detections are
+shifted back into image coordinates and merged with class-aware NMS or box fusion
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from detection_cache import Detections
+
+MERGE_MODES = ("nms", "fuse")
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class TilingConfig:
+    """
+    Tiling parameters for one request.
+
+    tile_size: Tile side in original pixels (usually the model input size)
+    overlap: Fraction of a tile shared with its neighbour, 0 to 0.9
+    merge: "nms" keeps the best of overlapping boxes; "fuse" replaces each
+        cluster with the box covering it all, which rejoins lesions cut by tile edges
+    iou_threshold: Overlap at which boxes of one class are merged (IoU for
+        nms, intersection over the smaller box for fuse)
+    include_full: Also detect on the whole downsampled image, for lesions
+        larger than a tile
+    max_tiles: Upper bound on the grid; tiles grow to stay within it
+    """
+    tile_size: int = 640
+    overlap: float = 0.2
+    merge: str = "nms"
+    iou_threshold: float = 0.5
+    include_full: bool = True
+    max_tiles: int = 64
+
+    def __post_init__(self):
+        if not 64 <= self.tile_size <= 4096:
+            raise ValueError("tile_size must be between 64 and 4096")
+        if not 0 <= self.overlap <= 0.9:
+            raise ValueError("tile_overlap must be between 0 and 0.9")
+        if self.merge not in MERGE_MODES:
+            raise ValueError(f"tile merge must be one of: {', '.join(MERGE_MODES)}")
+        if not 0 < self.iou_threshold <= 1:
+            raise ValueError("tile IoU threshold must be in (0, 1]")
+        if self.max_tiles < 1:
+            raise ValueError("max_tiles must be at least 1")
+
+    @property
+    def key(self) -> str:
+        """Identifies the settings in cache keys"""
+        return "tiles:%d:%.3f:%s:%.3f:%d:%d" % (
+            self.tile_size, self.overlap, self.merge, self.iou_threshold, self.include_full, self.max_tiles
+        )
+
+
+def _starts(length: int, tile_size: int, overlap: float) -> List[int]:
+    if length <= tile_size:
+        return [0]
+    stride = max(1, round(tile_size * (1 - overlap)))
+    # Evenly spaced, with the last tile flush against the far edge
+    return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+
+def tile_grid(width: int, height: int, config: TilingConfig) -> List[Box]:
+    """
+    (x1, y1, x2, y2) tiles covering the image, row by row. Images no larger
+    than a tile get a single tile; the tile size grows if the grid would
+    exceed config.max_tiles.
+    """
+    tile_size = config.tile_size
+    while True:
+        xs = _starts(width, tile_size, config.overlap)
+        ys = _starts(height, tile_size, config.overlap)
+        if len(xs) * len(ys) <= config.max_tiles:
+            break
+        tile_size = int(tile_size * 1.25)
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs]
+
+
+def _overlaps(box: np.ndarray, others: np.ndarray, over_smaller: bool) -> np.ndarray:
+    x1 = np.maximum(box[0], others[:, 0])
+    y1 = np.maximum(box[1], others[:, 1])
+    x2 = np.minimum(box[2], others[:, 2])
+    y2 = np.minimum(box[3], others[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (others[:, 2] - others[:, 0]) * (others[:, 3] - others[:, 1])
+    denominator = np.minimum(area, areas) if over_smaller else area + areas - inter
+    return inter / np.maximum(denominator, 1e-9)
+
+
+def merge_boxes(detections: Detections, mode: str = "nms", threshold: float = 0.5) -> Detections:
+    """
+    Greedy, class-aware merge of overlapping boxes in descending confidence.
+
+    nms drops boxes whose IoU with a kept box reaches threshold. fuse groups
+    boxes whose intersection over the smaller box reaches threshold and
+    replaces each group with its enclosing box at the group's best confidence.
+    """
+    if len(detections) == 0:
+        return detections
+    order = np.argsort(-detections.confidences, kind="stable")
+    boxes = detections.boxes[order]
+    confidences = detections.confidences[order]
+    class_ids = detections.class_ids[order]
+
+    remaining = np.ones(len(order), dtype=bool)
+    kept_boxes, kept_conf, kept_cls = [], [], []
+    for i in range(len(order)):
+        if not remaining[i]:
+            continue
+        candidates = np.flatnonzero(remaining & (class_ids == class_ids[i]))
+        matched = candidates[_overlaps(boxes[i], boxes[candidates], mode == "fuse") >= threshold]
+        matched = np.union1d(matched, [i])
+        remaining[matched] = False
+        if mode == "fuse":
+            group = boxes[matched]
+            kept_boxes.append([group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max()])
+        else:
+            kept_boxes.append(boxes[i])
+        kept_conf.append(confidences[i])
+        kept_cls.append(class_ids[i])
+
+    return Detections(
+        boxes=np.array(kept_boxes, dtype=np.float32).reshape(-1, 4),
+        confidences=np.array(kept_conf, dtype=np.float32),
+        class_ids=np.array(kept_cls, dtype=np.int32),
+        image_shape=detections.image_shape
+    )
+
+
+def combine(parts: List[Tuple[Box, Detections]], image_shape: Tuple[int, int]) -> Detections:
+    """
+    Concatenate per-tile detections, shifted from tile to image coordinates.
+    A part covering the whole image may come from a downsampled pass.
+    """
+    boxes, confidences, class_ids = [], [], []
+    for (x1, y1, x2, y2), detections in parts:
+        if len(detections) == 0:
+            continue
+        # Map onto the tile's size in original pixels, then offset it
+        detections = detections.resized((y2 - y1, x2 - x1))
+        boxes.append(detections.boxes + np.array([x1, y1, x1, y1], dtype=np.float32))
+        confidences.append(detections.confidences)
+        class_ids.append(detections.class_ids)
+    if not boxes:
+        return Detections.empty(image_shape)
+    return Detections(np.concatenate(boxes), np.concatenate(confidences), np.concatenate(class_ids), image_shape)
+
+
+def slice_image(image: Image.Image, config: TilingConfig) -> List[Tuple[Box, Image.Image]]:
+    """Tile crops of the image, plus the whole image if config.include_full"""
+    width, height = image.size
+    grid = tile_grid(width, height, config)
+    tiles = [(box, image.crop(box)) for box in grid]
+    if config.include_full and len(grid) > 1:
+        tiles.append(((0, 0, width, height), image))
+    return tiles
+
+
+async def tiled_predict(
+    predict: Callable[[Image.Image], Awaitable[Any]],
+    image: Image.Image,
+    config: TilingConfig,
+    run_blocking: Callable[..., Awaitable] = asyncio.to_thread
+) -> Tuple[Detections, Dict]:
+    """
+    Detect on every tile and merge the results.
+
+    All tiles are submitted at once, so a batching predict (MicroBatcher)
+    runs them together. predict returns an Ultralytics Results object;
+    run_blocking runs cropping and merging off the event loop.
+
+    Returns:
+        (merged detections in image pixels, report with per-tile timing)
+    """
+    t0 = time.perf_counter()
+    tiles = await run_blocking(slice_image, image, config)
+
+    async def run_tile(crop: Image.Image) -> Tuple[Detections, float, Dict]:
+        start = time.perf_counter()
+        results = await predict(crop)
+        return Detections.from_results(results), (time.perf_counter() - start) * 1000, dict(results.speed)
+
+    outcomes = await asyncio.gather(*(run_tile(crop) for _, crop in tiles))
+    predict_ms = (time.perf_counter() - t0) * 1000
+
+    merge_start = time.perf_counter()
+    image_shape = (image.height, image.width)
+    combined = combine([(box, detections) for (box, _), (detections, _, _) in zip(tiles, outcomes)], image_shape)
+    merged = await run_blocking(merge_boxes, combined, config.merge, config.iou_threshold)
+    merge_ms = (time.perf_counter() - merge_start) * 1000
+
+    report = {
+        "tiles": len(tiles),
+        "tile_size": config.tile_size,
+        "overlap": config.overlap,
+        "merge": config.merge,
+        "detections_before_merge": len(combined),
+        "predict_ms": predict_ms,
+        "merge_ms": merge_ms,
+        "total_ms": (time.perf_counter() - t0) * 1000,
+        "per_tile": [
+            {
+                "box": list(box),
+                "detections": len(detections),
+                "latency_ms": latency_ms,
+                "inference_ms": speed.get("inference"),
+            }
+            for (box, _), (detections, latency_ms, speed) in zip(tiles, outcomes)
+        ],
+    }
+    return merged, report
@@ -0,0 +1,168 @@
+"""
+Per-request stage timing
+Code marks its stages with stage()/timed(); durations accumulate on the timer
+of the request being served (a context variable, so they follow run_cpu onto
+worker threads and run_registration into worker processes) and are reported
+in a Server-Timing header and one structured log line per request. Outside a
+timed request every helper is a context-variable lookup and nothing more
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+_NULL = nullcontext()
+
+
+class StageTimer:
+    """
+    Stage durations of one request, summed per stage name in first-seen order.
+
+    Stages can overlap (tiles decoded concurrently, a stage nested in
+    another), so they need not add up to the request's total time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages: Dict[str, list] = {}
+
+    def add(self, name: str, duration_ms: float, count: int = 1):
+        with self._lock:
+            totals = self._stages.get(name)
+            if totals is None:
+                self._stages[name] = [duration_ms, count]
+            else:
+                totals[0] += duration_ms
+                totals[1] += count
+
+    def merge(self, stages: Iterable[Tuple[str, float, int]]):
+        """Add stages recorded elsewhere, e.g. by run_timed in a worker process"""
+        for name, duration_ms, count in stages:
+            self.add(name, duration_ms, count)
+
+    def stages(self) -> Tuple[Tuple[str, float, int], ...]:
+        """(name, total ms, count) per stage"""
+        with self._lock:
+            return tuple((name, ms, count) for name, (ms, count) in self._stages.items())
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self) -> str:
+        """Server-Timing value: stages, then the time until the header was sent as "total" """
+        parts = [
+            f"{name};dur={ms:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+            for name, ms, count in self.stages()
+        ]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current.get()
+
+
+def add(name: str, duration_ms: float):
+    """Record a duration measured by the caller"""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, duration_ms)
+
+
+@contextmanager
+def _timed_stage(timer: StageTimer, name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - t0) * 1000)
+
+
+def stage(name: str):
+    """Context manager timing a block as `name`"""
+    timer = _current.get()
+    return _NULL if timer is None else _timed_stage(timer, name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a (synchronous) function as `name`"""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            timer = _current.get()
+            if timer is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer.add(name, (time.perf_counter() - t0) * 1000)
+        return wrapper
+    return decorate
+
+
+def run_timed(fn: Callable, *args, **kwargs) -> Tuple[Any, Tuple[Tuple[str, float, int], ...]]:
+    """
+    Call fn under a fresh timer and return (result, stages). Used to carry
+    stage timings back from worker processes, where the request's timer
+    does not exist. Picklable, like fn must be.
+    """
+    timer = StageTimer()
+    token = _current.set(timer)
+    try:
+        return fn(*args, **kwargs), timer.stages()
+    finally:
+        _current.reset(token)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware giving each HTTP request a StageTimer.
+
+    Stages recorded before the response starts are sent in a Server-Timing
+    header; once the response is complete, every stage (including those of a
+    streaming body) is logged as one JSON line to `logger` (this module's
+    logger by default).
+    """
+
+    def __init__(self, app, logger: Optional[logging.Logger] = None):
+        self.app = app
+        self.log = logger or log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        token = _current.set(timer)
+        status = None
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+            self.log.info("timing %s", json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "total_ms": round(timer.elapsed_ms(), 1),
+                "stages": {name: {"ms": round(ms, 1), "count": count} for name, ms, count in timer.stages()},
+            }))
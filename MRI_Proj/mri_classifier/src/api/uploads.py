@@ -0,0 +1,272 @@
+"""
+Bounded, disk-spooled upload handling
+Request bodies are size-checked while they stream in (and rejected up front
+by Content-Length and Content-Type), uploaded files spill to temporary files
+above a small in-memory threshold, and images are decoded straight from
+those files instead of being read into bytes first
+"""
+import hashlib
+import json
+import mimetypes
+import posixpath
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.formparsers import MultiPartParser
+
+_CHUNK = 1024 * 1024
+
+
+def configure_spooling(max_memory_bytes: int):
+    """
+    Set how much of each uploaded file Starlette keeps in memory before
+    spilling it to a temporary file.
+    """
+    # Called spool_max_size in newer Starlette, max_file_size before that
+    attribute = "spool_max_size" if hasattr(MultiPartParser, "spool_max_size") else "max_file_size"
+    setattr(MultiPartParser, attribute, max_memory_bytes)
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware bounding request bodies on upload endpoints.
+
+    limits maps each upload path to its maximum body size in bytes.
+
+    Requests declaring a Content-Length over the limit, or that are not
+    multipart/form-data, are rejected before any of the body is read; bodies
+    without a usable Content-Length are counted as they stream and cut off
+    with 413 as soon as they pass the limit. The mid-stream 413 is raised as
+    an HTTPException from receive(), which FastAPI's body parsing re-raises
+    and the app's exception middleware turns into the response.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = dict(limits)
+
+    async def _reject(self, send, status: int, detail: str):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        max_body_bytes = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_body_bytes is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        if not content_type.startswith("multipart/form-data"):
+            await self._reject(send, 415, "Uploads must be sent as multipart/form-data")
+            return
+        try:
+            declared = int(headers.get(b"content-length", b"-1"))
+        except ValueError:
+            declared = -1
+        if declared > max_body_bytes:
+            await self._reject(send, 413, f"Request body exceeds {max_body_bytes} bytes")
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {max_body_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class SpooledUpload:
+    """
+    An accepted upload, readable repeatedly from its (memory or disk) spool.
+
+    open() serialises access, since the same upload can be decoded and hashed
+    from different worker threads. Work that can outlive the request owning
+    the upload (a coalesced computation) holds it open with acquire() and
+    release(); the spool is closed once the owner has called close() and
+    every holder has released it.
+    """
+
+    def __init__(self, file: BinaryIO, filename: Optional[str], content_type: str, size: int):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self._file = file
+        self._lock = threading.Lock()
+        self._holders = 0
+        self._owner_closed = False
+
+    @property
+    def on_disk(self) -> bool:
+        return bool(getattr(self._file, "_rolled", False))
+
+    @contextmanager
+    def open(self) -> Iterator[BinaryIO]:
+        with self._lock:
+            self._file.seek(0)
+            yield self._file
+
+    def digest(self) -> str:
+        """SHA-256 of the upload, streamed from the spool (see detection_cache.image_digest)."""
+        sha = hashlib.sha256()
+        with self.open() as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def read(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    def acquire(self):
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            closing = self._owner_closed and self._holders == 0
+        if closing:
+            self._file.close()
+
+    def close(self):
+        """The owner is done with the upload; later calls do nothing"""
+        with self._lock:
+            if self._owner_closed:
+                return
+            self._owner_closed = True
+            closing = self._holders == 0
+        if closing:
+            self._file.close()
+
+
+def holding(upload: SpooledUpload, fn: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+    """
+    fn for SingleFlight.do, holding upload open until the computation is done.
+
+    A shared computation reads the upload of the request that started it and
+    keeps running if that request is cancelled, so the upload must be detached
+    from the request (accept_upload(detach=True)) and outlive it.
+    """
+    def start() -> Awaitable[Any]:
+        # Acquired when the flight starts, before the owner can close the upload
+        upload.acquire()
+
+        async def run():
+            try:
+                return await fn()
+            finally:
+                upload.release()
+        return run()
+    return start
+
+
+def accept_upload(
+    upload: UploadFile,
+    max_bytes: int,
+    allowed_types: Iterable[str] = ("image/", "application/octet-stream"),
+    detach: bool = False
+) -> SpooledUpload:
+    """
+    Check one uploaded file's declared type and size before it is decoded.
+
+    FastAPI closes form files as soon as the endpoint returns; with detach the
+    spool is handed over to the returned SpooledUpload instead, so a streamed
+    response can keep reading it, and the caller must close() it.
+
+    Raises:
+        HTTPException: 415 for other content types, 413 if larger than max_bytes
+    """
+    content_type = (upload.content_type or "application/octet-stream").lower()
+    if not any(content_type.startswith(allowed) for allowed in allowed_types):
+        raise HTTPException(status_code=415, detail=f"{upload.filename}: unsupported content type {content_type}")
+
+    size: Optional[int] = upload.size
+    if size is None:
+        upload.file.seek(0, 2)
+        size = upload.file.tell()
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{upload.filename}: file exceeds {max_bytes} bytes")
+    spooled = SpooledUpload(upload.file, upload.filename, content_type, size)
+    if detach:
+        upload.file = BytesIO()
+    return spooled
+
+
+def _skipped_member(info: zipfile.ZipInfo) -> bool:
+    # Directories and OS metadata (__MACOSX/, .DS_Store, ._ resource forks)
+    name = info.filename
+    return info.is_dir() or name.startswith("__MACOSX/") or posixpath.basename(name).startswith(".")
+
+
+def extract_archive(
+    archive: SpooledUpload,
+    max_member_bytes: int,
+    max_total_bytes: int,
+    max_members: int,
+    spool_bytes: int
+) -> List[SpooledUpload]:
+    """
+    Unpack a zip upload into one spooled file per member, checking the declared
+    member count and sizes before anything is decompressed.
+
+    Returns:
+        SpooledUploads in archive order, owned (and to be closed) by the caller
+
+    Raises:
+        HTTPException: 400 for an unreadable archive, 413 when over a limit
+    """
+    members: List[SpooledUpload] = []
+    try:
+        with archive.open() as f, zipfile.ZipFile(f) as zf:
+            infos = [info for info in zf.infolist() if not _skipped_member(info)]
+            if len(infos) > max_members:
+                raise HTTPException(status_code=413, detail=f"Archive has more than {max_members} files")
+            too_big = next((info for info in infos if info.file_size > max_member_bytes), None)
+            if too_big is not None:
+                raise HTTPException(
+                    status_code=413, detail=f"{too_big.filename}: file exceeds {max_member_bytes} bytes"
+                )
+            if sum(info.file_size for info in infos) > max_total_bytes:
+                raise HTTPException(status_code=413, detail=f"Archive expands to more than {max_total_bytes} bytes")
+
+            for info in infos:
+                spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+                members.append(SpooledUpload(
+                    spool,
+                    info.filename,
+                    mimetypes.guess_type(info.filename)[0] or "application/octet-stream",
+                    info.file_size
+                ))
+                with zf.open(info) as src:
+                    shutil.copyfileobj(src, spool, _CHUNK)
+    except (zipfile.BadZipFile, RuntimeError, EOFError) as e:  # RuntimeError: encrypted members
+        for member in members:
+            member.close()
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {e}")
+    except BaseException:
+        for member in members:
+            member.close()
+        raise
+    return members
@@ -0,0 +1,124 @@
+"""
+Startup readiness tracking and warm-up work
+Model loading and the first predictions/registrations pay one-off costs (graph
+building, kernel selection, worker process spawn); warm-up runs them before the
+service reports ready so real requests never do
+"""
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class NotReadyError(Exception):
+    """
+    Raised when a request needs the model before startup has finished.
+    """
+
+    def __init__(self, phase: str, retry_after: int):
+        super().__init__(f"Service is not ready yet ({phase}), retry in {retry_after}s")
+        self.phase = phase
+        self.retry_after = retry_after
+
+
+class Readiness:
+    """
+    Startup phase of the service, as reported by /ready.
+
+    Phases run "starting" -> "loading" -> "warming" -> "ready", or end in
+    "failed" with the error recorded. Each completed step's duration is kept
+    so slow starts can be diagnosed from the probe itself.
+    """
+
+    def __init__(self):
+        self.phase = "starting"
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._ready_after: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def step(self, name: str) -> "_Step":
+        """Context manager timing one startup step in milliseconds."""
+        return _Step(self, name)
+
+    def set_phase(self, phase: str):
+        self.phase = phase
+        log.info("Startup phase: %s", phase)
+        if phase == "ready":
+            self._ready_after = time.perf_counter() - self._started
+
+    def fail(self, error: BaseException):
+        self.phase = "failed"
+        self.error = f"{type(error).__name__}: {error}"
+        log.error("Startup failed: %s", self.error)
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "steps_ms": dict(self.steps),
+            "ready_after_s": round(self._ready_after, 3) if self._ready_after is not None else None,
+        }
+
+
+class _Step:
+    def __init__(self, readiness: Readiness, name: str):
+        self.readiness = readiness
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._t0) * 1000
+        self.readiness.steps[self.name] = round(elapsed_ms, 1)
+        if exc_type is None:
+            log.info("   %s took %.0f ms", self.name, elapsed_ms)
+        return False
+
+
+def dummy_scan(size: int) -> np.ndarray:
+    """
+    Synthetic size x size RGB image with a bright blob on a dark background,
+    so warm-up exercises the same pre/post-processing as a real scan.
+    """
+    yy, xx = np.mgrid[:size, :size]
+    blob = ((yy - size / 2) ** 2 + (xx - size / 3) ** 2) < (size / 8) ** 2
+    image = np.full((size, size), 30, dtype=np.uint8)
+    image[blob] = 200
+    return np.stack([image] * 3, axis=-1)
+
+
+async def warm_detector(predict: Callable[[np.ndarray], Awaitable], sizes: Sequence[int], runs: int = 1):
+    """
+    Run dummy predictions at each typical input size.
+
+    Args:
+        predict: Coroutine function taking one RGB image, e.g. a MicroBatcher
+                 call, so warm-up runs on the same thread as real inference
+        sizes: Square image sizes to warm, e.g. (256, 512, 640)
+        runs: Predictions per size; the first builds the graph, later ones settle caches
+    """
+    for size in sizes:
+        image = dummy_scan(size)
+        for _ in range(runs):
+            await predict(image)
+
+
+def dummy_registration_pair(size: int = 64):
+    """
+    Two small RGB slices offset by a few pixels, enough for SimpleITK to run a
+    full (short) registration.
+    """
+    fixed = dummy_scan(size)
+    moving = np.roll(fixed, shift=(3, 2), axis=(0, 1))
+    return fixed, moving
@@ -0,0 +1,230 @@
+"""
+Execution layer that keeps blocking work off the asyncio event loop
+Thread pool for inference post-processing and image encoding, process pool for
+SimpleITK registration, and per-endpoint admission control
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+import profiling
+import timing
+
+log = logging.getLogger(__name__)
+
+
+class ServerBusyError(Exception):
+    """
+    Raised when an endpoint's concurrency limit and wait queue are both full.
+    """
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"{endpoint} is at capacity, retry in {retry_after}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class WorkerCrashedError(Exception):
+    """
+    Raised when a registration worker process died (killed for memory,
+    segfault) while running a call. The pool is replaced, so a retry can succeed.
+    """
+
+    def __init__(self):
+        super().__init__("registration worker crashed, retry")
+
+
+class ConcurrencyLimiter:
+    """
+    Admission control for a single endpoint.
+
+    At most max_concurrent requests run at once and at most max_queued wait
+    for a slot. Anything beyond that is rejected immediately with
+    ServerBusyError instead of joining an unbounded backlog.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queued: int, retry_after: int = 1):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def check(self):
+        """
+        Raise ServerBusyError if a request arriving now would be rejected.
+        Lets streaming endpoints answer 503 before their response starts.
+        """
+        if self._active >= self.max_concurrent and self._waiting >= self.max_queued:
+            self.rejected += 1
+            raise ServerBusyError(self.name, self.retry_after)
+
+    @asynccontextmanager
+    async def slot(self):
+        self.check()
+
+        self._waiting += 1
+        t0 = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        timing.add("queue", (time.perf_counter() - t0) * 1000)
+
+        self._active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class WorkerPools:
+    """
+    Executors shared by all endpoints.
+
+    cpu: threads for image decode, YOLO post-processing and encoding
+         (NumPy, Pillow and OpenCV release the GIL for the heavy parts)
+    registration: worker processes for SimpleITK registration and change
+         metrics, which hold the GIL for long stretches. Set
+         registration_processes=0 to run them on threads instead.
+         initializer(*initargs) runs in each worker process as it starts.
+         If a worker process dies the pool is replaced, and the calls it
+         was running raise WorkerCrashedError.
+    """
+
+    def __init__(
+        self, cpu_threads: int, registration_processes: int,
+        initializer: Optional[Callable] = None, initargs: tuple = ()
+    ):
+        self.cpu_threads = cpu_threads
+        self.registration_processes = registration_processes
+        self.cpu: Executor = ThreadPoolExecutor(
+            max_workers=cpu_threads, thread_name_prefix="api-cpu"
+        )
+        self._initializer = initializer
+        self._initargs = initargs
+        self.registration: Executor = self._registration_executor()
+        self._registration_lock = threading.Lock()
+        self.registration_restarts = 0
+        self._manager = None
+        self._manager_lock = threading.Lock()
+
+    def _registration_executor(self) -> Executor:
+        if self.registration_processes > 0:
+            # spawn rather than fork: the parent has PyTorch/OpenMP threads running
+            return ProcessPoolExecutor(
+                max_workers=self.registration_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+                initargs=self._initargs
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.cpu_threads, thread_name_prefix="api-registration"
+        )
+
+    def _replace_registration(self, broken: Executor):
+        """Swap in a new registration pool, once per broken one"""
+        with self._registration_lock:
+            if self.registration is not broken:  # a concurrent call already replaced it
+                return
+            self.registration = self._registration_executor()
+            self.registration_restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        log.error("Registration worker process died; registration pool restarted")
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn on the CPU thread pool, keeping the caller's context variables
+        (and profiling it if the request is being profiled, see profiling.py).
+        """
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, profiling.wrap_thread_call(fn), *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.cpu, call)
+
+    async def run_registration(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn on the registration pool. fn and its arguments must be picklable.
+        Stages fn times (see timing.py) are added to the caller's request
+        timer, along with the whole round trip as "registration", and the
+        histogram observations it makes (see metrics.py) reach this process.
+        A profiled request (see profiling.py) gets fn's profile as well.
+        Raises WorkerCrashedError if the worker process running fn died.
+        """
+        timer = timing.current_timer()
+        profile = profiling.current_profile()
+        call = functools.partial(fn, *args, **kwargs)
+        if profile is not None:
+            call = functools.partial(profiling.run_profiled, call)
+        if timer is not None:
+            call = functools.partial(timing.run_timed, call)
+        call = functools.partial(metrics.run_collected, call)
+        executor = self.registration
+        with timing.stage("registration"):
+            try:
+                result, observations = await asyncio.get_running_loop().run_in_executor(executor, call)
+            except BrokenProcessPool:
+                self._replace_registration(executor)
+                raise WorkerCrashedError()
+        metrics.REGISTRY.replay(observations)
+        if timer is not None:
+            result, stages = result
+            timer.merge(stages)
+        if profile is not None:
+            result, stats = result
+            profile.add(stats, process=True)
+        return result
+
+    def progress_queue(self):
+        """
+        A queue that functions on the registration pool can report progress
+        through: a multiprocessing.Manager queue proxy for worker processes
+        (the manager is started on first use), a plain queue for threads.
+        Blocks while the manager starts, so call it through run_cpu.
+        """
+        if self.registration_processes == 0:
+            return queue.Queue()
+        with self._manager_lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Queue()
+
+    def shutdown(self):
+        self.cpu.shutdown(wait=False, cancel_futures=True)
+        self.registration.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def stats(self) -> Dict:
+        return {
+            "cpu_threads": self.cpu_threads,
+            "registration_processes": self.registration_processes,
+            "registration_restarts": self.registration_restarts,
+        }